@@ -1,31 +1,105 @@
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+from uuid import UUID
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session, make_transient_to_detached
 import jwt
 
-from app.core.config import SECRET_KEY, ALGORITHM
+from app.core.cache import TTLCache
+from app.core.config import (
+    SECRET_KEY,
+    ALGORITHM,
+    PRINCIPAL_CACHE_TTL_SECONDS,
+    PRINCIPAL_CACHE_MAX_ENTRIES,
+    TOKEN_CACHE_MAX_ENTRIES,
+)
 from db.models import User
-from db.session import SessionLocal
+from db.session import AsyncSessionLocal
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-def get_db() -> Session:
-    db = SessionLocal()
-    try:
+# Decoded JWT claims keyed by the raw token, kept until the token's own expiry
+token_claims_cache = TTLCache(maxsize=TOKEN_CACHE_MAX_ENTRIES, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+# Column snapshots of authenticated users keyed by (sub, jti)
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_MAX_ENTRIES, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+
+_PENDING_INVALIDATIONS = "principal_cache_invalidations"
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+def get_session_factory() -> async_sessionmaker:
+    """For streaming responses, which must open their session inside the response body."""
+    return AsyncSessionLocal
+
+def decode_token(token: str) -> Dict[str, Any]:
+    """Decode and validate a JWT, reusing the result for repeat presentations of the same token."""
+    payload = token_claims_cache.get(token)
+    if payload is not None:
+        return payload
+
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    exp = payload.get("exp")
+    if exp is not None:
+        token_claims_cache.set(token, payload, ttl=float(exp) - time.time())
+    return payload
+
+def invalidate_principal(user_id: Any) -> None:
+    """Drop every cached principal for the given user id, whatever token it was cached under."""
+    sub = str(user_id)
+    principal_cache.pop_where(lambda key: key[0] == sub)
+
+def _snapshot(user: User) -> Dict[str, Any]:
+    return {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+
+def _detached_user(snapshot: Dict[str, Any]) -> User:
+    # A fresh detached instance per request, so callers can merge or add it to their own session
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    return user
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> User:
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         user_id: str = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token: Missing subject")
-    except jwt.PyJWTError:
+        user_uuid = UUID(user_id)
+    except (jwt.PyJWTError, ValueError):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
-    user = db.query(User).filter(User.id == user_id).first()
+    cache_key = (user_id, payload.get("jti"))
+    snapshot: Optional[Dict[str, Any]] = principal_cache.get(cache_key)
+    if snapshot is not None:
+        return _detached_user(snapshot)
+
+    user = await db.get(User, user_uuid)
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    principal_cache.set(cache_key, _snapshot(user))
     return user
+
+# Keep the principal cache coherent with writes to the users table. Entries are dropped as soon
+# as the change is flushed and again once it commits, so a read that raced the write cannot
+# leave a stale snapshot behind.
+@event.listens_for(Session, "after_flush")
+def _invalidate_flushed_users(session, flush_context):
+    changed = {str(obj.id) for obj in list(session.dirty) + list(session.deleted) if isinstance(obj, User)}
+    if changed:
+        session.info.setdefault(_PENDING_INVALIDATIONS, set()).update(changed)
+        for user_id in changed:
+            invalidate_principal(user_id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session):
+    for user_id in session.info.pop(_PENDING_INVALIDATIONS, ()):
+        invalidate_principal(user_id)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending_invalidations(session, previous_transaction):
+    session.info.pop(_PENDING_INVALIDATIONS, None)
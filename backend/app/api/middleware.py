@@ -0,0 +1,252 @@
+import asyncio
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import (
+    IDEMPOTENCY_KEY_MAX_LENGTH,
+    IDEMPOTENCY_LOCK_TIMEOUT_SECONDS,
+    IDEMPOTENCY_TTL_SECONDS,
+    IDEMPOTENCY_WAIT_SECONDS,
+    SERVER_TIMING_ENABLED,
+)
+from app.core.metrics import (
+    HTTP_REQUEST_PLAID_CALLS,
+    HTTP_REQUEST_SECONDS,
+    HTTP_REQUEST_SQL_SECONDS,
+    HTTP_REQUEST_SQL_STATEMENTS,
+    HTTP_REQUESTS,
+    IDEMPOTENT_REQUESTS,
+    RequestTimings,
+    request_timings,
+)
+from api.dependencies import get_session_factory
+from services.idempotency import StoredResponse, claim_key, complete_key, key_hash, release_key, request_hash, stored_response
+
+# Route label for requests that matched no route, so probes of random paths add no new series
+UNMATCHED_ROUTE = "unmatched"
+
+# POST endpoints that honor an Idempotency-Key header, as mobile clients retry them on flaky networks
+IDEMPOTENT_PATHS = frozenset({"/transactions/", "/accounts/", "/users/register"})
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+def server_timing(timings: RequestTimings, total_seconds: float) -> str:
+    """The Server-Timing header value: total, SQL and Plaid time in milliseconds."""
+    return (
+        f"app;dur={total_seconds * 1000:.1f}, "
+        f'db;dur={timings.sql_seconds * 1000:.1f};desc="{timings.sql_statements} queries", '
+        f'plaid;dur={timings.plaid_seconds * 1000:.1f};desc="{timings.plaid_calls} calls"'
+    )
+
+
+class InstrumentationMiddleware:
+    """
+    Records latency, SQL statements and Plaid calls per request, labelled by route template
+    (e.g. /accounts/{account_id}) rather than raw path.
+
+    A plain ASGI middleware rather than BaseHTTPMiddleware, so the endpoint runs in the same task
+    and context as the RequestTimings the SQLAlchemy and Plaid hooks tally onto. The Server-Timing
+    header reflects the work done before the response started; rows a streaming response reads
+    afterwards only show up in the metrics.
+    """
+
+    def __init__(self, app: ASGIApp, server_timing_header: bool = SERVER_TIMING_ENABLED):
+        self.app = app
+        self.server_timing_header = server_timing_header
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = request_timings.set(timings)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing_header:
+                    MutableHeaders(scope=message).append("Server-Timing", server_timing(timings, time.perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_timings.reset(token)
+            elapsed = time.perf_counter() - started
+            route = scope.get("route")
+            labels = {"method": scope["method"], "route": getattr(route, "path", UNMATCHED_ROUTE)}
+            HTTP_REQUESTS.inc(status=str(status_code), **labels)
+            HTTP_REQUEST_SECONDS.observe(elapsed, **labels)
+            HTTP_REQUEST_SQL_STATEMENTS.observe(timings.sql_statements, **labels)
+            HTTP_REQUEST_SQL_SECONDS.observe(timings.sql_seconds, **labels)
+            HTTP_REQUEST_PLAID_CALLS.observe(timings.plaid_calls, **labels)
+
+
+class _RouteLabel(NamedTuple):
+    # Stands in for scope["route"] on replayed responses, which never reach the router, so the
+    # instrumentation still labels them with their route; idempotent paths have no parameters
+    path: str
+
+
+class IdempotencyMiddleware:
+    """
+    Honors an Idempotency-Key header on POSTs to paths: the first request with a key runs, and
+    every later one with the same key gets its stored response back (with Idempotent-Replayed: true)
+    instead of running again. Duplicates arriving while the first is still running wait for its
+    response: in this process on a shared future, from other processes by polling the key's row.
+
+    Responses with a 5xx status, and requests that raise, are not stored; their key is released
+    so a retry runs the request again. Reusing a key with a different body is a 422.
+
+    Keys are stored through session_factory; by default, the app's own get_session_factory,
+    dependency overrides included, so keys land in the same database as the routes' writes.
+    """
+
+    def __init__(self, app: ASGIApp, paths: Iterable[str] = IDEMPOTENT_PATHS, session_factory: Optional[async_sessionmaker] = None,
+                 ttl_seconds: int = IDEMPOTENCY_TTL_SECONDS, wait_seconds: float = IDEMPOTENCY_WAIT_SECONDS,
+                 lock_timeout_seconds: float = IDEMPOTENCY_LOCK_TIMEOUT_SECONDS, poll_interval: float = 0.05):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.session_factory = session_factory
+        self.ttl_seconds = ttl_seconds
+        self.wait_seconds = wait_seconds
+        self.lock_timeout_seconds = lock_timeout_seconds
+        self.poll_interval = poll_interval
+        # Keys being run by this process; the future resolves to the stored response, or None if not stored
+        self._in_flight: Dict[str, "asyncio.Future[Optional[StoredResponse]]"] = {}
+
+    def _sessions(self, scope: Scope) -> async_sessionmaker:
+        if self.session_factory is not None:
+            return self.session_factory
+        overrides = getattr(scope.get("app"), "dependency_overrides", {})
+        return overrides.get(get_session_factory, get_session_factory)()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        key = Headers(scope=scope).get(IDEMPOTENCY_HEADER)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            await self._respond(scope, receive, send, 400, f"{IDEMPOTENCY_HEADER} must be 1 to {IDEMPOTENCY_KEY_MAX_LENGTH} characters")
+            return
+
+        body = await _read_body(receive)
+        row_key = key_hash(scope["method"], scope["path"], scope.get("query_string", b""), key)
+        body_hash = request_hash(body)
+        while True:
+            pending = self._in_flight.get(row_key)
+            if pending is None:
+                break
+            # Shielded: a waiter that disconnects must not cancel the shared future
+            stored = await asyncio.shield(pending)
+            if stored is not None:
+                IDEMPOTENT_REQUESTS.inc(path=scope["path"], outcome="coalesced")
+                await self._replay(scope, receive, send, stored, body_hash)
+                return
+            # The request it waited on was not stored; run this one
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[row_key] = future
+        stored = None
+        try:
+            stored = await self._lead(scope, receive, send, row_key, body, body_hash)
+        finally:
+            del self._in_flight[row_key]
+            future.set_result(stored)
+
+    async def _lead(self, scope: Scope, receive: Receive, send: Send, row_key: str, body: bytes,
+                    body_hash: str) -> Optional[StoredResponse]:
+        path = scope["path"]
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            async with self._sessions(scope)() as db:
+                claimed, existing = await claim_key(db, row_key, body_hash, self.ttl_seconds, self.lock_timeout_seconds)
+            if claimed:
+                IDEMPOTENT_REQUESTS.inc(path=path, outcome="executed")
+                return await self._execute(scope, receive, send, row_key, body, body_hash)
+            if existing is not None and existing.status_code is not None:
+                IDEMPOTENT_REQUESTS.inc(path=path, outcome="replayed")
+                stored = stored_response(existing)
+                await self._replay(scope, receive, send, stored, body_hash)
+                return stored
+            if existing is not None and time.monotonic() >= deadline:
+                IDEMPOTENT_REQUESTS.inc(path=path, outcome="in_progress")
+                await self._respond(scope, receive, send, 409, "A request with this Idempotency-Key is still in progress")
+                return None
+            if existing is not None:
+                # Another process is running it
+                await asyncio.sleep(self.poll_interval)
+
+    async def _execute(self, scope: Scope, receive: Receive, send: Send, row_key: str, body: bytes,
+                       body_hash: str) -> Optional[StoredResponse]:
+        status_code = 500
+        content_type = None
+        chunks: List[bytes] = []
+        delivered = False
+
+        async def receive_body() -> Message:
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        async def send_and_keep(message: Message) -> None:
+            nonlocal status_code, content_type
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                content_type = Headers(raw=message.get("headers", [])).get("content-type")
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_body, send_and_keep)
+        except BaseException:
+            async with self._sessions(scope)() as db:
+                await release_key(db, row_key)
+            raise
+        async with self._sessions(scope)() as db:
+            if status_code >= 500:
+                await release_key(db, row_key)
+                return None
+            stored = StoredResponse(body_hash, status_code, content_type, b"".join(chunks))
+            await complete_key(db, row_key, stored)
+        return stored
+
+    async def _replay(self, scope: Scope, receive: Receive, send: Send, stored: StoredResponse, body_hash: str) -> None:
+        scope["route"] = _RouteLabel(scope["path"])
+        if stored.request_hash != body_hash:
+            await self._respond(scope, receive, send, 422, "This Idempotency-Key was already used with a different request body")
+            return
+        headers = {REPLAYED_HEADER: "true"}
+        if stored.content_type:
+            headers["content-type"] = stored.content_type
+        await Response(stored.body, status_code=stored.status_code, headers=headers)(scope, receive, send)
+
+    @staticmethod
+    async def _respond(scope: Scope, receive: Receive, send: Send, status_code: int, detail: str) -> None:
+        scope["route"] = _RouteLabel(scope["path"])
+        await JSONResponse({"detail": detail}, status_code=status_code)(scope, receive, send)
+
+
+async def _read_body(receive: Receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(chunks)
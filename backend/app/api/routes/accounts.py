@@ -1,21 +1,28 @@
+import datetime
+from typing import List, Optional
+
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 
 from api.dependencies import get_db  # Centralized dependency
-from db.schemas import BankAccountCreate, BankAccountResponse
+from app.core.money import DEFAULT_CURRENCY, from_minor, to_minor
+from db.schemas import AccountBalanceResponse, BankAccountCreate, BankAccountList, BankAccountResponse, CurrencyCode
 from db.models import BankAccount, User
+from services.balances import balance_as_of
+from services.fx import FxRateUnavailable, fx_rates
 
 router = APIRouter()
 
 @router.post("/", response_model=BankAccountResponse)
-def create_account(
+async def create_account(
         account: BankAccountCreate,
         user_id: UUID = Query(..., description="ID of the user who owns this account"),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
     # Verify that the user exists
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -23,9 +30,67 @@ def create_account(
         user_id=user_id,
         institution_name=account.institution_name,
         account_type=account.account_type,
-        balance=account.balance
+        currency=account.currency or user.currency or DEFAULT_CURRENCY,
+        balance=account.balance,
+        opening_balance=account.balance,
+        opening_balance_at=datetime.datetime.utcnow(),
     )
     db.add(db_account)
-    db.commit()
-    db.refresh(db_account)
+    await db.commit()
+    await db.refresh(db_account)
     return db_account
+
+
+@router.get("/", response_model=BankAccountList)
+async def list_accounts(
+        user_id: UUID = Query(..., description="ID of the user whose accounts to list"),
+        currency: Optional[CurrencyCode] = Query(None, description="Also report balances, and their total, in this currency"),
+        db: AsyncSession = Depends(get_db)
+):
+    accounts: List[BankAccount] = (await db.scalars(
+        select(BankAccount).where(BankAccount.user_id == user_id).order_by(BankAccount.created_at, BankAccount.id)
+    )).all()
+    items = [BankAccountResponse.model_validate(account) for account in accounts]
+    if currency is None:
+        return BankAccountList(accounts=items)
+
+    # Every balance is converted in one vectorized call, at today's rates
+    try:
+        converted = (await fx_rates.get(db)).convert_minor(
+            [to_minor(account.balance) for account in accounts],
+            [account.currency for account in accounts],
+            [datetime.date.today()] * len(accounts),
+            currency,
+        )
+    except FxRateUnavailable as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    for item, minor in zip(items, converted.tolist()):
+        item.converted_balance = from_minor(minor)
+    return BankAccountList(accounts=items, currency=currency, total_balance=from_minor(int(converted.sum())))
+
+
+@router.get("/{account_id}/balance", response_model=AccountBalanceResponse)
+async def get_account_balance(
+        account_id: UUID,
+        user_id: UUID = Query(..., description="ID of the user who owns this account"),
+        as_of: Optional[datetime.date] = Query(None, description="Balance at the end of this day; the maintained balance when omitted"),
+        currency: Optional[CurrencyCode] = Query(None, description="Also report the balance in this currency, at the rate of that day"),
+        db: AsyncSession = Depends(get_db)
+):
+    account = await db.scalar(select(BankAccount).where(BankAccount.id == account_id, BankAccount.user_id == user_id))
+    if not account:
+        raise HTTPException(status_code=404, detail="Account not found")
+    if as_of is None:
+        balance = account.balance
+    else:
+        end_of_day = datetime.datetime.combine(as_of + datetime.timedelta(days=1), datetime.time())
+        balance = await balance_as_of(db, account, end_of_day)
+    response = AccountBalanceResponse(bank_account_id=account.id, as_of=as_of, balance=balance, currency=account.currency)
+    if currency is not None:
+        try:
+            rates = await fx_rates.get(db)
+            response.converted_balance = rates.convert(balance, account.currency, as_of or datetime.date.today(), currency)
+        except FxRateUnavailable as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        response.converted_currency = currency
+    return response
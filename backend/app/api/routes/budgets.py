@@ -0,0 +1,97 @@
+import datetime
+import uuid
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from uuid import UUID
+
+from api.dependencies import get_db  # Centralized dependency
+from app.core.config import BUDGET_DEFAULT_ALERT_PERCENTS
+from db.models import BankAccount, Budget, BudgetSpend, User
+from db.schemas import BudgetCreate, BudgetStatusResponse
+from services.budgets import BudgetScope, budget_statuses, fill_budget_spend
+from services.categorization import validate_rule
+
+router = APIRouter()
+
+def _response(budget: Budget, status: Dict[str, Any]) -> BudgetStatusResponse:
+    return BudgetStatusResponse(
+        id=budget.id,
+        name=budget.name,
+        amount=budget.amount,
+        bank_account_id=budget.bank_account_id,
+        category=budget.category,
+        pattern=budget.pattern,
+        is_regex=budget.is_regex,
+        alert_percents=budget.alert_percents,
+        **status,
+    )
+
+@router.get("/", response_model=List[BudgetStatusResponse])
+async def list_budgets(
+        user_id: UUID = Query(..., description="ID of the user whose budgets to list"),
+        month: Optional[datetime.date] = Query(None, description="Any day of the month to report on; defaults to the current month"),
+        db: AsyncSession = Depends(get_db)
+):
+    """Every budget with its spending, remaining amount and burn rate for the month."""
+    return [_response(budget, status) for budget, status in await budget_statuses(db, user_id, month)]
+
+@router.get("/{budget_id}", response_model=BudgetStatusResponse)
+async def get_budget(
+        budget_id: UUID,
+        user_id: UUID = Query(..., description="ID of the user who owns this budget"),
+        month: Optional[datetime.date] = Query(None, description="Any day of the month to report on; defaults to the current month"),
+        db: AsyncSession = Depends(get_db)
+):
+    found = await budget_statuses(db, user_id, month, budget_id=budget_id)
+    if not found:
+        raise HTTPException(status_code=404, detail="Budget not found")
+    return _response(*found[0])
+
+@router.post("/", response_model=BudgetStatusResponse)
+async def create_budget(
+        budget: BudgetCreate,
+        user_id: UUID = Query(..., description="ID of the user who owns this budget"),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Add a monthly budget. Its spending over recent months is counted from history straight away;
+    from then on every transaction written updates it.
+    """
+    if budget.pattern is not None:
+        try:
+            validate_rule(budget.pattern, budget.is_regex)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if not await db.scalar(select(User.id).where(User.id == user_id)):
+        raise HTTPException(status_code=404, detail="User not found")
+    if budget.bank_account_id is not None and not await db.scalar(
+        select(BankAccount.id).where(BankAccount.id == budget.bank_account_id, BankAccount.user_id == user_id)
+    ):
+        raise HTTPException(status_code=404, detail="Account not found")
+
+    values = budget.model_dump()
+    if values["alert_percents"] is None:
+        values["alert_percents"] = BUDGET_DEFAULT_ALERT_PERCENTS
+    db_budget = Budget(id=uuid.uuid4(), user_id=user_id, created_at=datetime.datetime.utcnow(), **values)
+    db.add(db_budget)
+    await db.flush()
+    await fill_budget_spend(db, BudgetScope(db_budget.id, user_id, **values))
+    await db.commit()
+    return _response(*(await budget_statuses(db, user_id, budget_id=db_budget.id))[0])
+
+@router.delete("/{budget_id}")
+async def delete_budget(
+        budget_id: UUID,
+        user_id: UUID = Query(..., description="ID of the user who owns this budget"),
+        db: AsyncSession = Depends(get_db)
+):
+    budget = await db.scalar(select(Budget).where(Budget.id == budget_id, Budget.user_id == user_id))
+    if not budget:
+        raise HTTPException(status_code=404, detail="Budget not found")
+    await db.execute(delete(BudgetSpend).where(BudgetSpend.budget_id == budget_id))
+    await db.delete(budget)
+    await db.commit()
+    return {"status": "deleted"}
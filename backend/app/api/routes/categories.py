@@ -0,0 +1,72 @@
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from uuid import UUID
+
+from api.dependencies import get_db  # Centralized dependency
+from db.models import CategoryRule, User
+from db.schemas import CategoryRuleCreate, CategoryRuleResponse
+from services.categorization import RECATEGORIZE_JOB, invalidate_categorizer, validate_rule
+from services.job_queue import enqueue
+
+router = APIRouter()
+
+@router.get("/rules", response_model=List[CategoryRuleResponse])
+async def list_rules(
+        user_id: UUID = Query(..., description="ID of the user whose rules to list"),
+        db: AsyncSession = Depends(get_db)
+):
+    return (await db.scalars(
+        select(CategoryRule).where(CategoryRule.user_id == user_id).order_by(CategoryRule.created_at, CategoryRule.id)
+    )).all()
+
+@router.post("/rules", response_model=CategoryRuleResponse)
+async def create_rule(
+        rule: CategoryRuleCreate,
+        user_id: UUID = Query(..., description="ID of the user who owns this rule"),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Add a rule for categorizing the user's new transactions.
+
+    Existing transactions keep their categories until POST /categories/recategorize is called.
+    """
+    try:
+        validate_rule(rule.pattern, rule.is_regex)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not await db.scalar(select(User.id).where(User.id == user_id)):
+        raise HTTPException(status_code=404, detail="User not found")
+
+    db_rule = CategoryRule(user_id=user_id, **rule.model_dump())
+    db.add(db_rule)
+    await db.commit()
+    await db.refresh(db_rule)
+    invalidate_categorizer(user_id)
+    return db_rule
+
+@router.delete("/rules/{rule_id}")
+async def delete_rule(
+        rule_id: UUID,
+        user_id: UUID = Query(..., description="ID of the user who owns this rule"),
+        db: AsyncSession = Depends(get_db)
+):
+    rule = await db.scalar(select(CategoryRule).where(CategoryRule.id == rule_id, CategoryRule.user_id == user_id))
+    if not rule:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    await db.delete(rule)
+    await db.commit()
+    invalidate_categorizer(user_id)
+    return {"status": "deleted"}
+
+@router.post("/recategorize", status_code=202)
+async def recategorize(
+        user_id: UUID = Query(..., description="ID of the user whose transactions to recategorize"),
+        db: AsyncSession = Depends(get_db)
+):
+    """Queue a background job that re-runs categorization over the user's whole history."""
+    job, created = await enqueue(db, RECATEGORIZE_JOB, {"user_id": str(user_id)}, dedup_key=f"recategorize:{user_id}")
+    await db.commit()
+    return {"status": "queued" if created else "duplicate", "job_id": job.id}
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.core.metrics import REGISTRY
+
+router = APIRouter()
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Every collected metric in the Prometheus text format. Serve it on an internal network only."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
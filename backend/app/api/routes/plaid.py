@@ -1,24 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+import json
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 from typing import Dict, Any, Optional
 from datetime import datetime
 
 from api.dependencies import get_db
-from services.plaid_service import PlaidService
+from app.core.config import PLAID_WEBHOOK_VERIFY
+from db.models import PlaidItem
+from db.schemas import PlaidRefreshRequest
+from services.async_plaid_service import AsyncPlaidService
+from services.job_queue import enqueue
+from services.plaid_cache import build_plaid_cache
+from services.plaid_sync import PlaidSyncError, sync_item
+from services.plaid_webhooks import WebhookVerificationError, WebhookVerifier, plan_webhook_job
 
 router = APIRouter()
-plaid_service = PlaidService()
+plaid_service = AsyncPlaidService(cache=build_plaid_cache())
+webhook_verifier = WebhookVerifier(plaid_service)
 
 @router.post("/create_link_token")
-def create_link_token(
+async def create_link_token(
     user_id: UUID = Query(..., description="ID of the user for whom to create a link token"),
     client_name: str = "My Dinero"
 ):
     """
     Create a link token for a user to connect their bank accounts via Plaid Link.
     """
-    result = plaid_service.create_link_token(str(user_id), client_name)
+    result = await plaid_service.create_link_token(str(user_id), client_name)
     
     if "error" in result:
         raise HTTPException(
@@ -29,14 +40,15 @@ def create_link_token(
     return result
 
 @router.post("/exchange_public_token")
-def exchange_public_token(
+async def exchange_public_token(
     public_token: str,
-    db: Session = Depends(get_db)
+    user_id: UUID = Query(..., description="ID of the user who completed the Plaid Link flow"),
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Exchange a public token received from Plaid Link for an access token.
+    Exchange a public token received from Plaid Link for an access token and store it for the user.
     """
-    result = plaid_service.exchange_public_token(public_token)
+    result = await plaid_service.exchange_public_token(public_token)
     
     if "error" in result:
         raise HTTPException(
@@ -44,20 +56,51 @@ def exchange_public_token(
             detail=result["error"]["message"]
         )
     
-    # TODO: Store the access token associated with the user who initiated the Plaid Link flow in database
+    item = await db.scalar(select(PlaidItem).where(PlaidItem.item_id == result["item_id"]))
+    if item is None:
+        item = PlaidItem(user_id=user_id, item_id=result["item_id"], access_token=result["access_token"])
+        db.add(item)
+    else:
+        # Re-linking an item issues a new access token; the sync cursor stays valid
+        item.access_token = result["access_token"]
+    await db.commit()
     
     return result
 
+@router.post("/items/{item_id}/sync")
+async def sync_item_transactions(
+    item_id: str,
+    user_id: UUID = Query(..., description="ID of the user who owns the Plaid item"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Pull transaction changes for a linked item since its last sync and apply them to stored transactions.
+    """
+    item = await db.scalar(select(PlaidItem).where(PlaidItem.item_id == item_id, PlaidItem.user_id == user_id))
+    if item is None:
+        raise HTTPException(status_code=404, detail="Plaid item not found")
+    
+    try:
+        counts = await sync_item(db, item, plaid_service)
+    except PlaidSyncError as e:
+        raise HTTPException(
+            status_code=e.error.get("status_code", 502),
+            detail=e.error.get("message", "Plaid sync failed")
+        )
+    
+    return {"item_id": item.item_id, **counts, "last_synced_at": item.last_synced_at}
+
 @router.get("/transactions")
-def get_transactions(
+async def get_transactions(
     access_token: str,
     start_date: Optional[datetime] = None,
-    end_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None,
+    force_refresh: bool = Query(False, description="Bypass the response cache and fetch from Plaid")
 ):
     """
     Get transactions for a user's financial accounts.
     """
-    result = plaid_service.get_transactions(access_token, start_date, end_date)
+    result = await plaid_service.get_transactions(access_token, start_date, end_date, force_refresh=force_refresh)
     
     if "error" in result:
         raise HTTPException(
@@ -68,13 +111,14 @@ def get_transactions(
     return result
 
 @router.get("/account_balances")
-def get_account_balances(
-    access_token: str
+async def get_account_balances(
+    access_token: str,
+    force_refresh: bool = Query(False, description="Bypass the response cache and fetch from Plaid")
 ):
     """
     Get balances for a user's financial accounts.
     """
-    result = plaid_service.get_account_balances(access_token)
+    result = await plaid_service.get_account_balances(access_token, force_refresh=force_refresh)
     
     if "error" in result:
         raise HTTPException(
@@ -82,4 +126,70 @@ def get_account_balances(
             detail=result["error"]["message"]
         )
     
-    return result
\ No newline at end of file
+    return result
+
+@router.post("/refresh")
+async def refresh_items(
+    request: PlaidRefreshRequest
+):
+    """
+    Refresh balances and transactions for several linked items in one call.
+
+    Items are fetched concurrently; failures are reported per item in `items` instead of
+    failing the whole request.
+    """
+    if not request.access_tokens:
+        raise HTTPException(status_code=400, detail="At least one access token is required")
+    
+    return await plaid_service.refresh_items(
+        request.access_tokens,
+        request.start_date,
+        request.end_date,
+        request.include_transactions,
+        force_refresh=request.force_refresh
+    )
+
+@router.post("/cache/invalidate")
+async def invalidate_cache(
+    access_token: str
+):
+    """
+    Drop cached balances and transactions for an item so the next read fetches from Plaid.
+    """
+    await plaid_service.invalidate_cache(access_token)
+    return {"invalidated": True}
+
+@router.post("/webhook")
+async def receive_webhook(
+    request: Request,
+    plaid_verification: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Receive a Plaid webhook.
+
+    The event is verified and turned into a background job; the actual sync runs on a worker.
+    Repeated sync events for an item while one is still queued collapse into that job.
+    """
+    body = await request.body()
+    if PLAID_WEBHOOK_VERIFY:
+        try:
+            await webhook_verifier.verify(body, plaid_verification)
+        except WebhookVerificationError as e:
+            raise HTTPException(status_code=401, detail=str(e))
+    
+    try:
+        event = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Webhook body must be JSON")
+    if not isinstance(event, dict):
+        raise HTTPException(status_code=400, detail="Webhook body must be a JSON object")
+    
+    planned = plan_webhook_job(event)
+    if planned is None:
+        return {"status": "ignored"}
+    
+    kind, payload, dedup_key = planned
+    job, created = await enqueue(db, kind, payload, dedup_key=dedup_key)
+    await db.commit()
+    return {"status": "queued" if created else "duplicate", "job_id": job.id}
@@ -0,0 +1,61 @@
+import datetime
+from typing import List
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from uuid import UUID
+
+from api.dependencies import get_db  # Centralized dependency
+from db.models import Subscription
+from db.schemas import SubscriptionResponse
+from services.job_queue import enqueue
+from services.subscriptions import DETECT_SUBSCRIPTIONS_JOB, is_lapsed
+
+router = APIRouter()
+
+@router.get("/", response_model=List[SubscriptionResponse])
+async def list_subscriptions(
+        user_id: UUID = Query(..., description="ID of the user whose recurring payments to list"),
+        include_lapsed: bool = Query(False, description="Also list subscriptions whose predicted payment is overdue"),
+        db: AsyncSession = Depends(get_db)
+):
+    """Recurring payments detected in the user's transactions, soonest next payment first."""
+    found: List[Subscription] = (await db.scalars(
+        select(Subscription)
+        .where(Subscription.user_id == user_id, Subscription.is_recurring.is_(True))
+        .order_by(Subscription.next_date, Subscription.merchant)
+    )).all()
+    today = datetime.date.today()
+    results = []
+    for subscription in found:
+        lapsed = is_lapsed(subscription, today)
+        if lapsed and not include_lapsed:
+            continue
+        results.append(SubscriptionResponse(
+            id=subscription.id,
+            bank_account_id=subscription.bank_account_id,
+            merchant=subscription.merchant,
+            period=subscription.period,
+            amount=subscription.amount,
+            last_date=subscription.last_date,
+            next_date=subscription.next_date,
+            next_amount=subscription.next_amount,
+            status="lapsed" if lapsed else "active",
+        ))
+    return results
+
+@router.post("/refresh", status_code=202)
+async def refresh_subscriptions(
+        user_id: UUID = Query(..., description="ID of the user whose history to rescan"),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Queue a full rescan of the user's history.
+
+    New transactions update their merchant's subscription as they are written; this is only
+    needed for history written before detection existed.
+    """
+    job, created = await enqueue(db, DETECT_SUBSCRIPTIONS_JOB, {"user_id": str(user_id)}, dedup_key=f"subscriptions:{user_id}")
+    await db.commit()
+    return {"status": "queued" if created else "duplicate", "job_id": job.id}
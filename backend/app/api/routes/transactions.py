@@ -1,32 +1,427 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+import base64
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, List, Literal, Optional, Tuple
+
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, UploadFile
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from uuid import UUID
 
-from api.dependencies import get_db  # Centralized dependency
-from db.schemas import TransactionCreate, TransactionResponse
-from db.models import Transaction, BankAccount
+from api.dependencies import get_db, get_session_factory  # Centralized dependency
+from app.core.config import BULK_TRANSACTIONS_MAX_ROWS
+from app.core.money import from_minor, to_minor
+from db.schemas import (
+    CurrencyCode,
+    TransactionCreate,
+    TransactionResponse,
+    TransactionPage,
+    TransactionSearchResults,
+    BulkTransactionResult,
+    BulkTransactionResponse,
+    StatementImportResponse,
+    TransactionSummary,
+    TransactionSummaryBucket,
+)
+from db.models import Transaction, TransactionRollup, BankAccount
+from services.fx import FxRateUnavailable, converted_rollup_totals, fx_rates
+from services.rollups import next_period_start, period_start
+from services.search import search_transactions
+from services.statement_import import StatementFormatError, import_statement, parse_csv, parse_ofx
+from services.transaction_export import MEDIA_TYPES, SERIALIZERS, export_query, parquet_available, stream_partitions
+from services.transaction_writer import insert_transactions, prepare_transaction_row
 
 router = APIRouter()
 
+def encode_cursor(date: datetime, transaction_id: UUID) -> str:
+    """Encode the (date, id) position of the last row on a page as an opaque cursor."""
+    raw = json.dumps({"d": date.isoformat(), "i": str(transaction_id)}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(data["d"]), UUID(data["i"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/", response_model=TransactionPage)
+async def list_transactions(
+        user_id: UUID = Query(..., description="ID of the user whose transactions to list"),
+        bank_account_id: Optional[UUID] = Query(None, description="Only return transactions for this bank account"),
+        start_date: Optional[datetime] = Query(None, description="Only return transactions on or after this date"),
+        end_date: Optional[datetime] = Query(None, description="Only return transactions before this date"),
+        min_amount: Optional[Decimal] = Query(None, description="Only return transactions with at least this amount"),
+        max_amount: Optional[Decimal] = Query(None, description="Only return transactions with at most this amount"),
+        category: Optional[str] = Query(None, description="Only return transactions in this category"),
+        cursor: Optional[str] = Query(None, description="Opaque cursor returned as next_cursor by the previous page"),
+        limit: int = Query(50, ge=1, le=500),
+        currency: Optional[CurrencyCode] = Query(None, description="Also report amounts in this currency, at the rate of each transaction's day"),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    List a user's transactions, newest first.
+
+    Pages are fetched with a seek on (user_id, date, id) rather than OFFSET, so every page
+    costs the same index range scan regardless of how deep into the history it is.
+    """
+    stmt = select(Transaction).where(Transaction.user_id == user_id)
+    if bank_account_id is not None:
+        stmt = stmt.where(Transaction.bank_account_id == bank_account_id)
+    if start_date is not None:
+        stmt = stmt.where(Transaction.date >= start_date)
+    if end_date is not None:
+        stmt = stmt.where(Transaction.date < end_date)
+    if min_amount is not None:
+        stmt = stmt.where(Transaction.amount >= min_amount)
+    if max_amount is not None:
+        stmt = stmt.where(Transaction.amount <= max_amount)
+    if category is not None:
+        stmt = stmt.where(Transaction.category == category)
+    if cursor is not None:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(Transaction.date, Transaction.id) < tuple_(cursor_date, cursor_id))
+
+    stmt = stmt.order_by(Transaction.date.desc(), Transaction.id.desc()).limit(limit + 1)
+    rows = (await db.scalars(stmt)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].date, rows[-1].id)
+    if currency is None or not rows:
+        return TransactionPage(items=rows, next_cursor=next_cursor, currency=currency)
+
+    account_currencies = dict((await db.execute(
+        select(BankAccount.id, BankAccount.currency).where(BankAccount.id.in_({row.bank_account_id for row in rows}))
+    )).all())
+    try:
+        converted = (await fx_rates.get(db)).convert_minor(
+            [to_minor(row.amount) for row in rows],
+            [account_currencies[row.bank_account_id] for row in rows],
+            [row.date for row in rows],
+            currency,
+        )
+    except FxRateUnavailable as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    items = [TransactionResponse.model_validate(row) for row in rows]
+    for item, minor in zip(items, converted.tolist()):
+        item.converted_amount = from_minor(minor)
+    return TransactionPage(items=items, next_cursor=next_cursor, currency=currency)
+
+@router.get("/search", response_model=TransactionSearchResults)
+async def search(
+        user_id: UUID = Query(..., description="ID of the user whose transactions to search"),
+        q: str = Query(..., min_length=1, max_length=200, description="Words to find in descriptions; each also matches as a prefix"),
+        bank_account_id: Optional[UUID] = Query(None, description="Only search this bank account"),
+        start_date: Optional[datetime] = Query(None, description="Only return transactions on or after this date"),
+        end_date: Optional[datetime] = Query(None, description="Only return transactions before this date"),
+        min_amount: Optional[Decimal] = Query(None, description="Only return transactions with at least this amount"),
+        max_amount: Optional[Decimal] = Query(None, description="Only return transactions with at most this amount"),
+        category: Optional[str] = Query(None, description="Only return transactions in this category"),
+        limit: int = Query(20, ge=1, le=100),
+        offset: int = Query(0, ge=0, le=1000, description="Results to skip, for paging"),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Search a user's transactions by description, best matches first.
+
+    Descriptions are matched in their normalized merchant form, so "starbucks" finds
+    "SQ *STARBUCKS #0423" and "starb" finds it too.
+    """
+    criteria = []
+    if bank_account_id is not None:
+        criteria.append(Transaction.bank_account_id == bank_account_id)
+    if start_date is not None:
+        criteria.append(Transaction.date >= start_date)
+    if end_date is not None:
+        criteria.append(Transaction.date < end_date)
+    if min_amount is not None:
+        criteria.append(Transaction.amount >= min_amount)
+    if max_amount is not None:
+        criteria.append(Transaction.amount <= max_amount)
+    if category is not None:
+        criteria.append(Transaction.category == category)
+
+    rows = await search_transactions(db, user_id, q, criteria, limit=limit + 1, offset=offset)
+    next_offset = offset + limit if len(rows) > limit else None
+    return TransactionSearchResults(items=rows[:limit], next_offset=next_offset)
+
 @router.post("/", response_model=TransactionResponse)
-def create_transaction(
+async def create_transaction(
         transaction: TransactionCreate,
         user_id: UUID = Query(..., description="ID of the user creating the transaction"),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
     # Verify that the bank account exists
-    account = db.query(BankAccount).filter(BankAccount.id == transaction.bank_account_id).first()
+    account = await db.scalar(select(BankAccount).where(BankAccount.id == transaction.bank_account_id))
     if not account:
         raise HTTPException(status_code=404, detail="Bank account not found")
 
-    db_transaction = Transaction(
-        user_id=user_id,
-        bank_account_id=transaction.bank_account_id,
-        description=transaction.description,
-        amount=transaction.amount,
-        date=transaction.date  # If None, model default will be used.
+    # Written through the shared writer so rollups and other derived state stay in step
+    row = prepare_transaction_row({
+        "user_id": user_id,
+        "bank_account_id": transaction.bank_account_id,
+        "description": transaction.description,
+        "amount": transaction.amount,
+        "date": transaction.date,
+        "category": transaction.category,
+    })
+    await insert_transactions(db, [row])
+    await db.commit()
+    return Transaction(**row)
+
+@router.get("/summary", response_model=TransactionSummary)
+async def summarize_transactions(
+        user_id: UUID = Query(..., description="ID of the user whose transactions to summarize"),
+        period: Literal["day", "week", "month"] = Query("month", description="Bucket size; weeks start on Monday"),
+        start_date: Optional[datetime] = Query(None, description="First bucket is the one containing this date"),
+        end_date: Optional[datetime] = Query(None, description="Only include buckets starting before this date"),
+        bank_account_id: Optional[UUID] = Query(None, description="Only summarize this bank account"),
+        by_account: bool = Query(False, description="Return one bucket per account instead of totals across accounts"),
+        currency: Optional[CurrencyCode] = Query(None, description="Convert totals to this currency, at the rate of each day"),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Inflow, outflow and net totals per day, week or month.
+
+    Served from the transaction_rollups table, so the cost depends on the number of buckets
+    returned rather than the number of transactions behind them. Without a currency, totals
+    simply add up the accounts' own amounts.
+    """
+    if currency is not None:
+        return await _summarize_converted(user_id, period, start_date, end_date, bank_account_id, by_account, currency, db)
+
+    columns = [TransactionRollup.period_start]
+    if by_account:
+        columns.append(TransactionRollup.bank_account_id)
+    stmt = (
+        select(
+            *columns,
+            func.sum(TransactionRollup.inflow),
+            func.sum(TransactionRollup.outflow),
+            func.sum(TransactionRollup.transaction_count),
+        )
+        .where(TransactionRollup.user_id == user_id, TransactionRollup.period == period)
+        .group_by(*columns)
+        # Buckets emptied by deletes are kept at zero rather than removed
+        .having(func.sum(TransactionRollup.transaction_count) > 0)
+        .order_by(*columns)
     )
-    db.add(db_transaction)
-    db.commit()
-    db.refresh(db_transaction)
-    return db_transaction
+    if start_date is not None:
+        stmt = stmt.where(TransactionRollup.period_start >= period_start(start_date, period))
+    if end_date is not None:
+        stmt = stmt.where(TransactionRollup.period_start < end_date.date())
+    if bank_account_id is not None:
+        stmt = stmt.where(TransactionRollup.bank_account_id == bank_account_id)
+
+    buckets = []
+    for row in await db.execute(stmt):
+        bucket_start, *account, inflow, outflow, count = row
+        buckets.append(TransactionSummaryBucket(
+            period_start=bucket_start,
+            bank_account_id=account[0] if account else None,
+            inflow=inflow,
+            outflow=outflow,
+            net=inflow - outflow,
+            transaction_count=count,
+        ))
+    return TransactionSummary(period=period, buckets=buckets)
+
+async def _summarize_converted(user_id: UUID, period: str, start_date: Optional[datetime], end_date: Optional[datetime],
+                               bank_account_id: Optional[UUID], by_account: bool, currency: str, db: AsyncSession) -> TransactionSummary:
+    # Day rollups are converted at their own day's rate and then added up into buckets
+    criteria = []
+    if start_date is not None:
+        criteria.append(TransactionRollup.period_start >= period_start(start_date, period))
+    if end_date is not None:
+        # Every day of the last bucket starting before end_date
+        criteria.append(TransactionRollup.period_start < next_period_start(end_date.date() - timedelta(days=1), period))
+    if bank_account_id is not None:
+        criteria.append(TransactionRollup.bank_account_id == bank_account_id)
+    try:
+        rates = await fx_rates.get(db)
+        totals = await converted_rollup_totals(db, rates, currency, user_id, period, criteria, by_account)
+    except FxRateUnavailable as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    buckets = [
+        TransactionSummaryBucket(
+            period_start=bucket_start,
+            bank_account_id=account_id,
+            inflow=inflow,
+            outflow=outflow,
+            net=inflow - outflow,
+            transaction_count=count,
+        )
+        for bucket_start, account_id, inflow, outflow, count in totals
+    ]
+    return TransactionSummary(period=period, buckets=buckets, currency=currency)
+
+@router.get("/export")
+async def export_transactions(
+        user_id: UUID = Query(..., description="ID of the user whose transactions to export"),
+        format: Literal["csv", "ndjson", "parquet"] = Query("csv", description="Output format"),
+        bank_account_id: Optional[UUID] = Query(None, description="Only export transactions for this bank account"),
+        start_date: Optional[datetime] = Query(None, description="Only export transactions on or after this date"),
+        end_date: Optional[datetime] = Query(None, description="Only export transactions before this date"),
+        session_factory: async_sessionmaker = Depends(get_session_factory)
+):
+    """
+    Stream a user's transactions, oldest first, as CSV, NDJSON or Parquet.
+
+    Rows are read through a server-side cursor in EXPORT_BATCH_SIZE batches and written out
+    batch by batch, so memory use does not grow with the size of the history.
+    """
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export requires the 'pyarrow' package")
+
+    stmt = export_query(user_id, bank_account_id, start_date, end_date)
+    body = SERIALIZERS[format](stream_partitions(session_factory, stmt))
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="transactions.{format}"'}
+    )
+
+def _parse_json_line(index: int, line: bytes) -> Tuple[int, Any, Optional[str]]:
+    try:
+        return index, json.loads(line), None
+    except ValueError as e:
+        return index, None, f"Invalid JSON: {e}"
+
+async def _read_bulk_payload(request: Request) -> List[Tuple[int, Any, Optional[str]]]:
+    """
+    Read a bulk body as (index, payload, parse_error) entries.
+
+    application/x-ndjson bodies are split line by line as they stream in; anything else is
+    parsed as a single JSON array.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        entries = []
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    entries.append(_parse_json_line(len(entries), line))
+            if len(entries) > BULK_TRANSACTIONS_MAX_ROWS:
+                break
+        if buffer.strip():
+            entries.append(_parse_json_line(len(entries), buffer))
+        return entries
+
+    try:
+        payload = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Request body must be a JSON array of transactions")
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=400, detail="Request body must be a JSON array of transactions")
+    return [(index, item, None) for index, item in enumerate(payload)]
+
+def _format_validation_error(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in error.errors())
+
+@router.post("/bulk", response_model=BulkTransactionResponse)
+async def create_transactions_bulk(
+        request: Request,
+        user_id: UUID = Query(..., description="ID of the user creating the transactions"),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Create many transactions in one request.
+
+    The body is either a JSON array of TransactionCreate objects or, with Content-Type
+    application/x-ndjson, one TransactionCreate object per line. Account ownership is checked
+    with a single query and all accepted rows are inserted in batches within one database
+    transaction. Rows that fail validation or reference an unknown account are reported in
+    results without failing the rest of the request.
+    """
+    entries = await _read_bulk_payload(request)
+    if len(entries) > BULK_TRANSACTIONS_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_TRANSACTIONS_MAX_ROWS} transactions can be created per request")
+
+    results: List[BulkTransactionResult] = []
+    valid: List[Tuple[int, TransactionCreate]] = []
+    for index, payload, parse_error in entries:
+        if parse_error is not None:
+            results.append(BulkTransactionResult(index=index, status="error", error=parse_error))
+            continue
+        try:
+            valid.append((index, TransactionCreate.model_validate(payload)))
+        except ValidationError as e:
+            results.append(BulkTransactionResult(index=index, status="error", error=_format_validation_error(e)))
+
+    account_ids = {transaction.bank_account_id for _, transaction in valid}
+    owned_accounts = set()
+    if account_ids:
+        owned_accounts = set(await db.scalars(
+            select(BankAccount.id).where(BankAccount.id.in_(account_ids), BankAccount.user_id == user_id)
+        ))
+
+    rows = []
+    for index, transaction in valid:
+        if transaction.bank_account_id not in owned_accounts:
+            results.append(BulkTransactionResult(index=index, status="error", error="Bank account not found"))
+            continue
+        row = prepare_transaction_row({
+            "user_id": user_id,
+            "bank_account_id": transaction.bank_account_id,
+            "description": transaction.description,
+            "amount": transaction.amount,
+            "date": transaction.date,
+            "category": transaction.category,
+        })
+        rows.append(row)
+        results.append(BulkTransactionResult(index=index, status="created", id=row["id"]))
+
+    if rows:
+        await insert_transactions(db, rows)
+        await db.commit()
+
+    results.sort(key=lambda result: result.index)
+    return BulkTransactionResponse(created=len(rows), failed=len(results) - len(rows), results=results)
+
+@router.post("/import", response_model=StatementImportResponse)
+async def import_transactions(
+        file: UploadFile = File(..., description="CSV, OFX or QFX statement"),
+        user_id: UUID = Query(..., description="ID of the user importing the statement"),
+        bank_account_id: UUID = Query(..., description="Bank account the statement belongs to"),
+        format: Optional[Literal["csv", "ofx", "qfx"]] = Query(None, description="Defaults to the file extension"),
+        date_format: Optional[str] = Query(None, description="strptime format for CSV dates, e.g. %d/%m/%Y"),
+        negate_amounts: bool = Query(False, description="Set when the statement shows money going out as positive"),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Import a bank statement into one of the user's accounts.
+
+    The upload is parsed as it is read and written in IMPORT_BATCH_SIZE batches. Rows that
+    match a transaction already on the account (same day, amount and normalized description)
+    are counted as duplicates and skipped, so re-importing an overlapping statement is safe.
+    """
+    account = await db.scalar(select(BankAccount).where(BankAccount.id == bank_account_id, BankAccount.user_id == user_id))
+    if not account:
+        raise HTTPException(status_code=404, detail="Bank account not found")
+
+    if format is None:
+        extension = (file.filename or "").rsplit(".", 1)[-1].lower()
+        if extension not in ("csv", "ofx", "qfx"):
+            raise HTTPException(status_code=400, detail="Could not tell the statement format from the file name; pass format")
+        format = extension
+
+    if format == "csv":
+        rows = parse_csv(file.file, date_format=date_format, negate_amounts=negate_amounts)
+    else:
+        # QFX is OFX with Quicken-specific extras
+        rows = parse_ofx(file.file, negate_amounts=negate_amounts)
+
+    try:
+        result = await import_statement(db, user_id, bank_account_id, rows)
+    except StatementFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return result
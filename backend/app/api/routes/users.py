@@ -1,26 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from api.dependencies import get_db
 from db.schemas import UserCreate, UserResponse
 from db.models import User
-
-from passlib.context import CryptContext
+from app.core.security import hash_password
 
 router = APIRouter()
 
-# Initialize the CryptContext for bcrypt
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
 @router.post("/register", response_model=UserResponse)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(User).filter(User.email == user.email).first()
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    existing_user = await db.scalar(select(User).where(User.email == user.email))
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_pw = hash_password(user.password)
+    hashed_pw = await hash_password(user.password)
     db_user = User(
         email=user.email,
         password_hash=hashed_pw,
@@ -28,6 +22,6 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
         currency=user.currency
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
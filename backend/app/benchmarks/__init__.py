@@ -0,0 +1,12 @@
+"""
+Benchmark and load-test suite.
+
+Seeds a synthetic dataset, starts the API (and the local Plaid server, fake_plaid) with uvicorn,
+drives it with concurrent clients and reports p50/p95/p99 latency and throughput per workload:
+
+    cd backend
+    PYTHONPATH=app python -m app.benchmarks run --users 20 --accounts 3 --transactions 500
+    PYTHONPATH=app python -m app.benchmarks run --database postgresql://bench@localhost/bench_dinero
+
+Results can be saved as a baseline and later runs compared against it; see __main__.
+"""
@@ -0,0 +1,190 @@
+"""
+Benchmark runner: `python -m app.benchmarks run [options]`, from backend/ with PYTHONPATH=app.
+
+Seeds a fresh database, serves the API and the local Plaid server (fake_plaid, with
+PLAID_ENV=local) with uvicorn in subprocesses, so the client's own overhead stays out of the
+server's process, runs each workload and prints a table. --save-baseline writes the results to
+baselines/<backend>.json; --compare checks them against that file and exits with status 1 on a
+regression beyond --tolerance.
+
+The API hashes passwords with --bcrypt-rounds (4, bcrypt's minimum, by default) rather than the
+production cost: at 12 rounds login and registration measure little but how many cores the
+machine has to hash on. Baselines record the machine and the settings they were taken with, and
+--compare refuses a baseline taken with different settings.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+from sqlalchemy.engine import make_url
+
+from db.session import create_async_db_engine
+
+from .dataset import seed_dataset
+from .workloads import build_workloads, compare_to_baseline, run_workload
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+# Settings a baseline is only comparable under
+BASELINE_SETTINGS = (
+    "users", "accounts", "transactions", "requests", "concurrency", "seed",
+    "plaid_transactions", "plaid_latency_ms", "plaid_error_rate", "bcrypt_rounds",
+)
+DEFAULT_WORKLOADS = [
+    "login", "register", "create_account", "create_transaction", "list_transactions", "list_accounts",
+    "plaid_link_token", "plaid_balances", "plaid_sync",
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve(app: str, port: int, env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+
+
+async def _wait_until_up(url: str, process: subprocess.Popen, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server for {url} exited with status {process.returncode}")
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server for {url} did not start within {timeout:.0f}s")
+
+
+def _machine() -> Dict[str, Any]:
+    return {"cpu_count": os.cpu_count(), "processor": platform.machine(), "system": platform.system(),
+            "python": platform.python_version()}
+
+
+def _print_table(results: Dict[str, Dict[str, Any]]) -> None:
+    columns = ["requests", "errors", "rps", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+    print(f"{'workload':<20}" + "".join(f"{column:>10}" for column in columns))
+    for name, result in results.items():
+        print(f"{name:<20}" + "".join(f"{result[column]:>10}" for column in columns))
+
+
+async def _run(args: argparse.Namespace) -> int:
+    database_url = args.database or f"sqlite:///{Path(tempfile.mkdtemp(prefix='dinero-bench-')) / 'bench.db'}"
+    backend = make_url(database_url).get_backend_name()
+    unknown = set(args.workloads) - set(DEFAULT_WORKLOADS)
+    if unknown:
+        print(f"Unknown workloads: {', '.join(sorted(unknown))}", file=sys.stderr)
+        return 2
+    settings = {name: getattr(args, name) for name in BASELINE_SETTINGS}
+    baseline_file = BASELINE_DIR / f"{backend}.json"
+    baseline: Dict[str, Any] = {}
+    if args.compare:
+        if not baseline_file.exists():
+            print(f"No baseline at {baseline_file}; run with --save-baseline first", file=sys.stderr)
+            return 2
+        baseline = json.loads(baseline_file.read_text())
+        differing = sorted(name for name in BASELINE_SETTINGS if baseline["settings"].get(name) != settings[name])
+        if differing:
+            print(f"{baseline_file.name} was recorded with different settings ({', '.join(differing)}); "
+                  "run with the same settings or record a new baseline", file=sys.stderr)
+            return 2
+        if baseline.get("machine") != _machine():
+            print(f"Warning: {baseline_file.name} was recorded on a different machine ({baseline.get('machine')}); "
+                  "expect differences beyond --tolerance", file=sys.stderr)
+
+    print(f"Seeding {args.users} users x {args.accounts} accounts x {args.transactions} transactions on {backend}")
+    engine = create_async_db_engine(database_url)
+    try:
+        started = time.perf_counter()
+        manifest = await seed_dataset(engine, args.users, args.accounts, args.transactions, seed=args.seed,
+                                      bcrypt_rounds=args.bcrypt_rounds)
+        print(f"Seeded {manifest['transactions']} transactions in {time.perf_counter() - started:.1f}s")
+    finally:
+        await engine.dispose()
+
+    plaid_port, api_port = _free_port(), _free_port()
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(["app", "."]), DATABASE_URL=database_url, JOB_WORKERS="0",
+               PLAID_ENV="local", FAKE_PLAID_URL=f"http://127.0.0.1:{plaid_port}", PLAID_CLIENT_ID="bench", PLAID_SECRET="bench",
+               FAKE_PLAID_TRANSACTIONS=str(args.plaid_transactions), FAKE_PLAID_LATENCY_MS=str(args.plaid_latency_ms),
+               FAKE_PLAID_ERROR_RATE=str(args.plaid_error_rate), FAKE_PLAID_SEED=str(args.seed),
+               BCRYPT_ROUNDS=str(args.bcrypt_rounds))
+    servers = [_serve("fake_plaid:app", plaid_port, env), _serve("main:app", api_port, env)]
+    try:
+        await _wait_until_up(f"http://127.0.0.1:{plaid_port}/docs", servers[0])
+        await _wait_until_up(f"http://127.0.0.1:{api_port}/docs", servers[1])
+        workloads = build_workloads(manifest)
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        results: Dict[str, Dict[str, Any]] = {}
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{api_port}", limits=limits, timeout=60) as client:
+            for name in args.workloads:
+                results[name] = await run_workload(client, workloads[name], args.requests, args.concurrency,
+                                                   seed=args.seed, warmup=args.warmup)
+    finally:
+        for server in servers:
+            server.terminate()
+        for server in servers:
+            server.wait()
+
+    _print_table(results)
+    if args.save_baseline:
+        baseline_file.write_text(json.dumps({"machine": _machine(), "settings": settings, "results": results}, indent=2) + "\n")
+        print(f"Saved baseline to {baseline_file}")
+    if args.compare:
+        regressions: List[str] = compare_to_baseline(results, baseline["results"], args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} of {baseline_file.name}")
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="My Dinero benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Seed a database, start the API against it and load it")
+    run.add_argument("--database", default=None,
+                     help="Database URL to seed and benchmark; it is wiped first. Defaults to a new SQLite file")
+    run.add_argument("--users", type=int, default=20)
+    run.add_argument("--accounts", type=int, default=3, help="Accounts per user")
+    run.add_argument("--transactions", type=int, default=500, help="Transactions per account")
+    run.add_argument("--requests", type=int, default=500, help="Measured requests per workload")
+    run.add_argument("--concurrency", type=int, default=16, help="Concurrent clients per workload")
+    run.add_argument("--warmup", type=int, default=20, help="Unmeasured requests before each workload")
+    run.add_argument("--workloads", nargs="+", default=DEFAULT_WORKLOADS, metavar="WORKLOAD",
+                     help=f"Any of: {', '.join(DEFAULT_WORKLOADS)}")
+    run.add_argument("--plaid-transactions", type=int, default=250, help="Transactions per account of each item's Plaid history")
+    run.add_argument("--plaid-latency-ms", type=float, default=50, help="Latency the local Plaid server adds to every call")
+    run.add_argument("--plaid-error-rate", type=float, default=0, help="Fraction of Plaid calls failing with a 500 (retried)")
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--bcrypt-rounds", type=int, default=4,
+                     help="BCRYPT_ROUNDS for the API and the seeded users; raise it to measure the production cost of login")
+    run.add_argument("--save-baseline", action="store_true", help="Write results to baselines/<backend>.json")
+    run.add_argument("--compare", action="store_true", help="Fail on regressions against baselines/<backend>.json")
+    run.add_argument("--tolerance", type=float, default=0.25,
+                     help="Allowed p95 growth or throughput drop before --compare fails, as a fraction")
+
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Synthetic dataset for benchmarks: users x accounts x transactions, reproducible from a seed.
+
+Transactions go through the transaction writer, so rollups, balances, categories, search text,
+subscriptions and budgets are populated just as they would be by real traffic.
+"""
+import datetime
+import random
+import uuid
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from app.core.security import hash_password, pwd_context
+from db.base import Base
+from db.models import BankAccount, PlaidItem, User
+from services.transaction_writer import insert_transactions
+
+BENCH_PASSWORD = "bench-password"
+
+# (description, typical amount); a payment's amount varies around it, income is positive
+MERCHANTS = [
+    ("SQ *STARBUCKS #{n}", -6), ("TIM HORTONS #{n}", -4), ("UBER EATS", -28), ("DOORDASH*{n}", -35),
+    ("LOBLAWS #{n}", -85), ("COSTCO WHOLESALE #{n}", -160), ("METRO {n}", -60), ("SHELL {n}", -55),
+    ("PETRO CANADA {n}", -50), ("AMAZON.CA*{n}", -42), ("WALMART #{n}", -70), ("CANADIAN TIRE #{n}", -65),
+    ("NETFLIX.COM", -17), ("SPOTIFY P{n}", -11), ("ROGERS WIRELESS", -95), ("HYDRO ONE", -120),
+    ("SHOPPERS DRUG MART #{n}", -25), ("CINEPLEX {n}", -30), ("AIR CANADA {n}", -480), ("PAYROLL DEPOSIT", 2600),
+    ("E-TRANSFER {n}", -150), ("INTEREST CHARGE", -12),
+]
+ACCOUNT_TYPES = ["checking", "savings", "credit"]
+
+
+def _transaction(rng: random.Random, user_id: Any, account_id: Any, today: datetime.date, days: int) -> Dict[str, Any]:
+    description, typical = rng.choice(MERCHANTS)
+    amount = round(typical * rng.lognormvariate(0, 0.35), 2)
+    day = today - datetime.timedelta(days=rng.randrange(days))
+    return {
+        "user_id": user_id,
+        "bank_account_id": account_id,
+        "description": description.format(n=rng.randrange(100, 9999)),
+        "amount": amount,
+        "date": datetime.datetime.combine(day, datetime.time(rng.randrange(24), rng.randrange(60))),
+    }
+
+
+async def seed_dataset(engine: AsyncEngine, users: int, accounts: int, transactions: int, seed: int = 42,
+                       history_days: int = 365, batch_size: int = 5000, bcrypt_rounds: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Recreate every table on engine and fill it.
+
+    The database is wiped first, so point it at a throwaway database only.
+
+    Args:
+        users: Number of users, all with the password BENCH_PASSWORD and one linked (never yet synced)
+            Plaid item whose access token the local Plaid server (fake_plaid) answers for
+        accounts: Bank accounts per user
+        transactions: Transactions per account, spread over the last history_days days
+        bcrypt_rounds: Cost of the users' password hash; it should match the API's BCRYPT_ROUNDS, or
+            every first login also rehashes. Defaults to this process's BCRYPT_ROUNDS
+
+    Returns:
+        A manifest of what was created: the users' ids and emails, their account ids and Plaid item
+    """
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    rng = random.Random(seed)
+    today = datetime.datetime.utcnow().date()
+    # One bcrypt hash shared by every user keeps seeding fast without changing what login costs
+    if bcrypt_rounds is None:
+        password_hash = await hash_password(BENCH_PASSWORD)
+    else:
+        password_hash = pwd_context.handler("bcrypt").using(rounds=bcrypt_rounds).hash(BENCH_PASSWORD)
+    sessions = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    manifest: List[Dict[str, Any]] = []
+    async with sessions() as db:
+        for user_index in range(users):
+            user = User(id=uuid.UUID(int=rng.getrandbits(128), version=4), email=f"bench{user_index}@example.com", password_hash=password_hash,
+                        name=f"Bench User {user_index}", currency="CAD")
+            db.add(user)
+            item = PlaidItem(user_id=user.id, item_id=f"item-local-bench{user_index}", access_token=f"access-local-bench{user_index}")
+            db.add(item)
+            account_ids = []
+            for account_index in range(accounts):
+                account = BankAccount(id=uuid.UUID(int=rng.getrandbits(128), version=4), user_id=user.id, institution_name="Bench Bank",
+                                      account_type=ACCOUNT_TYPES[account_index % len(ACCOUNT_TYPES)], currency="CAD",
+                                      balance=0, opening_balance=0)
+                db.add(account)
+                account_ids.append(account.id)
+            await db.flush()
+
+            rows = [
+                _transaction(rng, user.id, account_id, today, history_days)
+                for account_id in account_ids
+                for _ in range(transactions)
+            ]
+            for start in range(0, len(rows), batch_size):
+                await insert_transactions(db, rows[start:start + batch_size])
+            await db.commit()
+            manifest.append({
+                "id": str(user.id),
+                "email": user.email,
+                "account_ids": [str(account_id) for account_id in account_ids],
+                "plaid_item": {"item_id": item.item_id, "access_token": item.access_token},
+            })
+    return {"users": manifest, "transactions": users * accounts * transactions}
@@ -0,0 +1,156 @@
+"""
+Load workloads against a running API, and the latency/throughput summaries they report.
+
+Each workload issues `requests` requests from `concurrency` concurrent clients as fast as the
+API answers (a closed loop), picking users and accounts from the seeded manifest with a seeded
+RNG so every run sends the same traffic.
+"""
+import asyncio
+import itertools
+import random
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+import httpx
+import numpy as np
+
+from .dataset import BENCH_PASSWORD
+
+RequestMaker = Callable[[httpx.AsyncClient, random.Random, int], Awaitable[httpx.Response]]
+
+
+class Workload(NamedTuple):
+    name: str
+    make_request: RequestMaker
+    warmup: bool = True  # False when warming up would change what the measured requests do
+
+
+def build_workloads(manifest: Dict[str, Any]) -> Dict[str, Workload]:
+    """Every workload, by name, for the users and accounts in a seed manifest."""
+    users: List[Dict[str, Any]] = manifest["users"]
+    run_id = uuid.uuid4().hex[:8]  # Keeps registered emails unique across runs against one database
+
+    async def register(client: httpx.AsyncClient, rng: random.Random, index: int) -> httpx.Response:
+        return await client.post("/users/register", json={
+            "email": f"bench-{run_id}-{index}@example.com", "password": BENCH_PASSWORD, "name": "Bench", "currency": "CAD",
+        })
+
+    async def login(client: httpx.AsyncClient, rng: random.Random, index: int) -> httpx.Response:
+        return await client.post("/auth/login", data={"username": rng.choice(users)["email"], "password": BENCH_PASSWORD})
+
+    async def create_account(client: httpx.AsyncClient, rng: random.Random, index: int) -> httpx.Response:
+        return await client.post(f"/accounts/?user_id={rng.choice(users)['id']}", json={
+            "institution_name": "Bench Bank", "account_type": "checking", "balance": 100.0,
+        })
+
+    async def create_transaction(client: httpx.AsyncClient, rng: random.Random, index: int) -> httpx.Response:
+        user = rng.choice(users)
+        return await client.post(f"/transactions/?user_id={user['id']}", json={
+            "bank_account_id": rng.choice(user["account_ids"]),
+            "description": rng.choice(["SQ *STARBUCKS #12", "LOBLAWS #1021", "UBER EATS", "NETFLIX.COM"]),
+            "amount": -round(rng.uniform(3, 150), 2),
+        })
+
+    async def list_transactions(client: httpx.AsyncClient, rng: random.Random, index: int) -> httpx.Response:
+        return await client.get("/transactions/", params={"user_id": rng.choice(users)["id"], "limit": 50})
+
+    async def list_accounts(client: httpx.AsyncClient, rng: random.Random, index: int) -> httpx.Response:
+        return await client.get("/accounts/", params={"user_id": rng.choice(users)["id"]})
+
+    async def plaid_link_token(client: httpx.AsyncClient, rng: random.Random, index: int) -> httpx.Response:
+        return await client.post(f"/plaid/create_link_token?user_id={rng.choice(users)['id']}")
+
+    async def plaid_balances(client: httpx.AsyncClient, rng: random.Random, index: int) -> httpx.Response:
+        # Mostly served by the Plaid response cache after each item's first call
+        return await client.get("/plaid/account_balances", params={"access_token": rng.choice(users)["plaid_item"]["access_token"]})
+
+    async def plaid_sync(client: httpx.AsyncClient, rng: random.Random, index: int) -> httpx.Response:
+        # Items in turn: each one's first sync imports its whole history, later ones find nothing new.
+        # With more clients than items, syncs of one item overlap and queue on its row lock.
+        user = users[index % len(users)]
+        return await client.post(f"/plaid/items/{user['plaid_item']['item_id']}/sync", params={"user_id": user["id"]})
+
+    return {workload.name: workload for workload in [
+        Workload("register", register),
+        Workload("login", login),
+        Workload("create_account", create_account),
+        Workload("create_transaction", create_transaction),
+        Workload("list_transactions", list_transactions),
+        Workload("list_accounts", list_accounts),
+        Workload("plaid_link_token", plaid_link_token),
+        Workload("plaid_balances", plaid_balances),
+        Workload("plaid_sync", plaid_sync, warmup=False),
+    ]}
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    """Percentiles in milliseconds, requests per second and error count for one workload run."""
+    values = np.asarray(latencies) * 1000 if latencies else np.zeros(1)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+
+async def run_workload(client: httpx.AsyncClient, workload: Workload, requests: int, concurrency: int, seed: int = 42,
+                       warmup: int = 0) -> Dict[str, Any]:
+    """
+    Issue requests from concurrency clients and summarize them; warmup extra requests go first, unmeasured.
+
+    A response with a status of 400 or more counts as an error; its latency is still recorded.
+    """
+    for index in range(warmup if workload.warmup else 0):
+        await workload.make_request(client, random.Random(seed - index - 1), -index - 1)
+
+    counter = itertools.count()
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker(worker_index: int) -> None:
+        nonlocal errors
+        rng = random.Random(seed * 1000 + worker_index)
+        while True:
+            index = next(counter)
+            if index >= requests:
+                return
+            started = time.perf_counter()
+            try:
+                response = await workload.make_request(client, rng, index)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def compare_to_baseline(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+                        tolerance: float) -> List[str]:
+    """
+    Regressions of results against a baseline, as readable lines; empty when there are none.
+
+    A workload regresses when its p95 grows, or its throughput drops, by more than tolerance
+    (a fraction, e.g. 0.25), or when it errors where the baseline did not.
+    """
+    regressions = []
+    for name, result in results.items():
+        before: Optional[Dict[str, Any]] = baseline.get(name)
+        if before is None:
+            continue
+        if result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']} ms -> {result['p95_ms']} ms")
+        if result["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['rps']} -> {result['rps']} req/s")
+        if result["errors"] and not before["errors"]:
+            regressions.append(f"{name}: {result['errors']} errors, none in the baseline")
+    return regressions
@@ -8,12 +8,143 @@ SECRET_KEY = os.getenv("SECRET_KEY", "e50b2f6361bbbae8c49b20cf70540f220418ebed32
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
+# Authenticated principals and decoded tokens are cached in memory per worker
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+
+# Password hashing. Changing BCRYPT_ROUNDS transparently rehashes passwords on the next login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")  # thread or process
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))  # queued beyond the busy workers
+
 # Also load your DATABASE_URL etc.
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
 
+# Connection pool tuning (ignored for SQLite in-memory databases)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds before a connection is replaced
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))  # 0 disables the timeout
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+
+# SQLite tuning for local runs
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+
+# Bulk transaction ingest
+TRANSACTION_INSERT_BATCH_SIZE = int(os.getenv("TRANSACTION_INSERT_BATCH_SIZE", "1000"))
+BULK_TRANSACTIONS_MAX_ROWS = int(os.getenv("BULK_TRANSACTIONS_MAX_ROWS", "50000"))
+
 # Plaid API credentials
 PLAID_CLIENT_ID = os.getenv("PLAID_CLIENT_ID", "")
 PLAID_SECRET = os.getenv("PLAID_SECRET", "")
-PLAID_ENV = os.getenv("PLAID_ENV", "sandbox")  # sandbox, development, or production
+PLAID_ENV = os.getenv("PLAID_ENV", "sandbox")  # sandbox, development, production, or local (the fake_plaid server)
+PLAID_BASE_URL = os.getenv("PLAID_BASE_URL", "")  # Overrides the host PLAID_ENV selects
 PLAID_COUNTRY_CODES = os.getenv("PLAID_COUNTRY_CODES", "US,CA").split(",")
 PLAID_PRODUCTS = os.getenv("PLAID_PRODUCTS", "transactions").split(",")
+
+# Local Plaid stand-in (python -m app.fake_plaid) used by PLAID_ENV=local; its data is derived from
+# each access token and FAKE_PLAID_SEED. Error rates are fractions of calls failing with a 500 or a 429.
+FAKE_PLAID_URL = os.getenv("FAKE_PLAID_URL", "http://127.0.0.1:8081")
+FAKE_PLAID_ACCOUNTS = int(os.getenv("FAKE_PLAID_ACCOUNTS", "2"))  # per item
+FAKE_PLAID_TRANSACTIONS = int(os.getenv("FAKE_PLAID_TRANSACTIONS", "250"))  # per account
+FAKE_PLAID_HISTORY_DAYS = int(os.getenv("FAKE_PLAID_HISTORY_DAYS", "90"))
+FAKE_PLAID_LATENCY_MS = float(os.getenv("FAKE_PLAID_LATENCY_MS", "0"))
+FAKE_PLAID_LATENCY_JITTER_MS = float(os.getenv("FAKE_PLAID_LATENCY_JITTER_MS", "0"))
+FAKE_PLAID_ERROR_RATE = float(os.getenv("FAKE_PLAID_ERROR_RATE", "0"))
+FAKE_PLAID_RATE_LIMIT_RATE = float(os.getenv("FAKE_PLAID_RATE_LIMIT_RATE", "0"))
+FAKE_PLAID_SEED = int(os.getenv("FAKE_PLAID_SEED", "0"))
+
+# Async Plaid HTTP client tuning
+PLAID_TIMEOUT_SECONDS = float(os.getenv("PLAID_TIMEOUT_SECONDS", "10"))  # per attempt
+PLAID_CALL_DEADLINE_SECONDS = float(os.getenv("PLAID_CALL_DEADLINE_SECONDS", "30"))  # across all retries
+PLAID_MAX_RETRIES = int(os.getenv("PLAID_MAX_RETRIES", "3"))
+PLAID_BACKOFF_BASE_SECONDS = float(os.getenv("PLAID_BACKOFF_BASE_SECONDS", "0.5"))
+PLAID_BACKOFF_MAX_SECONDS = float(os.getenv("PLAID_BACKOFF_MAX_SECONDS", "8"))
+PLAID_MAX_CONCURRENCY = int(os.getenv("PLAID_MAX_CONCURRENCY", "20"))  # in-flight calls per worker
+PLAID_PER_ITEM_CONCURRENCY = int(os.getenv("PLAID_PER_ITEM_CONCURRENCY", "2"))  # in-flight calls per access token
+PLAID_REFRESH_MAX_PARALLEL = int(os.getenv("PLAID_REFRESH_MAX_PARALLEL", "8"))  # items refreshed at once per request
+PLAID_HTTP_MAX_CONNECTIONS = int(os.getenv("PLAID_HTTP_MAX_CONNECTIONS", "50"))
+PLAID_HTTP_MAX_KEEPALIVE = int(os.getenv("PLAID_HTTP_MAX_KEEPALIVE", "20"))
+PLAID_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("PLAID_CIRCUIT_FAILURE_THRESHOLD", "5"))
+PLAID_CIRCUIT_RESET_SECONDS = float(os.getenv("PLAID_CIRCUIT_RESET_SECONDS", "30"))
+
+# Plaid response cache: memory, redis or none. Entries are served fresh for the TTL and then
+# served stale (while refreshing in the background) for up to PLAID_CACHE_STALE_SECONDS more.
+PLAID_CACHE_BACKEND = os.getenv("PLAID_CACHE_BACKEND", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+PLAID_BALANCES_CACHE_TTL_SECONDS = int(os.getenv("PLAID_BALANCES_CACHE_TTL_SECONDS", "60"))
+PLAID_TRANSACTIONS_CACHE_TTL_SECONDS = int(os.getenv("PLAID_TRANSACTIONS_CACHE_TTL_SECONDS", "300"))
+PLAID_CACHE_STALE_SECONDS = int(os.getenv("PLAID_CACHE_STALE_SECONDS", "900"))
+PLAID_CACHE_MAX_ENTRIES = int(os.getenv("PLAID_CACHE_MAX_ENTRIES", "10000"))
+
+# Plaid webhooks: verify the Plaid-Verification JWT and reject events signed too long ago
+PLAID_WEBHOOK_VERIFY = os.getenv("PLAID_WEBHOOK_VERIFY", "true").lower() in ("1", "true", "yes")
+PLAID_WEBHOOK_MAX_AGE_SECONDS = int(os.getenv("PLAID_WEBHOOK_MAX_AGE_SECONDS", "300"))
+
+# Background job queue. JOB_WORKERS workers run inside each API process; set it to 0 when
+# running dedicated `PYTHONPATH=app python -m app.worker` processes (from backend/) instead.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "10"))
+JOB_RETRY_MAX_SECONDS = float(os.getenv("JOB_RETRY_MAX_SECONDS", "900"))
+JOB_LOCK_TIMEOUT_SECONDS = int(os.getenv("JOB_LOCK_TIMEOUT_SECONDS", "600"))  # running jobs whose lock was not renewed for this long are requeued
+
+# Rows fetched per server-side cursor batch when exporting transactions
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+
+# Statement import: rows parsed, deduplicated and committed per batch
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "2000"))
+IMPORT_DEDUP_TRACKED_KEYS = int(os.getenv("IMPORT_DEDUP_TRACKED_KEYS", "100000"))
+IMPORT_MAX_REPORTED_ERRORS = int(os.getenv("IMPORT_MAX_REPORTED_ERRORS", "100"))
+
+# Exchange rates: daily rates quoted as units of each currency per FX_BASE_CURRENCY, loaded into
+# the fx_rates table with `python -m app.manage load-fx-rates` and cached in memory per process
+FX_BASE_CURRENCY = os.getenv("FX_BASE_CURRENCY", "USD")
+FX_RATES_FILE = os.getenv("FX_RATES_FILE", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "fx_rates.csv"))
+FX_RATES_CACHE_TTL_SECONDS = int(os.getenv("FX_RATES_CACHE_TTL_SECONDS", "3600"))
+
+# Transaction categorization. Each user's compiled rules are cached per process for the TTL; the
+# optional naive Bayes classifier learns from the user's already categorized transactions.
+CATEGORY_RULES_CACHE_TTL_SECONDS = int(os.getenv("CATEGORY_RULES_CACHE_TTL_SECONDS", "60"))
+CATEGORY_RULES_CACHE_MAX_USERS = int(os.getenv("CATEGORY_RULES_CACHE_MAX_USERS", "1000"))
+CATEGORY_CLASSIFIER_ENABLED = os.getenv("CATEGORY_CLASSIFIER_ENABLED", "false").lower() in ("1", "true", "yes")
+CATEGORY_CLASSIFIER_MAX_EXAMPLES = int(os.getenv("CATEGORY_CLASSIFIER_MAX_EXAMPLES", "5000"))
+CATEGORY_CLASSIFIER_MIN_CONFIDENCE = float(os.getenv("CATEGORY_CLASSIFIER_MIN_CONFIDENCE", "0.6"))
+RECATEGORIZE_BATCH_SIZE = int(os.getenv("RECATEGORIZE_BATCH_SIZE", "5000"))
+
+# Transactions given search text per batch by `python -m app.manage rebuild-search-index`
+SEARCH_BACKFILL_BATCH_SIZE = int(os.getenv("SEARCH_BACKFILL_BATCH_SIZE", "5000"))
+
+# Recurring payment detection: the latest SUBSCRIPTION_HISTORY_LENGTH payments per account and
+# merchant are kept, and a full rescan looks back SUBSCRIPTION_LOOKBACK_DAYS
+SUBSCRIPTION_HISTORY_LENGTH = int(os.getenv("SUBSCRIPTION_HISTORY_LENGTH", "24"))
+SUBSCRIPTION_LOOKBACK_DAYS = int(os.getenv("SUBSCRIPTION_LOOKBACK_DAYS", "1100"))
+
+# Budgets: new budgets are filled in, and `python -m app.manage check-budgets` verifies them, over
+# the last BUDGET_HISTORY_MONTHS months. Alerts are queued as jobs and, when
+# BUDGET_ALERT_WEBHOOK_URL is set, delivered there as JSON.
+BUDGET_HISTORY_MONTHS = int(os.getenv("BUDGET_HISTORY_MONTHS", "12"))
+BUDGET_DEFAULT_ALERT_PERCENTS = [int(value) for value in os.getenv("BUDGET_DEFAULT_ALERT_PERCENTS", "80,100").split(",") if value]
+BUDGET_ALERT_WEBHOOK_URL = os.getenv("BUDGET_ALERT_WEBHOOK_URL", "")
+
+# Request instrumentation: Prometheus metrics at GET /metrics and a Server-Timing header on every
+# response. The header reveals SQL and Plaid timings to clients; disable it where that matters.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Idempotency-Key support on POST /transactions/, /accounts/ and /users/register. A completed
+# response is replayed for IDEMPOTENCY_TTL_SECONDS; a retry arriving while another process is still
+# handling the original waits up to IDEMPOTENCY_WAIT_SECONDS for it, then gets a 409. A claim left in
+# flight for IDEMPOTENCY_LOCK_TIMEOUT_SECONDS (its process died) is taken over by the next retry.
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+IDEMPOTENCY_LOCK_TIMEOUT_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT_SECONDS", "60"))
+IDEMPOTENCY_KEY_MAX_LENGTH = int(os.getenv("IDEMPOTENCY_KEY_MAX_LENGTH", "255"))
@@ -0,0 +1,187 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters and histograms are thread-safe and keyed by label values; REGISTRY renders every metric
+registered on it for GET /metrics. Work done on behalf of one HTTP request (SQL statements,
+Plaid calls) is also tallied on the RequestTimings in the request_timings context variable, which
+the instrumentation middleware turns into per-route histograms and a Server-Timing header.
+"""
+import contextvars
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; suits both HTTP requests and the SQL statements and Plaid calls inside them
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Statements per request; a route whose requests land in the top buckets is likely issuing N+1 queries
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.label_names, key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Per label set: non-cumulative count per bucket, then the sum of observations
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = next(position for position, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * len(self.buckets), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return sum(entry[0]) if entry else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._values.items())
+        lines = self.header()
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """The metrics to expose, plus collectors that produce gauge samples at render time."""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, float]]]] = []
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect: Callable[[], Iterable[Tuple[str, str, float]]]) -> None:
+        """collect returns (name, help, value) gauge samples, e.g. from PoolMetrics.snapshot()."""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for name, documentation, value in collect():
+                lines.extend([f"# HELP {name} {documentation}", f"# TYPE {name} gauge", f"{name} {_format_value(value)}"])
+        return "\n".join(lines) + "\n"
+
+
+class RequestTimings:
+    """What one request spent its time on, tallied as the work happens."""
+
+    __slots__ = ("sql_statements", "sql_seconds", "plaid_calls", "plaid_seconds")
+
+    def __init__(self):
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.plaid_calls = 0
+        self.plaid_seconds = 0.0
+
+
+# Set by the instrumentation middleware for the duration of each request; None outside requests
+request_timings: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar("request_timings", default=None)
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "HTTP requests handled", ("method", "route", "status"))
+HTTP_REQUEST_SECONDS = REGISTRY.histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route"))
+HTTP_REQUEST_SQL_STATEMENTS = REGISTRY.histogram(
+    "http_request_sql_statements", "SQL statements executed per HTTP request", ("method", "route"), COUNT_BUCKETS,
+)
+HTTP_REQUEST_SQL_SECONDS = REGISTRY.histogram("http_request_sql_duration_seconds", "Time spent in SQL per HTTP request", ("method", "route"))
+HTTP_REQUEST_PLAID_CALLS = REGISTRY.histogram(
+    "http_request_plaid_calls", "Plaid HTTP calls made per HTTP request", ("method", "route"), COUNT_BUCKETS,
+)
+DB_STATEMENTS = REGISTRY.counter("db_statements_total", "SQL statements executed, in requests and background jobs alike", ("engine",))
+DB_STATEMENT_SECONDS = REGISTRY.histogram("db_statement_duration_seconds", "SQL statement latency", ("engine",))
+PLAID_REQUESTS = REGISTRY.counter("plaid_requests_total", "Plaid HTTP attempts, retries included", ("endpoint", "outcome"))
+PLAID_REQUEST_SECONDS = REGISTRY.histogram("plaid_request_duration_seconds", "Plaid HTTP attempt latency", ("endpoint",))
+IDEMPOTENT_REQUESTS = REGISTRY.counter(
+    "idempotent_requests_total", "Requests carrying an Idempotency-Key, by what became of them", ("path", "outcome"),
+)
+
+
+def record_plaid_call(endpoint: str, outcome: str, seconds: float) -> None:
+    """Count one Plaid HTTP attempt; outcome is its status code, or the transport error's class name."""
+    PLAID_REQUESTS.inc(endpoint=endpoint, outcome=outcome)
+    PLAID_REQUEST_SECONDS.observe(seconds, endpoint=endpoint)
+    timings = request_timings.get()
+    if timings is not None:
+        timings.plaid_calls += 1
+        timings.plaid_seconds += seconds
@@ -0,0 +1,26 @@
+from decimal import ROUND_HALF_EVEN, Decimal
+from typing import Any
+
+# Amounts are stored as integer minor units at this many decimal places. Every currency Plaid
+# reports uses at most two, and zero-decimal currencies (JPY, KRW) are stored exactly as well.
+MINOR_UNIT_DIGITS = 2
+_QUANTUM = Decimal(1).scaleb(-MINOR_UNIT_DIGITS)
+
+DEFAULT_CURRENCY = "CAD"
+
+
+def to_decimal(amount: Any) -> Decimal:
+    """Exact Decimal for an amount; floats go through their shortest repr, so 0.1 is 0.1."""
+    if isinstance(amount, Decimal):
+        return amount
+    return Decimal(str(amount))
+
+
+def to_minor(amount: Any) -> int:
+    """Integer minor units for an amount in major units, rounding half to even below a cent."""
+    return int(to_decimal(amount).quantize(_QUANTUM, rounding=ROUND_HALF_EVEN).scaleb(MINOR_UNIT_DIGITS))
+
+
+def from_minor(minor: Any) -> Decimal:
+    """The amount in major units for a count of minor units, e.g. 1250 -> Decimal("12.50")."""
+    return Decimal(int(minor)).scaleb(-MINOR_UNIT_DIGITS)
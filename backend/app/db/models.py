@@ -1,6 +1,7 @@
-from sqlalchemy import Column, String, Boolean, DateTime, DECIMAL, ForeignKey, UUID
+from sqlalchemy import DDL, Column, String, Boolean, Date, DateTime, ForeignKey, Index, Integer, JSON, LargeBinary, Numeric, Text, UniqueConstraint, UUID, event, text
 from sqlalchemy.orm import relationship
 from .base import Base
+from .types import Money
 import uuid
 import datetime
 
@@ -14,6 +15,21 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     bank_accounts = relationship("BankAccount", back_populates="user")
     transactions = relationship("Transaction", back_populates="user")
+    plaid_items = relationship("PlaidItem", back_populates="user")
+
+class PlaidItem(Base):
+    __tablename__ = "plaid_items"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    item_id = Column(String, unique=True, nullable=False)
+    access_token = Column(String, nullable=False)
+    institution_name = Column(String, nullable=True)
+    transactions_cursor = Column(String, nullable=True)  # Last /transactions/sync cursor applied
+    last_synced_at = Column(DateTime, nullable=True)
+    error_code = Column(String, nullable=True)  # Latest ITEM webhook error, cleared on LOGIN_REPAIRED
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    user = relationship("User", back_populates="plaid_items")
+    bank_accounts = relationship("BankAccount", back_populates="plaid_item")
 
 class BankAccount(Base):
     __tablename__ = "bank_accounts"
@@ -21,18 +37,176 @@ class BankAccount(Base):
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     institution_name = Column(String, nullable=False)
     account_type = Column(String, nullable=False)
-    balance = Column(DECIMAL, nullable=False, default=0.0)
+    currency = Column(String(3), nullable=False, default="CAD")  # ISO 4217 code of the balance and every transaction
+    balance = Column(Money, nullable=False, default=0)  # Maintained by the transaction writer
+    # The balance given when the account was added, and when; transactions dated before that are already in it
+    opening_balance = Column(Money, nullable=False, default=0)
+    opening_balance_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    plaid_item_id = Column(UUID(as_uuid=True), ForeignKey("plaid_items.id"), nullable=True)
+    plaid_account_id = Column(String, unique=True, nullable=True)
     user = relationship("User", back_populates="bank_accounts")
+    plaid_item = relationship("PlaidItem", back_populates="bank_accounts")
     transactions = relationship("Transaction", back_populates="bank_account")
 
+# The tsvector the PostgreSQL GIN index is built on; queries must use the same expression to use it
+SEARCH_VECTOR_SQL = "to_tsvector('simple'::regconfig, coalesce(search_text, ''))"
+
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        # Backs keyset pagination over a user's transactions ordered by (date, id)
+        Index("ix_transactions_user_id_date_id", "user_id", "date", "id"),
+        # Equality lookups only, so PostgreSQL can use a (smaller) hash index
+        Index("ix_transactions_dedup_hash", "dedup_hash", postgresql_using="hash"),
+        # Per-account date range sums for balances
+        Index("ix_transactions_bank_account_id_date", "bank_account_id", "date"),
+        # Full-text search on PostgreSQL; SQLite uses the transactions_fts table below
+        Index("ix_transactions_search", text(SEARCH_VECTOR_SQL), postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     bank_account_id = Column(UUID(as_uuid=True), ForeignKey("bank_accounts.id"), nullable=False)
     description = Column(String, nullable=False)
-    amount = Column(DECIMAL, nullable=False)
+    amount = Column(Money, nullable=False)  # In the account's currency; positive for money coming in
     date = Column(DateTime, default=datetime.datetime.utcnow)
+    plaid_transaction_id = Column(String, unique=True, nullable=True)
+    # sha256 of (account, day, amount, normalized description, occurrence) as first written; see transaction_dedup_hash
+    dedup_hash = Column(String(64), nullable=True)
+    search_text = Column(String, nullable=True)  # normalize_description(description), the full-text indexed form
+    category = Column(String, nullable=True)
+    category_source = Column(String, nullable=True)  # user, rule, plaid or classifier; see services.categorization
     user = relationship("User", back_populates="transactions")
     bank_account = relationship("BankAccount", back_populates="transactions")
+
+# SQLite keeps an FTS5 index over transactions.search_text, synced by triggers. user_id is indexed
+# alongside it so a search only intersects with the searching user's entries. It refers to
+# transactions by rowid, which VACUUM and table rebuilds can renumber; `python -m app.manage
+# rebuild-search-index` rebuilds it from the table.
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(search_text, user_id, content='transactions', content_rowid='rowid')",
+    "CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions BEGIN "
+    "INSERT INTO transactions_fts(rowid, search_text, user_id) VALUES (new.rowid, new.search_text, new.user_id); END",
+    "CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN "
+    "INSERT INTO transactions_fts(transactions_fts, rowid, search_text, user_id) VALUES ('delete', old.rowid, old.search_text, old.user_id); END",
+    "CREATE TRIGGER IF NOT EXISTS transactions_fts_update AFTER UPDATE OF search_text, user_id ON transactions BEGIN "
+    "INSERT INTO transactions_fts(transactions_fts, rowid, search_text, user_id) VALUES ('delete', old.rowid, old.search_text, old.user_id); "
+    "INSERT INTO transactions_fts(rowid, search_text, user_id) VALUES (new.rowid, new.search_text, new.user_id); END",
+]
+for _statement in SQLITE_SEARCH_DDL:
+    event.listen(Transaction.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+event.listen(Transaction.__table__, "before_drop", DDL("DROP TABLE IF EXISTS transactions_fts").execute_if(dialect="sqlite"))
+
+class CategoryRule(Base):
+    """Transactions whose description matches pattern are put in category."""
+    __tablename__ = "category_rules"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
+    pattern = Column(String, nullable=False)  # A keyword, or a regular expression when is_regex
+    category = Column(String, nullable=False)
+    is_regex = Column(Boolean, nullable=False, default=False)
+    priority = Column(Integer, nullable=False, default=0)  # Higher wins when several rules match
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class TransactionRollup(Base):
+    """Per-account inflow/outflow totals for one day, week (starting Monday) or month."""
+    __tablename__ = "transaction_rollups"
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    period = Column(String, primary_key=True)  # day, week or month
+    period_start = Column(Date, primary_key=True)
+    bank_account_id = Column(UUID(as_uuid=True), ForeignKey("bank_accounts.id"), primary_key=True)
+    inflow = Column(Money, nullable=False, default=0)
+    outflow = Column(Money, nullable=False, default=0)  # Sum of outgoing amounts, as a positive number
+    transaction_count = Column(Integer, nullable=False, default=0)
+
+class Subscription(Base):
+    """
+    Outgoing payments from one account to one merchant, and the recurring pattern found in them.
+
+    Every (account, merchant) pair with payments has a row, kept up to date by the transaction
+    writer; is_recurring marks the ones detected as subscriptions.
+    """
+    __tablename__ = "subscriptions"
+    __table_args__ = (UniqueConstraint("user_id", "bank_account_id", "merchant", name="uq_subscriptions_user_account_merchant"),)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    bank_account_id = Column(UUID(as_uuid=True), ForeignKey("bank_accounts.id"), nullable=False)
+    merchant = Column(String, nullable=False)  # The payments' search_text
+    # The latest payments, oldest first: day as a proleptic Gregorian ordinal, and amount in minor units
+    days = Column(JSON, nullable=False, default=list)
+    amounts = Column(JSON, nullable=False, default=list)
+    is_recurring = Column(Boolean, nullable=False, default=False)
+    period = Column(String, nullable=True)  # weekly, biweekly, monthly, quarterly or yearly
+    amount = Column(Money, nullable=True)  # Typical payment, as a negative amount
+    last_date = Column(Date, nullable=True)
+    next_date = Column(Date, nullable=True)  # Predicted
+    next_amount = Column(Money, nullable=True)  # Predicted
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class Budget(Base):
+    """
+    A monthly spending limit over the user's outgoing payments.
+
+    A payment counts when it matches every scope set: the account, the category, and the pattern
+    (a keyword, or a regular expression when is_regex, matched like category rules). A budget
+    with no scope covers all spending.
+    """
+    __tablename__ = "budgets"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
+    name = Column(String, nullable=False)
+    amount = Column(Money, nullable=False)  # Per calendar month, as a positive number
+    bank_account_id = Column(UUID(as_uuid=True), ForeignKey("bank_accounts.id"), nullable=True)
+    category = Column(String, nullable=True)
+    pattern = Column(String, nullable=True)
+    is_regex = Column(Boolean, nullable=False, default=False)
+    alert_percents = Column(JSON, nullable=False, default=list)  # Percentages of amount that queue an alert when crossed
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class BudgetSpend(Base):
+    """A budget's spending in one calendar month, maintained by the transaction writer."""
+    __tablename__ = "budget_spend"
+    budget_id = Column(UUID(as_uuid=True), ForeignKey("budgets.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(Date, primary_key=True)  # First day of the month
+    spent = Column(Money, nullable=False, default=0)  # Sum of outgoing amounts, as a positive number
+    transaction_count = Column(Integer, nullable=False, default=0)
+    alerted_percent = Column(Integer, nullable=False, default=0)  # Highest alert_percents entry already queued
+
+class FxRate(Base):
+    """Units of currency per one FX_BASE_CURRENCY on a day."""
+    __tablename__ = "fx_rates"
+    currency = Column(String(3), primary_key=True)
+    day = Column(Date, primary_key=True)
+    rate = Column(Numeric(20, 10), nullable=False)
+
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Workers poll for the oldest runnable job in a status
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+        Index("ix_jobs_dedup_key_status", "dedup_key", "status"),
+    )
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    kind = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False, default=dict)
+    dedup_key = Column(String, nullable=True)  # At most one queued job per key
+    status = Column(String, nullable=False, default="queued")  # queued, running, succeeded or dead
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    locked_by = Column(String, nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class IdempotencyKey(Base):
+    """A POST made with an Idempotency-Key header, and once it completes the response to replay."""
+    __tablename__ = "idempotency_keys"
+    key_hash = Column(String(64), primary_key=True)  # sha256 of method, path, query string and the client's key
+    request_hash = Column(String(64), nullable=False)  # sha256 of the body, to catch a key reused for another request
+    status_code = Column(Integer, nullable=True)  # Null while the original request is in flight
+    content_type = Column(String, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
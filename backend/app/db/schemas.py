@@ -1,6 +1,11 @@
-from pydantic import BaseModel, EmailStr, UUID4
+from pydantic import BaseModel, EmailStr, Field, PlainSerializer, UUID4
 import datetime
-from typing import Optional
+from decimal import Decimal
+from typing import Annotated, List, Optional
+
+# Parsed and held as an exact Decimal, sent back as a JSON number
+Amount = Annotated[Decimal, PlainSerializer(float, return_type=float, when_used="json")]
+CurrencyCode = Annotated[str, Field(pattern=r"^[A-Z]{3}$")]
 
 class Token(BaseModel):
     access_token: str
@@ -25,25 +30,142 @@ class UserResponse(BaseModel):
 class BankAccountCreate(BaseModel):
     institution_name: str
     account_type: str
-    balance: float
+    balance: Amount
+    currency: Optional[CurrencyCode] = None  # Defaults to the user's currency
 
 class BankAccountResponse(BankAccountCreate):
     id: UUID4
+    currency: str
     user_id: UUID4
     created_at: datetime.datetime
+    converted_balance: Optional[Amount] = None  # In the ?currency= requested
 
     class Config:
         from_attributes = True
 
+class BankAccountList(BaseModel):
+    accounts: List[BankAccountResponse]
+    currency: Optional[str] = None  # The ?currency= balances were converted to
+    total_balance: Optional[Amount] = None  # Sum of the converted balances
+
+class AccountBalanceResponse(BaseModel):
+    bank_account_id: UUID4
+    as_of: Optional[datetime.date] = None
+    balance: Amount
+    currency: str
+    converted_balance: Optional[Amount] = None
+    converted_currency: Optional[str] = None
+
 class TransactionCreate(BaseModel):
     bank_account_id: UUID4
     description: str
-    amount: float
+    amount: Amount
     date: Optional[datetime.datetime] = None
+    category: Optional[str] = Field(None, max_length=64)  # Left empty to have it categorized automatically
 
 class TransactionResponse(TransactionCreate):
     id: UUID4
     user_id: UUID4
+    category_source: Optional[str] = None  # user, rule, plaid or classifier
+    converted_amount: Optional[Amount] = None  # In the ?currency= requested, at the rate of the transaction's day
+
+    class Config:
+        from_attributes = True
+
+class TransactionPage(BaseModel):
+    items: List[TransactionResponse]
+    next_cursor: Optional[str] = None
+    currency: Optional[str] = None  # The ?currency= amounts were converted to
+
+class TransactionSearchResults(BaseModel):
+    items: List[TransactionResponse]  # Best match first
+    next_offset: Optional[int] = None  # Pass as ?offset= for the next page
+
+class SubscriptionResponse(BaseModel):
+    id: UUID4
+    bank_account_id: UUID4
+    merchant: str
+    period: str  # weekly, biweekly, monthly, quarterly or yearly
+    amount: Amount  # Typical payment, negative like the transactions
+    last_date: datetime.date
+    next_date: datetime.date  # Predicted
+    next_amount: Amount  # Predicted: the latest payment's amount
+    status: str  # "active", or "lapsed" once the predicted payment is overdue
+
+class CategoryRuleCreate(BaseModel):
+    pattern: str = Field(min_length=1, max_length=200)  # A keyword, or a regular expression when is_regex
+    category: str = Field(min_length=1, max_length=64)
+    is_regex: bool = False
+    priority: int = 0  # Higher wins when several of the user's rules match
+
+class CategoryRuleResponse(CategoryRuleCreate):
+    id: UUID4
+    user_id: UUID4
+    created_at: datetime.datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class BudgetCreate(BaseModel):
+    name: str = Field(min_length=1, max_length=100)
+    amount: Amount = Field(gt=0)  # Per calendar month
+    # Scope; a payment counts when it matches every one given
+    bank_account_id: Optional[UUID4] = None
+    category: Optional[str] = Field(None, min_length=1, max_length=64)
+    pattern: Optional[str] = Field(None, min_length=1, max_length=200)  # A keyword, or a regular expression when is_regex
+    is_regex: bool = False
+    alert_percents: Optional[List[Annotated[int, Field(gt=0, le=1000)]]] = Field(None, max_length=10)  # Defaults to BUDGET_DEFAULT_ALERT_PERCENTS
+
+class BudgetStatusResponse(BudgetCreate):
+    id: UUID4
+    alert_percents: List[int]
+    month: datetime.date
+    spent: Amount
+    transaction_count: int
+    remaining: Amount  # Negative once over budget
+    percent_used: float
+    daily_burn_rate: Amount  # Average spend per day elapsed in the month
+    projected_spend: Amount  # At the burn rate, by the end of the month
+    days_left: int
+
+class BulkTransactionResult(BaseModel):
+    index: int
+    status: str  # "created" or "error"
+    id: Optional[UUID4] = None
+    error: Optional[str] = None
+
+class BulkTransactionResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BulkTransactionResult]
+
+class StatementImportError(BaseModel):
+    row: int  # CSV line number, or position among an OFX file's transactions
+    error: str
+
+class StatementImportResponse(BaseModel):
+    parsed: int
+    imported: int
+    duplicates: int
+    failed: int
+    errors: List[StatementImportError]  # The first IMPORT_MAX_REPORTED_ERRORS failures
+
+class TransactionSummaryBucket(BaseModel):
+    period_start: datetime.date
+    bank_account_id: Optional[UUID4] = None  # Set when grouping by account
+    inflow: Amount
+    outflow: Amount
+    net: Amount
+    transaction_count: int
+
+class TransactionSummary(BaseModel):
+    period: str
+    buckets: List[TransactionSummaryBucket]
+    currency: Optional[str] = None  # Set when totals were converted with ?currency=
+
+class PlaidRefreshRequest(BaseModel):
+    access_tokens: List[str]
+    start_date: Optional[datetime.datetime] = None
+    end_date: Optional[datetime.datetime] = None
+    include_transactions: bool = True
+    force_refresh: bool = False
@@ -1,7 +1,319 @@
-from sqlalchemy import create_engine
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.engine.url import URL
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
+
+from app.core.metrics import DB_STATEMENT_SECONDS, DB_STATEMENTS, REGISTRY, request_timings
+from app.core.config import (
+    DATABASE_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING,
+    DB_STATEMENT_TIMEOUT_MS,
+    DB_ECHO,
+    SQLITE_JOURNAL_MODE,
+    SQLITE_SYNCHRONOUS,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_SIZE_KB,
+)
+
+
+class PoolMetrics:
+    """Thread-safe counters describing how an engine's connection pool is being used."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.connects = 0
+            self.checkouts = 0
+            self.checkins = 0
+            self.invalidations = 0
+            self.checked_out = 0
+            self.max_checked_out = 0
+            self.wait_count = 0
+            self.wait_seconds_total = 0.0
+            self.wait_seconds_max = 0.0
+            self.timeouts = 0
+
+    def record_wait(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self.wait_count += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "wait_count": self.wait_count,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_seconds_max": self.wait_seconds_max,
+                "timeouts": self.timeouts,
+            }
+
+    def attach(self, engine: Engine) -> None:
+        """Register pool event listeners that keep these counters up to date."""
+
+        @event.listens_for(engine, "connect")
+        def _on_connect(dbapi_connection, connection_record):
+            with self._lock:
+                self.connects += 1
+
+        @event.listens_for(engine, "checkout")
+        def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+            with self._lock:
+                self.checkouts += 1
+                self.checked_out += 1
+                self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+        @event.listens_for(engine, "checkin")
+        def _on_checkin(dbapi_connection, connection_record):
+            with self._lock:
+                self.checkins += 1
+                self.checked_out = max(self.checked_out - 1, 0)
+
+        @event.listens_for(engine, "invalidate")
+        def _on_invalidate(dbapi_connection, connection_record, exception):
+            with self._lock:
+                self.invalidations += 1
+
+
+def attach_statement_metrics(engine: Engine, name: str) -> None:
+    """
+    Time every statement the engine sends, into the db_statement metrics and, inside an HTTP
+    request, onto that request's RequestTimings (see app.core.metrics).
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("statement_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        _record(conn)
+
+    @event.listens_for(engine, "handle_error")
+    def _on_error(exception_context):
+        if exception_context.connection is not None:
+            _record(exception_context.connection)
+
+    def _record(conn) -> None:
+        started = conn.info.get("statement_started")
+        if not started:
+            return
+        seconds = time.perf_counter() - started.pop()
+        DB_STATEMENTS.inc(engine=name)
+        DB_STATEMENT_SECONDS.observe(seconds, engine=name)
+        timings = request_timings.get()
+        if timings is not None:
+            timings.sql_statements += 1
+            timings.sql_seconds += seconds
+
+
+def pool_gauges(metrics: PoolMetrics):
+    """A REGISTRY collector exposing a PoolMetrics snapshot as db_pool_* gauges."""
+    documentation = {
+        "checked_out": "Connections currently checked out",
+        "max_checked_out": "Most connections checked out at once",
+        "wait_count": "Checkouts that went through the pool's wait path",
+        "wait_seconds_total": "Total seconds spent waiting for a connection",
+        "wait_seconds_max": "Longest wait for a connection, in seconds",
+        "timeouts": "Checkouts that timed out waiting for a connection",
+    }
+
+    def collect():
+        snapshot = metrics.snapshot()
+        return [(f"db_pool_{key}", text, snapshot[key]) for key, text in documentation.items()]
+
+    return collect
+
+
+class _TimedCheckoutMixin:
+    """Pool mixin that reports how long callers wait to check out a connection."""
+
+    metrics: Optional[PoolMetrics] = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_wait(time.perf_counter() - start, timed_out)
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
 
-# For local development, using SQLite; update for production (e.g., PostgreSQL)
-DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+class TimedAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _is_sqlite_memory(url: URL) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def _apply_sqlite_pragmas(engine: Engine, in_memory: bool) -> None:
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not in_memory:
+            cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        # Negative cache_size is interpreted by SQLite as KiB rather than pages
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+
+def engine_options(url: URL, **overrides: Any) -> Dict[str, Any]:
+    """
+    Build create_engine keyword arguments for the given database URL.
+
+    Args:
+        url: The parsed database URL
+        **overrides: Any create_engine keyword argument to use instead of the configured default
+
+    Returns:
+        A dictionary of keyword arguments for create_engine / create_async_engine
+    """
+    options: Dict[str, Any] = {"echo": DB_ECHO}
+    connect_args: Dict[str, Any] = {}
+
+    if url.get_backend_name() == "sqlite":
+        connect_args["check_same_thread"] = False
+        connect_args["timeout"] = SQLITE_BUSY_TIMEOUT_MS / 1000
+        if _is_sqlite_memory(url):
+            # Every connection to :memory: is a separate database, so share a single one
+            options["poolclass"] = StaticPool
+    else:
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+        )
+        if url.get_backend_name() == "postgresql" and DB_STATEMENT_TIMEOUT_MS > 0:
+            if url.get_driver_name() == "asyncpg":
+                connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+            else:
+                connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+
+    options["connect_args"] = connect_args
+    options.update(overrides)
+    return options
+
+
+def create_db_engine(database_url: str = DATABASE_URL, metrics: Optional[PoolMetrics] = None, **overrides: Any) -> Engine:
+    """
+    Create a synchronous engine configured from app.core.config.
+
+    Args:
+        database_url: The database URL to connect to (defaults to DATABASE_URL)
+        metrics: Optional PoolMetrics instance to collect pool usage statistics into
+        **overrides: create_engine keyword arguments that take precedence over the config
+
+    Returns:
+        A configured SQLAlchemy Engine
+    """
+    url = make_url(database_url)
+    options = engine_options(url, **overrides)
+
+    if metrics is not None and "poolclass" not in options:
+        options["poolclass"] = type("InstrumentedQueuePool", (TimedQueuePool,), {"metrics": metrics})
+
+    engine = create_engine(url, **options)
+    if url.get_backend_name() == "sqlite":
+        _apply_sqlite_pragmas(engine, _is_sqlite_memory(url))
+    if metrics is not None:
+        metrics.attach(engine)
+    return engine
+
+
+def async_database_url(database_url: str) -> URL:
+    """Map a database URL onto the asyncio driver for its backend (aiosqlite / asyncpg)."""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend == "sqlite" and url.get_driver_name() != "aiosqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    if backend == "postgresql" and url.get_driver_name() != "asyncpg":
+        return url.set(drivername="postgresql+asyncpg")
+    return url
+
+
+def create_async_db_engine(database_url: str = DATABASE_URL, metrics: Optional[PoolMetrics] = None, **overrides: Any) -> AsyncEngine:
+    """
+    Create an asyncio engine configured from app.core.config.
+
+    Args:
+        database_url: The database URL to connect to; sync drivers are swapped for their async counterpart
+        metrics: Optional PoolMetrics instance to collect pool usage statistics into
+        **overrides: create_async_engine keyword arguments that take precedence over the config
+
+    Returns:
+        A configured SQLAlchemy AsyncEngine
+    """
+    url = async_database_url(database_url)
+    options = engine_options(url, **overrides)
+
+    if metrics is not None and "poolclass" not in options:
+        options["poolclass"] = type("InstrumentedAsyncQueuePool", (TimedAsyncQueuePool,), {"metrics": metrics})
+
+    async_engine = create_async_engine(url, **options)
+    if url.get_backend_name() == "sqlite":
+        _apply_sqlite_pragmas(async_engine.sync_engine, _is_sqlite_memory(url))
+    if metrics is not None:
+        metrics.attach(async_engine.sync_engine)
+    return async_engine
+
+
+def get_pool_status(engine: Engine, metrics: Optional[PoolMetrics] = None) -> Dict[str, Any]:
+    """Return the pool's current sizing alongside the collected checkout/wait metrics."""
+    pool = engine.pool
+    status: Dict[str, Any] = {"pool": pool.status()}
+    if isinstance(pool, QueuePool):
+        status.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow())
+    if metrics is not None:
+        status["metrics"] = metrics.snapshot()
+    return status
+
+
+# Synchronous engine for migrations, scripts and other blocking callers
+pool_metrics = PoolMetrics()
+engine = create_db_engine(DATABASE_URL, metrics=pool_metrics)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Asyncio engine used by the request path
+async_pool_metrics = PoolMetrics()
+async_engine = create_async_db_engine(DATABASE_URL, metrics=async_pool_metrics)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Statement counts and timings for GET /metrics and the Server-Timing header
+attach_statement_metrics(engine, "sync")
+attach_statement_metrics(async_engine.sync_engine, "async")
+REGISTRY.add_collector(pool_gauges(async_pool_metrics))
@@ -0,0 +1,47 @@
+from typing import Any, Optional, Tuple
+
+from sqlalchemy import BigInteger, literal
+from sqlalchemy.sql import operators
+from sqlalchemy.types import TypeDecorator, TypeEngine
+
+from app.core.money import from_minor, to_minor
+
+# Operators whose other operand is an amount (a + 5 adds five dollars), rather than a scalar (a * 2)
+_AMOUNT_OPERATORS = {
+    operators.add, operators.sub,
+    operators.eq, operators.ne, operators.lt, operators.le, operators.gt, operators.ge,
+    operators.in_op, operators.not_in_op,
+    operators.and_,  # the bounds of BETWEEN
+}
+
+
+class Money(TypeDecorator):
+    """
+    A money amount stored as a BIGINT count of minor units (cents).
+
+    Python code reads and writes Decimal amounts in major units; the conversion happens at the
+    driver boundary, so SUM() and comparisons run on exact integers in the database and never
+    pass through float. Sums and differences of money columns stay Money, so
+    `func.sum(inflow - outflow)` comes back as a Decimal amount too.
+    """
+
+    impl = BigInteger
+    cache_ok = True
+
+    class comparator_factory(TypeDecorator.Comparator):
+        def _adapt_expression(self, op: Any, other_comparator: Any) -> Tuple[Any, TypeEngine]:
+            op, result_type = super()._adapt_expression(op, other_comparator)
+            if op in (operators.add, operators.sub, operators.mul, operators.truediv) and not isinstance(result_type, Money):
+                return op, self.type
+            return op, result_type
+
+    def process_bind_param(self, value: Any, dialect: Any) -> Optional[int]:
+        return None if value is None else to_minor(value)
+
+    def process_result_value(self, value: Any, dialect: Any) -> Any:
+        return None if value is None else from_minor(value)
+
+    def coerce_compared_value(self, op: Any, value: Any) -> TypeEngine:
+        if op in _AMOUNT_OPERATORS:
+            return self
+        return literal(value).type
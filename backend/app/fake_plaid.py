@@ -0,0 +1,291 @@
+"""
+Local stand-in for the Plaid API, used by PLAID_ENV=local.
+
+Serves link token creation, public token exchange, /accounts/get, /transactions/get and
+/transactions/sync with synthetic data derived from the access token and FAKE_PLAID_SEED, so
+every process sees the same accounts and transactions for a token without any shared state.
+Volume, latency and injected failures (500s and 429s with Retry-After) are configured with the
+FAKE_PLAID_* settings or the matching command line options:
+
+    cd backend
+    PYTHONPATH=app python -m app.fake_plaid --port 8081 --transactions 1000 --latency-ms 80 --error-rate 0.05
+
+and then run the API with PLAID_ENV=local (FAKE_PLAID_URL if not on the default port).
+/sandbox/public_token/create hands out public tokens, as it does in Plaid's sandbox.
+"""
+import argparse
+import asyncio
+import base64
+import datetime
+import functools
+import hashlib
+import random
+import uuid
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.core.config import (
+    FAKE_PLAID_ACCOUNTS,
+    FAKE_PLAID_ERROR_RATE,
+    FAKE_PLAID_HISTORY_DAYS,
+    FAKE_PLAID_LATENCY_JITTER_MS,
+    FAKE_PLAID_LATENCY_MS,
+    FAKE_PLAID_RATE_LIMIT_RATE,
+    FAKE_PLAID_SEED,
+    FAKE_PLAID_TRANSACTIONS,
+)
+
+# (name, typical amount as Plaid reports it: positive leaves the account, personal_finance_category primary)
+MERCHANTS = [
+    ("Starbucks", 6, "FOOD_AND_DRINK"), ("Tim Hortons", 4, "FOOD_AND_DRINK"), ("Uber Eats", 28, "FOOD_AND_DRINK"),
+    ("Loblaws", 85, "FOOD_AND_DRINK"), ("Costco", 160, "GENERAL_MERCHANDISE"), ("Amazon", 42, "GENERAL_MERCHANDISE"),
+    ("Shell", 55, "TRANSPORTATION"), ("Uber", 19, "TRANSPORTATION"), ("Netflix", 17, "ENTERTAINMENT"),
+    ("Spotify", 11, "ENTERTAINMENT"), ("Rogers", 95, "RENT_AND_UTILITIES"), ("Hydro One", 120, "RENT_AND_UTILITIES"),
+    ("Shoppers Drug Mart", 25, "MEDICAL"), ("Air Canada", 480, "TRAVEL"), ("Payroll", -2600, "INCOME"),
+]
+ACCOUNT_KINDS = [("depository", "checking"), ("depository", "savings"), ("credit", "credit card")]
+MAX_PAGE_SIZE = 500
+
+
+class FakePlaidSettings(NamedTuple):
+    accounts: int = FAKE_PLAID_ACCOUNTS  # per item
+    transactions: int = FAKE_PLAID_TRANSACTIONS  # per account
+    history_days: int = FAKE_PLAID_HISTORY_DAYS
+    latency_ms: float = FAKE_PLAID_LATENCY_MS
+    latency_jitter_ms: float = FAKE_PLAID_LATENCY_JITTER_MS
+    error_rate: float = FAKE_PLAID_ERROR_RATE  # fraction of calls answered with a 500
+    rate_limit_rate: float = FAKE_PLAID_RATE_LIMIT_RATE  # fraction answered with a 429
+    seed: int = FAKE_PLAID_SEED
+
+
+def _digest(*parts: Any) -> str:
+    return hashlib.sha256(":".join(map(str, parts)).encode()).hexdigest()[:24]
+
+
+def _item_key(access_token: str) -> str:
+    # Tokens issued here embed the item key; any other string is accepted as a token in its own right
+    return access_token[len("access-local-"):] if access_token.startswith("access-local-") else _digest(access_token)
+
+
+def _error(status_code: int, error_type: str, error_code: str, message: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    return JSONResponse(status_code=status_code, headers=headers, content={
+        "error_type": error_type, "error_code": error_code, "error_message": message,
+        "display_message": None, "request_id": "local",
+    })
+
+
+def _encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(f"offset:{offset}".encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Optional[int]:
+    try:
+        prefix, offset = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        return int(offset) if prefix == "offset" else None
+    except ValueError:
+        return None
+
+
+class FakePlaidData:
+    """The synthetic accounts and transactions behind each access token."""
+
+    def __init__(self, settings: FakePlaidSettings, today: Optional[datetime.date] = None):
+        self.settings = settings
+        self.today = today or datetime.date.today()
+        self._transactions = functools.lru_cache(maxsize=256)(self._generate_transactions)
+
+    def accounts(self, access_token: str) -> List[Dict[str, Any]]:
+        key = _item_key(access_token)
+        rng = random.Random(f"{self.settings.seed}:{key}:accounts")
+        accounts = []
+        for index in range(self.settings.accounts):
+            kind, subtype = ACCOUNT_KINDS[index % len(ACCOUNT_KINDS)]
+            current = round(rng.uniform(100, 10000), 2)
+            accounts.append({
+                "account_id": _digest(self.settings.seed, key, index),
+                "balances": {
+                    "available": current if kind == "depository" else None,
+                    "current": current,
+                    "limit": 5000.0 if kind == "credit" else None,
+                    "iso_currency_code": "CAD",
+                    "unofficial_currency_code": None,
+                },
+                "mask": f"{rng.randrange(10000):04d}",
+                "name": f"Local {subtype.title()}",
+                "official_name": f"Local Bank {subtype.title()} Account",
+                "type": kind,
+                "subtype": subtype,
+            })
+        return accounts
+
+    def item(self, access_token: str) -> Dict[str, Any]:
+        return {
+            "item_id": f"item-local-{_item_key(access_token)}",
+            "institution_id": "ins_local",
+            "webhook": None,
+            "error": None,
+            "available_products": [],
+            "billed_products": ["transactions"],
+            "consent_expiration_time": None,
+            "update_type": "background",
+        }
+
+    def transactions(self, access_token: str) -> List[Dict[str, Any]]:
+        """Every transaction for the token, oldest first; the order /transactions/sync pages through."""
+        return self._transactions(access_token)
+
+    def _generate_transactions(self, access_token: str) -> List[Dict[str, Any]]:
+        key = _item_key(access_token)
+        transactions = []
+        for account in self.accounts(access_token):
+            rng = random.Random(f"{self.settings.seed}:{account['account_id']}")
+            for index in range(self.settings.transactions):
+                name, typical, category = rng.choice(MERCHANTS)
+                date = self.today - datetime.timedelta(days=rng.randrange(max(self.settings.history_days, 1)))
+                transactions.append(_transaction(
+                    account["account_id"], _digest(key, account["account_id"], index), name, category,
+                    round(typical * rng.lognormvariate(0, 0.3), 2), date,
+                ))
+        transactions.sort(key=lambda transaction: (transaction["date"], transaction["transaction_id"]))
+        return transactions
+
+
+def _transaction(account_id: str, transaction_id: str, name: str, category: str, amount: float, date: datetime.date) -> Dict[str, Any]:
+    # Every field Plaid's client libraries require, with the ones we have no use for left null
+    return {
+        "transaction_id": transaction_id,
+        "account_id": account_id,
+        "amount": amount,
+        "iso_currency_code": "CAD",
+        "unofficial_currency_code": None,
+        "date": date.isoformat(),
+        "authorized_date": date.isoformat(),
+        "authorized_datetime": None,
+        "datetime": None,
+        "name": name.upper(),
+        "merchant_name": name,
+        "merchant_entity_id": None,
+        "logo_url": None,
+        "website": None,
+        "category": None,
+        "category_id": None,
+        "personal_finance_category": {"primary": category, "detailed": f"{category}_OTHER", "confidence_level": "HIGH"},
+        "location": {field: None for field in ("address", "city", "region", "postal_code", "country", "lat", "lon", "store_number")},
+        "payment_meta": {field: None for field in (
+            "reference_number", "ppd_id", "payee", "by_order_of", "payer", "payment_method", "payment_processor", "reason",
+        )},
+        "payment_channel": "online" if category in ("ENTERTAINMENT", "GENERAL_MERCHANDISE") else "in store",
+        "pending": False,
+        "pending_transaction_id": None,
+        "account_owner": None,
+        "transaction_code": None,
+        "transaction_type": "place",
+        "check_number": None,
+        "counterparties": [],
+        "original_description": None,
+    }
+
+
+def create_app(settings: Optional[FakePlaidSettings] = None, today: Optional[datetime.date] = None) -> FastAPI:
+    """The fake Plaid API, serving data for settings (FAKE_PLAID_* by default)."""
+    settings = settings or FakePlaidSettings()
+    data = FakePlaidData(settings, today)
+    faults = random.Random(settings.seed)
+    app = FastAPI(title="Local Plaid")
+
+    @app.middleware("http")
+    async def simulate_network(request: Request, call_next):
+        delay = settings.latency_ms + faults.uniform(-1, 1) * settings.latency_jitter_ms
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        roll = faults.random()
+        if roll < settings.error_rate:
+            return _error(500, "API_ERROR", "INTERNAL_SERVER_ERROR", "Injected failure")
+        if roll < settings.error_rate + settings.rate_limit_rate:
+            return _error(429, "RATE_LIMIT_EXCEEDED", "RATE_LIMIT", "Injected rate limit", headers={"Retry-After": "1"})
+        return await call_next(request)
+
+    @app.post("/link/token/create")
+    async def link_token_create(request: Request):
+        user = (await request.json()).get("user", {}).get("client_user_id", "")
+        return {"link_token": f"link-local-{_digest(user)}", "expiration": "2030-01-01T00:00:00Z", "request_id": "local"}
+
+    @app.post("/sandbox/public_token/create")
+    async def sandbox_public_token_create():
+        return {"public_token": f"public-local-{uuid.uuid4().hex}", "request_id": "local"}
+
+    @app.post("/item/public_token/exchange")
+    async def item_public_token_exchange(request: Request):
+        key = _digest((await request.json()).get("public_token", ""))
+        return {"access_token": f"access-local-{key}", "item_id": f"item-local-{key}", "request_id": "local"}
+
+    @app.post("/accounts/get")
+    async def accounts_get(request: Request):
+        access_token = (await request.json()).get("access_token", "")
+        return {"accounts": data.accounts(access_token), "item": data.item(access_token), "request_id": "local"}
+
+    @app.post("/transactions/get")
+    async def transactions_get(request: Request):
+        body = await request.json()
+        access_token = body.get("access_token", "")
+        options = body.get("options") or {}
+        count, offset = min(int(options.get("count", 100)), MAX_PAGE_SIZE), int(options.get("offset", 0))
+        start, end = body.get("start_date", ""), body.get("end_date", "")
+        # Plaid lists newest first
+        matching = [t for t in reversed(data.transactions(access_token)) if start <= t["date"] <= end]
+        return {
+            "accounts": data.accounts(access_token),
+            "transactions": matching[offset:offset + count],
+            "total_transactions": len(matching),
+            "item": data.item(access_token),
+            "request_id": "local",
+        }
+
+    @app.post("/transactions/sync")
+    async def transactions_sync(request: Request):
+        body = await request.json()
+        transactions = data.transactions(body.get("access_token", ""))
+        offset = _decode_cursor(body["cursor"]) if body.get("cursor") else 0
+        if offset is None:
+            return _error(400, "INVALID_INPUT", "INVALID_FIELD", "cursor is not a valid cursor")
+        count = min(int(body.get("count", 100)), MAX_PAGE_SIZE)
+        page = transactions[offset:offset + count]
+        return {
+            "added": page,
+            "modified": [],
+            "removed": [],
+            "next_cursor": _encode_cursor(offset + len(page)),
+            "has_more": offset + len(page) < len(transactions),
+            "request_id": "local",
+        }
+
+    return app
+
+
+app = create_app()
+
+
+def main() -> None:
+    import uvicorn
+
+    defaults = FakePlaidSettings()
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the Plaid API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--accounts", type=int, default=defaults.accounts, help="Accounts per item")
+    parser.add_argument("--transactions", type=int, default=defaults.transactions, help="Transactions per account")
+    parser.add_argument("--history-days", type=int, default=defaults.history_days)
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms, help="Added to every response")
+    parser.add_argument("--latency-jitter-ms", type=float, default=defaults.latency_jitter_ms)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="Fraction of calls failing with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=defaults.rate_limit_rate, help="Fraction of calls failing with a 429")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = parser.parse_args()
+    settings = FakePlaidSettings(**{field: getattr(args, field) for field in FakePlaidSettings._fields})
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
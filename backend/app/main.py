@@ -1,7 +1,29 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from api.routes import auth, users, accounts, transactions, plaid
+from api.middleware import IdempotencyMiddleware, InstrumentationMiddleware
+from api.routes import auth, users, accounts, transactions, plaid, categories, subscriptions, budgets, metrics
+from app.core.config import JOB_WORKERS, METRICS_ENABLED
+from app.core.security import password_hasher
+from worker import build_job_handlers, start_workers
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    stop_workers = asyncio.Event()
+    workers = start_workers(JOB_WORKERS, build_job_handlers(plaid.plaid_service), stop_workers)
+    yield
+    # Let in-flight jobs finish, then release pooled Plaid connections and the password hashing workers
+    stop_workers.set()
+    await asyncio.gather(*workers)
+    await plaid.plaid_service.aclose()
+    password_hasher.shutdown()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(IdempotencyMiddleware)
+if METRICS_ENABLED:
+    app.add_middleware(InstrumentationMiddleware)
+    app.include_router(metrics.router, tags=["Metrics"])
 
 # Include API routes
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
@@ -9,3 +31,6 @@ app.include_router(users.router, prefix="/users", tags=["Users"])
 app.include_router(accounts.router, prefix="/accounts", tags=["Accounts"])
 app.include_router(transactions.router, prefix="/transactions", tags=["Transactions"])
 app.include_router(plaid.router, prefix="/plaid", tags=["Plaid"])
+app.include_router(categories.router, prefix="/categories", tags=["Categories"])
+app.include_router(subscriptions.router, prefix="/subscriptions", tags=["Subscriptions"])
+app.include_router(budgets.router, prefix="/budgets", tags=["Budgets"])
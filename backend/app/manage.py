@@ -0,0 +1,129 @@
+"""
+Maintenance commands: `PYTHONPATH=app python -m app.manage <command> [options]`, from backend/.
+"""
+import argparse
+import asyncio
+from uuid import UUID
+
+from sqlalchemy import select
+
+from app.core.config import FX_RATES_FILE
+from db.models import User
+from db.session import AsyncSessionLocal, async_engine
+from services.balances import reconcile_balances
+from services.budgets import check_budget_spend
+from services.fx import load_fx_rates, read_rates_file
+from services.idempotency import purge_expired_keys
+from services.rollups import rebuild_rollups
+from services.search import rebuild_search_index
+from services.statement_import import backfill_dedup_hashes
+from services.subscriptions import detect_subscriptions
+
+
+async def _rebuild_rollups(args: argparse.Namespace) -> None:
+    async with AsyncSessionLocal() as db:
+        written = await rebuild_rollups(db, args.user_id)
+        await db.commit()
+    print(f"Rebuilt {written} rollup rows")
+
+
+async def _backfill_dedup_hashes(args: argparse.Namespace) -> None:
+    async with AsyncSessionLocal() as db:
+        hashed = await backfill_dedup_hashes(db)
+    print(f"Hashed {hashed} transactions")
+
+
+async def _rebuild_search_index(args: argparse.Namespace) -> None:
+    async with AsyncSessionLocal() as db:
+        filled = await rebuild_search_index(db)
+    print(f"Indexed {filled} transactions without search text")
+
+
+async def _reconcile_balances(args: argparse.Namespace) -> None:
+    async with AsyncSessionLocal() as db:
+        drifted = await reconcile_balances(db, repair=args.repair)
+    for entry in drifted:
+        print(f"{entry['bank_account_id']}: stored {entry['stored']}, expected {entry['expected']}")
+    print(f"{len(drifted)} accounts drifted" + (" and were repaired" if args.repair and drifted else ""))
+
+
+async def _check_budgets(args: argparse.Namespace) -> None:
+    async with AsyncSessionLocal() as db:
+        drifted = await check_budget_spend(db, repair=args.repair, user_ids=[args.user_id] if args.user_id else None)
+    for entry in drifted:
+        print(f"{entry['budget_id']} {entry['month']:%Y-%m}: stored {entry['stored']}, expected {entry['expected']}")
+    print(f"{len(drifted)} budget counters drifted" + (" and were repaired" if args.repair and drifted else ""))
+
+
+async def _detect_subscriptions(args: argparse.Namespace) -> None:
+    async with AsyncSessionLocal() as db:
+        user_ids = [args.user_id] if args.user_id else list(await db.scalars(select(User.id)))
+        found = 0
+        for user_id in user_ids:
+            found += await detect_subscriptions(db, user_id)
+            await db.commit()
+    print(f"Found {found} recurring payments for {len(user_ids)} users")
+
+
+async def _load_fx_rates(args: argparse.Namespace) -> None:
+    rows = read_rates_file(args.file)
+    async with AsyncSessionLocal() as db:
+        loaded = await load_fx_rates(db, rows)
+        await db.commit()
+    print(f"Loaded {loaded} exchange rates from {args.file}")
+
+
+async def _purge_idempotency_keys(args: argparse.Namespace) -> None:
+    async with AsyncSessionLocal() as db:
+        purged = await purge_expired_keys(db)
+    print(f"Purged {purged} expired idempotency keys")
+
+
+async def _run(args: argparse.Namespace) -> None:
+    try:
+        await args.handler(args)
+    finally:
+        # Pooled aiosqlite connections run on non-daemon threads and would keep the process alive
+        await async_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="My Dinero maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rollups = commands.add_parser("rebuild-rollups", help="Recompute transaction summary rollups from transactions")
+    rollups.add_argument("--user-id", type=UUID, default=None, help="Only rebuild this user's rollups")
+    rollups.set_defaults(handler=_rebuild_rollups)
+
+    hashes = commands.add_parser("backfill-dedup-hashes", help="Compute statement import dedup hashes for older transactions")
+    hashes.set_defaults(handler=_backfill_dedup_hashes)
+
+    search = commands.add_parser("rebuild-search-index", help="Index older transactions for search, and on SQLite rebuild the FTS5 table")
+    search.set_defaults(handler=_rebuild_search_index)
+
+    balances = commands.add_parser("reconcile-balances", help="Check maintained account balances against transactions")
+    balances.add_argument("--repair", action="store_true", help="Overwrite drifted balances with the recomputed value")
+    balances.set_defaults(handler=_reconcile_balances)
+
+    budgets = commands.add_parser("check-budgets", help="Check budget spending counters against transactions")
+    budgets.add_argument("--repair", action="store_true", help="Overwrite drifted counters with the recomputed values")
+    budgets.add_argument("--user-id", type=UUID, default=None, help="Only check this user's budgets")
+    budgets.set_defaults(handler=_check_budgets)
+
+    subscriptions = commands.add_parser("detect-subscriptions", help="Rescan transaction history for recurring payments")
+    subscriptions.add_argument("--user-id", type=UUID, default=None, help="Only rescan this user's history")
+    subscriptions.set_defaults(handler=_detect_subscriptions)
+
+    rates = commands.add_parser("load-fx-rates", help="Load daily exchange rates from a date,currency,rate CSV")
+    rates.add_argument("--file", default=FX_RATES_FILE, help="Defaults to FX_RATES_FILE, the bundled sample rates")
+    rates.set_defaults(handler=_load_fx_rates)
+
+    idempotency = commands.add_parser("purge-idempotency-keys", help="Delete expired Idempotency-Key responses")
+    idempotency.set_defaults(handler=_purge_idempotency_keys)
+
+    args = parser.parse_args()
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""Add composite index for keyset pagination of transactions
+
+Revision ID: 4c1f0e2d9a7b
+Revises: 53714eb39433
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c1f0e2d9a7b'
+down_revision: Union[str, None] = '53714eb39433'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_transactions_user_id_date_id', 'transactions', ['user_id', 'date', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_transactions_user_id_date_id', table_name='transactions')
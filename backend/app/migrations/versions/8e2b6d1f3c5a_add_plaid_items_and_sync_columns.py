@@ -0,0 +1,56 @@
+"""Add plaid_items and Plaid identifiers for transaction sync
+
+Revision ID: 8e2b6d1f3c5a
+Revises: 4c1f0e2d9a7b
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e2b6d1f3c5a'
+down_revision: Union[str, None] = '4c1f0e2d9a7b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('plaid_items',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('item_id', sa.String(), nullable=False),
+    sa.Column('access_token', sa.String(), nullable=False),
+    sa.Column('institution_name', sa.String(), nullable=True),
+    sa.Column('transactions_cursor', sa.String(), nullable=True),
+    sa.Column('last_synced_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('item_id')
+    )
+    with op.batch_alter_table('bank_accounts') as batch_op:
+        batch_op.add_column(sa.Column('plaid_item_id', sa.UUID(), nullable=True))
+        batch_op.add_column(sa.Column('plaid_account_id', sa.String(), nullable=True))
+        batch_op.create_foreign_key('fk_bank_accounts_plaid_item_id', 'plaid_items', ['plaid_item_id'], ['id'])
+        batch_op.create_unique_constraint('uq_bank_accounts_plaid_account_id', ['plaid_account_id'])
+    with op.batch_alter_table('transactions') as batch_op:
+        batch_op.add_column(sa.Column('plaid_transaction_id', sa.String(), nullable=True))
+        batch_op.create_unique_constraint('uq_transactions_plaid_transaction_id', ['plaid_transaction_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('transactions') as batch_op:
+        batch_op.drop_constraint('uq_transactions_plaid_transaction_id', type_='unique')
+        batch_op.drop_column('plaid_transaction_id')
+    with op.batch_alter_table('bank_accounts') as batch_op:
+        batch_op.drop_constraint('uq_bank_accounts_plaid_account_id', type_='unique')
+        batch_op.drop_constraint('fk_bank_accounts_plaid_item_id', type_='foreignkey')
+        batch_op.drop_column('plaid_account_id')
+        batch_op.drop_column('plaid_item_id')
+    op.drop_table('plaid_items')
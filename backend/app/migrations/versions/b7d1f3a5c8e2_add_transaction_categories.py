@@ -0,0 +1,48 @@
+"""Add transaction categories and category_rules
+
+Revision ID: b7d1f3a5c8e2
+Revises: a4c8e2f6b9d3
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d1f3a5c8e2'
+down_revision: Union[str, None] = 'a4c8e2f6b9d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('transactions') as batch_op:
+        batch_op.add_column(sa.Column('category', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('category_source', sa.String(), nullable=True))
+
+    op.create_table('category_rules',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('pattern', sa.String(), nullable=False),
+    sa.Column('category', sa.String(), nullable=False),
+    sa.Column('is_regex', sa.Boolean(), nullable=False),
+    sa.Column('priority', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_category_rules_user_id'), 'category_rules', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_category_rules_user_id'), table_name='category_rules')
+    op.drop_table('category_rules')
+
+    with op.batch_alter_table('transactions') as batch_op:
+        batch_op.drop_column('category_source')
+        batch_op.drop_column('category')
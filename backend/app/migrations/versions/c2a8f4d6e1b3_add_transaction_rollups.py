@@ -0,0 +1,40 @@
+"""Add transaction_rollups
+
+Revision ID: c2a8f4d6e1b3
+Revises: b7d3e9f1a2c4
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2a8f4d6e1b3'
+down_revision: Union[str, None] = 'b7d3e9f1a2c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('transaction_rollups',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('period', sa.String(), nullable=False),
+    sa.Column('period_start', sa.Date(), nullable=False),
+    sa.Column('bank_account_id', sa.UUID(), nullable=False),
+    sa.Column('inflow', sa.DECIMAL(), nullable=False),
+    sa.Column('outflow', sa.DECIMAL(), nullable=False),
+    sa.Column('transaction_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['bank_account_id'], ['bank_accounts.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'period', 'period_start', 'bank_account_id')
+    )
+    # Existing transactions are not rolled up here; run `python -m app.manage rebuild-rollups` once after upgrading
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('transaction_rollups')
@@ -0,0 +1,60 @@
+"""Add transactions.search_text and its full-text index
+
+Revision ID: c9e3a7d5f1b8
+Revises: b7d1f3a5c8e2
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9e3a7d5f1b8'
+down_revision: Union[str, None] = 'b7d1f3a5c8e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(search_text, user_id, content='transactions', content_rowid='rowid')",
+    "CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions BEGIN "
+    "INSERT INTO transactions_fts(rowid, search_text, user_id) VALUES (new.rowid, new.search_text, new.user_id); END",
+    "CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN "
+    "INSERT INTO transactions_fts(transactions_fts, rowid, search_text, user_id) VALUES ('delete', old.rowid, old.search_text, old.user_id); END",
+    "CREATE TRIGGER IF NOT EXISTS transactions_fts_update AFTER UPDATE OF search_text, user_id ON transactions BEGIN "
+    "INSERT INTO transactions_fts(transactions_fts, rowid, search_text, user_id) VALUES ('delete', old.rowid, old.search_text, old.user_id); "
+    "INSERT INTO transactions_fts(rowid, search_text, user_id) VALUES (new.rowid, new.search_text, new.user_id); END",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('transactions') as batch_op:
+        batch_op.add_column(sa.Column('search_text', sa.String(), nullable=True))
+
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.create_index('ix_transactions_search', 'transactions',
+                        [sa.text("to_tsvector('simple'::regconfig, coalesce(search_text, ''))")], postgresql_using='gin')
+    elif dialect == 'sqlite':
+        for statement in SQLITE_SEARCH_DDL:
+            op.execute(statement)
+        # The update trigger removes a row's old entry first, so existing rows must be in the index
+        op.execute("INSERT INTO transactions_fts(transactions_fts) VALUES ('rebuild')")
+    # Existing rows are given search text by `python -m app.manage rebuild-search-index`
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.drop_index('ix_transactions_search', table_name='transactions')
+    elif dialect == 'sqlite':
+        for trigger in ('transactions_fts_insert', 'transactions_fts_delete', 'transactions_fts_update'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS transactions_fts")
+
+    with op.batch_alter_table('transactions') as batch_op:
+        batch_op.drop_column('search_text')
@@ -0,0 +1,47 @@
+"""Add subscriptions
+
+Revision ID: d2f6b8a4c0e7
+Revises: c9e3a7d5f1b8
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2f6b8a4c0e7'
+down_revision: Union[str, None] = 'c9e3a7d5f1b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('subscriptions',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('bank_account_id', sa.UUID(), nullable=False),
+    sa.Column('merchant', sa.String(), nullable=False),
+    sa.Column('days', sa.JSON(), nullable=False),
+    sa.Column('amounts', sa.JSON(), nullable=False),
+    sa.Column('is_recurring', sa.Boolean(), nullable=False),
+    sa.Column('period', sa.String(), nullable=True),
+    sa.Column('amount', sa.BigInteger(), nullable=True),
+    sa.Column('last_date', sa.Date(), nullable=True),
+    sa.Column('next_date', sa.Date(), nullable=True),
+    sa.Column('next_amount', sa.BigInteger(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['bank_account_id'], ['bank_accounts.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'bank_account_id', 'merchant', name='uq_subscriptions_user_account_merchant')
+    )
+    # Existing history is analyzed by `python -m app.manage detect-subscriptions`
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('subscriptions')
@@ -0,0 +1,33 @@
+"""Add transactions.dedup_hash
+
+Revision ID: d5e1c7b3a9f2
+Revises: c2a8f4d6e1b3
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5e1c7b3a9f2'
+down_revision: Union[str, None] = 'c2a8f4d6e1b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('transactions') as batch_op:
+        batch_op.add_column(sa.Column('dedup_hash', sa.String(length=64), nullable=True))
+    op.create_index('ix_transactions_dedup_hash', 'transactions', ['dedup_hash'], unique=False, postgresql_using='hash')
+    # Existing rows are hashed by `python -m app.manage backfill-dedup-hashes`
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_transactions_dedup_hash', table_name='transactions')
+    with op.batch_alter_table('transactions') as batch_op:
+        batch_op.drop_column('dedup_hash')
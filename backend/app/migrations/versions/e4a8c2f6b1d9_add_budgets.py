@@ -0,0 +1,54 @@
+"""Add budgets
+
+Revision ID: e4a8c2f6b1d9
+Revises: d2f6b8a4c0e7
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a8c2f6b1d9'
+down_revision: Union[str, None] = 'd2f6b8a4c0e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('budgets',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('amount', sa.BigInteger(), nullable=False),
+    sa.Column('bank_account_id', sa.UUID(), nullable=True),
+    sa.Column('category', sa.String(), nullable=True),
+    sa.Column('pattern', sa.String(), nullable=True),
+    sa.Column('is_regex', sa.Boolean(), nullable=False),
+    sa.Column('alert_percents', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['bank_account_id'], ['bank_accounts.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_budgets_user_id'), 'budgets', ['user_id'], unique=False)
+    op.create_table('budget_spend',
+    sa.Column('budget_id', sa.UUID(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('spent', sa.BigInteger(), nullable=False),
+    sa.Column('transaction_count', sa.Integer(), nullable=False),
+    sa.Column('alerted_percent', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['budget_id'], ['budgets.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('budget_id', 'month')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('budget_spend')
+    op.drop_index(op.f('ix_budgets_user_id'), table_name='budgets')
+    op.drop_table('budgets')
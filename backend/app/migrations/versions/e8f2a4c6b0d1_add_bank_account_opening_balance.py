@@ -0,0 +1,37 @@
+"""Add bank_accounts.opening_balance and opening_balance_at
+
+Revision ID: e8f2a4c6b0d1
+Revises: d5e1c7b3a9f2
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8f2a4c6b0d1'
+down_revision: Union[str, None] = 'd5e1c7b3a9f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('bank_accounts') as batch_op:
+        batch_op.add_column(sa.Column('opening_balance', sa.DECIMAL(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('opening_balance_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_transactions_bank_account_id_date', 'transactions', ['bank_account_id', 'date'], unique=False)
+    # Until now balance was only ever the value entered at creation
+    op.execute("UPDATE bank_accounts SET opening_balance = balance, opening_balance_at = created_at")
+    # Balances pick up later transactions with `python -m app.manage reconcile-balances --repair`
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_transactions_bank_account_id_date', table_name='transactions')
+    with op.batch_alter_table('bank_accounts') as batch_op:
+        batch_op.drop_column('opening_balance_at')
+        batch_op.drop_column('opening_balance')
@@ -0,0 +1,55 @@
+"""Store money as BIGINT minor units and add bank_accounts.currency
+
+Revision ID: f3b9d5a7c1e4
+Revises: e8f2a4c6b0d1
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b9d5a7c1e4'
+down_revision: Union[str, None] = 'e8f2a4c6b0d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONEY_COLUMNS = {
+    'transactions': ('amount',),
+    'bank_accounts': ('balance', 'opening_balance'),
+    'transaction_rollups': ('inflow', 'outflow'),
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, columns in MONEY_COLUMNS.items():
+        # Scale to cents while the columns are still DECIMAL, then narrow the (now whole) values
+        op.execute(f"UPDATE {table} SET " + ", ".join(f"{column} = round({column} * 100)" for column in columns))
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                batch_op.alter_column(column, type_=sa.BigInteger(), existing_type=sa.DECIMAL(),
+                                      existing_nullable=False, postgresql_using=f'{column}::bigint')
+
+    with op.batch_alter_table('bank_accounts') as batch_op:
+        batch_op.add_column(sa.Column('currency', sa.String(length=3), nullable=False, server_default='CAD'))
+    op.execute(
+        "UPDATE bank_accounts SET currency = "
+        "(SELECT upper(users.currency) FROM users WHERE users.id = bank_accounts.user_id AND length(users.currency) = 3) "
+        "WHERE EXISTS (SELECT 1 FROM users WHERE users.id = bank_accounts.user_id AND length(users.currency) = 3)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('bank_accounts') as batch_op:
+        batch_op.drop_column('currency')
+
+    for table, columns in MONEY_COLUMNS.items():
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                batch_op.alter_column(column, type_=sa.DECIMAL(), existing_type=sa.BigInteger(), existing_nullable=False)
+        op.execute(f"UPDATE {table} SET " + ", ".join(f"{column} = {column} / 100.0" for column in columns))
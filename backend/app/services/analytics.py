@@ -0,0 +1,66 @@
+"""
+In-process aggregation over transaction amounts as NumPy int64 arrays of minor units.
+
+Integer sums are exact and vectorized, so totalling a million amounts takes a few milliseconds
+instead of the better part of a second a Decimal loop would.
+"""
+from decimal import Decimal
+from typing import Any, Dict, Hashable, Iterable, List, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import BigInteger, select, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.money import from_minor, to_minor
+from db.models import Transaction
+
+
+def minor_array(amounts: Iterable[Any]) -> np.ndarray:
+    """int64 minor units for amounts given in major units (Decimal, str, float or int)."""
+    return np.fromiter((to_minor(amount) for amount in amounts), dtype=np.int64)
+
+
+async def fetch_amounts(db: AsyncSession, *criteria: Any) -> np.ndarray:
+    """
+    Amounts of the transactions matching criteria, as int64 minor units.
+
+    The column is read as the raw BIGINT, so no Decimal is built per row.
+    """
+    stmt = select(type_coerce(Transaction.amount, BigInteger)).where(*criteria)
+    return np.fromiter(await db.scalars(stmt), dtype=np.int64)
+
+
+def total(minor: np.ndarray) -> Decimal:
+    return from_minor(minor.sum(dtype=np.int64))
+
+
+def inflow_outflow(minor: np.ndarray) -> Tuple[Decimal, Decimal]:
+    """Money in, and money out as a positive amount."""
+    inflow = minor[minor > 0].sum(dtype=np.int64)
+    outflow = -minor[minor < 0].sum(dtype=np.int64)
+    return from_minor(inflow), from_minor(outflow)
+
+
+def group_codes(keys: Sequence[Hashable]) -> Tuple[List[Hashable], np.ndarray]:
+    """Factorize keys: the distinct keys, and the index of each key among them."""
+    if isinstance(keys, np.ndarray) and keys.dtype.kind in "iu":
+        uniques, codes = np.unique(keys, return_inverse=True)
+        return uniques.tolist(), codes
+    index: Dict[Hashable, int] = {}
+    codes = np.fromiter((index.setdefault(key, len(index)) for key in keys), dtype=np.intp, count=len(keys))
+    return list(index), codes
+
+
+def totals_by(keys: Sequence[Hashable], minor: np.ndarray) -> Dict[Hashable, Decimal]:
+    """
+    Sum amounts per key, e.g. per account or per day.
+
+    The sums are accumulated with np.add.at into an int64 array, which unlike np.bincount
+    never goes through float64.
+    """
+    if len(keys) != len(minor):
+        raise ValueError("keys and amounts must have the same length")
+    uniques, codes = group_codes(keys)
+    sums = np.zeros(len(uniques), dtype=np.int64)
+    np.add.at(sums, codes, minor)
+    return {key: from_minor(value) for key, value in zip(uniques, sums.tolist())}
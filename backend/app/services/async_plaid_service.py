@@ -0,0 +1,456 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import plaid
+
+from app.core.config import (
+    PLAID_CLIENT_ID,
+    PLAID_SECRET,
+    PLAID_ENV,
+    PLAID_BASE_URL,
+    FAKE_PLAID_URL,
+    PLAID_COUNTRY_CODES,
+    PLAID_PRODUCTS,
+    PLAID_TIMEOUT_SECONDS,
+    PLAID_CALL_DEADLINE_SECONDS,
+    PLAID_MAX_RETRIES,
+    PLAID_BACKOFF_BASE_SECONDS,
+    PLAID_BACKOFF_MAX_SECONDS,
+    PLAID_MAX_CONCURRENCY,
+    PLAID_PER_ITEM_CONCURRENCY,
+    PLAID_REFRESH_MAX_PARALLEL,
+    PLAID_HTTP_MAX_CONNECTIONS,
+    PLAID_HTTP_MAX_KEEPALIVE,
+    PLAID_CIRCUIT_FAILURE_THRESHOLD,
+    PLAID_CIRCUIT_RESET_SECONDS,
+    PLAID_BALANCES_CACHE_TTL_SECONDS,
+    PLAID_TRANSACTIONS_CACHE_TTL_SECONDS,
+)
+from app.core.metrics import record_plaid_call
+from services.plaid_cache import PlaidResponseCache
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CircuitBreaker:
+    """
+    Stops calling an upstream that keeps failing.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls are rejected
+    immediately. Once `reset_timeout` seconds pass a single trial call is let through; its
+    outcome either closes the circuit again or re-opens it. A trial that never finishes
+    (cancelled by the call deadline or a disconnected client) re-opens it too.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = PLAID_CIRCUIT_FAILURE_THRESHOLD, reset_timeout: float = PLAID_CIRCUIT_RESET_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and self._clock() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+        if self.state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_abandoned(self) -> None:
+        """A call cut short before its outcome was known; only a half-open trial counts it, as a failure."""
+        if self.state == self.HALF_OPEN and self._trial_in_flight:
+            self.record_failure()
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = self._clock()
+
+
+def _plaid_host() -> str:
+    if PLAID_BASE_URL:
+        return PLAID_BASE_URL
+    if PLAID_ENV == 'local':
+        return FAKE_PLAID_URL
+    if PLAID_ENV == 'development':
+        return plaid.Environment.Development
+    if PLAID_ENV == 'production':
+        return plaid.Environment.Production
+    return plaid.Environment.Sandbox
+
+
+def _error(status_code: int, message: str, error_code: str = 'UNKNOWN_ERROR', error_type: str = 'API_ERROR') -> Dict[str, Any]:
+    return {
+        'error': {
+            'status_code': status_code,
+            'message': message,
+            'error_code': error_code,
+            'error_type': error_type
+        }
+    }
+
+
+def _retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        return None
+
+
+class AsyncPlaidService:
+    """
+    Non-blocking Plaid client built on a pooled httpx.AsyncClient.
+
+    Exposes the same methods and return shapes as PlaidService, as coroutines. Every call is
+    bounded by a deadline, retried with jittered exponential backoff on 429/5xx and transport
+    errors (honoring Retry-After), limited by a global and a per-item concurrency semaphore,
+    and short-circuited while the circuit breaker is open. Balance and transaction reads are
+    served through the optional response cache.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        timeout: float = PLAID_TIMEOUT_SECONDS,
+        deadline: float = PLAID_CALL_DEADLINE_SECONDS,
+        max_retries: int = PLAID_MAX_RETRIES,
+        backoff_base: float = PLAID_BACKOFF_BASE_SECONDS,
+        backoff_max: float = PLAID_BACKOFF_MAX_SECONDS,
+        max_concurrency: int = PLAID_MAX_CONCURRENCY,
+        per_item_concurrency: int = PLAID_PER_ITEM_CONCURRENCY,
+        breaker: Optional[CircuitBreaker] = None,
+        cache: Optional[PlaidResponseCache] = None,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ):
+        self.base_url = (base_url or _plaid_host()).rstrip("/")
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.per_item_concurrency = per_item_concurrency
+        self.breaker = breaker or CircuitBreaker()
+        self.cache = cache
+        self._client = client
+        self._sleep = sleep
+        self._global_slots = asyncio.Semaphore(max_concurrency)
+        self._item_slots: Dict[str, asyncio.Semaphore] = {}
+        self._item_waiters: Dict[str, int] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created lazily so the connection pool belongs to the running event loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=PLAID_HTTP_MAX_CONNECTIONS, max_keepalive_connections=PLAID_HTTP_MAX_KEEPALIVE),
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @asynccontextmanager
+    async def _item_slot(self, item_key: Optional[str]) -> AsyncIterator[None]:
+        if item_key is None:
+            yield
+            return
+        semaphore = self._item_slots.setdefault(item_key, asyncio.Semaphore(self.per_item_concurrency))
+        self._item_waiters[item_key] = self._item_waiters.get(item_key, 0) + 1
+        try:
+            async with semaphore:
+                yield
+        finally:
+            self._item_waiters[item_key] -= 1
+            if self._item_waiters[item_key] == 0:
+                # Forget idle items so the map does not grow with every access token ever seen
+                del self._item_waiters[item_key]
+                del self._item_slots[item_key]
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    async def _attempts(self, path: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        payload = {'client_id': PLAID_CLIENT_ID, 'secret': PLAID_SECRET, **body}
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                return _error(503, 'Plaid is temporarily unavailable', 'CIRCUIT_OPEN')
+
+            retry_after = None
+            started = time.perf_counter()
+            try:
+                response = await self.client.post(path, json=payload)
+            except httpx.TransportError as e:
+                record_plaid_call(path, e.__class__.__name__, time.perf_counter() - started)
+                outcome = _error(503, f'Could not reach Plaid: {e.__class__.__name__}', 'CONNECTION_ERROR')
+            except asyncio.CancelledError:
+                # Otherwise a cancelled trial would leave the circuit half-open with its trial forever in flight
+                self.breaker.record_abandoned()
+                raise
+            else:
+                record_plaid_call(path, str(response.status_code), time.perf_counter() - started)
+                if response.status_code < 400:
+                    self.breaker.record_success()
+                    return response.json()
+                try:
+                    error_response = response.json()
+                except ValueError:
+                    error_response = {}
+                outcome = _error(
+                    response.status_code,
+                    error_response.get('error_message', 'An unknown error occurred'),
+                    error_response.get('error_code', 'UNKNOWN_ERROR'),
+                    error_response.get('error_type', 'API_ERROR'),
+                )
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    # The request reached Plaid and was rejected on its merits; upstream is healthy
+                    self.breaker.record_success()
+                    return outcome
+                retry_after = _retry_after_seconds(response)
+
+            self.breaker.record_failure()
+            if attempt >= self.max_retries:
+                return outcome
+            await self._sleep(self._backoff(attempt, retry_after))
+            attempt += 1
+
+    async def _post(self, path: str, body: Dict[str, Any], item_key: Optional[str] = None) -> Dict[str, Any]:
+        async def call() -> Dict[str, Any]:
+            async with self._global_slots, self._item_slot(item_key):
+                return await self._attempts(path, body)
+
+        try:
+            return await asyncio.wait_for(call(), timeout=self.deadline)
+        except asyncio.TimeoutError:
+            return _error(504, f'Plaid call to {path} exceeded its {self.deadline:g}s deadline', 'TIMEOUT')
+
+    async def create_link_token(self, user_id: str, client_name: str = "My Dinero") -> Dict[str, Any]:
+        """
+        Create a link token for a user to connect their bank accounts.
+
+        Returns:
+            A dictionary containing the link token and expiration
+        """
+        response = await self._post('/link/token/create', {
+            'user': {'client_user_id': user_id},
+            'client_name': client_name,
+            'products': PLAID_PRODUCTS,
+            'country_codes': PLAID_COUNTRY_CODES,
+            'language': 'en',
+        })
+        if 'error' in response:
+            return response
+        return {'link_token': response['link_token'], 'expiration': response['expiration']}
+
+    async def exchange_public_token(self, public_token: str) -> Dict[str, Any]:
+        """
+        Exchange a public token for an access token and item ID.
+
+        Returns:
+            A dictionary containing the access token and item ID
+        """
+        response = await self._post('/item/public_token/exchange', {'public_token': public_token})
+        if 'error' in response:
+            return response
+        return {'access_token': response['access_token'], 'item_id': response['item_id']}
+
+    async def get_webhook_verification_key(self, key_id: str) -> Dict[str, Any]:
+        """
+        Fetch the public JWK Plaid used to sign webhooks with the given key ID.
+
+        Returns:
+            A dictionary containing the key
+        """
+        response = await self._post('/webhook_verification_key/get', {'key_id': key_id})
+        if 'error' in response:
+            return response
+        return {'key': response['key']}
+
+    async def invalidate_cache(self, access_token: str) -> None:
+        """Forget cached balances and transactions for an item so the next read goes to Plaid."""
+        if self.cache is not None:
+            await self.cache.invalidate(access_token)
+
+    async def get_transactions(self, access_token: str, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                               page_size: int = 500, force_refresh: bool = False) -> Dict[str, Any]:
+        """
+        Get transactions for a user's financial accounts, following total_transactions pagination.
+
+        Args:
+            access_token: The access token for the user's financial institution
+            start_date: The start date for transactions (defaults to 30 days ago)
+            end_date: The end date for transactions (defaults to today)
+            page_size: Number of transactions requested per page
+            force_refresh: Bypass the response cache and fetch from Plaid
+
+        Returns:
+            A dictionary containing transactions and account information
+        """
+        if start_date is None:
+            start_date = datetime.now() - timedelta(days=30)
+        if end_date is None:
+            end_date = datetime.now()
+
+        async def fetch() -> Dict[str, Any]:
+            return await self._fetch_transactions(access_token, start_date, end_date, page_size)
+
+        if self.cache is None:
+            return await fetch()
+        # Keyed on the calendar window Plaid actually sees, so "last 30 days" is shared across calls within a day
+        key = self.cache.key(access_token, "transactions", start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+        return await self.cache.get_or_fetch(key, fetch, PLAID_TRANSACTIONS_CACHE_TTL_SECONDS, force_refresh)
+
+    async def _fetch_transactions(self, access_token: str, start_date: datetime, end_date: datetime, page_size: int) -> Dict[str, Any]:
+        transactions = []
+        while True:
+            response = await self._post('/transactions/get', {
+                'access_token': access_token,
+                'start_date': start_date.strftime('%Y-%m-%d'),
+                'end_date': end_date.strftime('%Y-%m-%d'),
+                'options': {'count': page_size, 'offset': len(transactions)},
+            }, item_key=access_token)
+            if 'error' in response:
+                return response
+            transactions.extend(response['transactions'])
+            if not response['transactions'] or len(transactions) >= response['total_transactions']:
+                break
+
+        return {
+            'accounts': response['accounts'],
+            'transactions': transactions,
+            'total_transactions': response['total_transactions'],
+            'item': response['item']
+        }
+
+    async def get_account_balances(self, access_token: str, force_refresh: bool = False) -> Dict[str, Any]:
+        """
+        Get balances for a user's financial accounts.
+
+        Args:
+            access_token: The access token for the user's financial institution
+            force_refresh: Bypass the response cache and fetch from Plaid
+
+        Returns:
+            A dictionary containing account information with balances
+        """
+        async def fetch() -> Dict[str, Any]:
+            response = await self._post('/accounts/get', {'access_token': access_token}, item_key=access_token)
+            if 'error' in response:
+                return response
+            return {'accounts': response['accounts'], 'item': response['item']}
+
+        if self.cache is None:
+            return await fetch()
+        key = self.cache.key(access_token, "balances")
+        return await self.cache.get_or_fetch(key, fetch, PLAID_BALANCES_CACHE_TTL_SECONDS, force_refresh)
+
+    async def sync_transactions(self, access_token: str, cursor: Optional[str] = None, count: int = 500) -> Dict[str, Any]:
+        """
+        Fetch one page of transaction changes since the given cursor.
+
+        Returns:
+            A dictionary containing added, modified and removed transactions, the next cursor
+            and whether more pages are available
+        """
+        body: Dict[str, Any] = {'access_token': access_token, 'count': count}
+        if cursor:
+            body['cursor'] = cursor
+        response = await self._post('/transactions/sync', body, item_key=access_token)
+        if 'error' in response:
+            return response
+        return {
+            'added': response['added'],
+            'modified': response['modified'],
+            'removed': response['removed'],
+            'next_cursor': response['next_cursor'],
+            'has_more': response['has_more']
+        }
+
+    async def refresh_items(self, access_tokens: List[str], start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                            include_transactions: bool = True, max_parallel: int = PLAID_REFRESH_MAX_PARALLEL,
+                            force_refresh: bool = False) -> Dict[str, Any]:
+        """
+        Fetch balances (and optionally transactions) for several items concurrently and merge them.
+
+        Items are refreshed with at most `max_parallel` in flight, so the total time tracks the
+        slowest institution rather than the sum of all of them. A failing item is reported in
+        its entry of `items` without affecting the others.
+
+        Args:
+            access_tokens: Access tokens of the items to refresh
+            start_date: The start date for transactions (defaults to 30 days ago)
+            end_date: The end date for transactions (defaults to today)
+            include_transactions: Whether to fetch transactions in addition to balances
+            max_parallel: Maximum number of items refreshed at the same time
+            force_refresh: Bypass the response cache and fetch every item from Plaid
+
+        Returns:
+            A dictionary with the merged accounts and transactions of every successful item and a
+            per-item status list in the same order as access_tokens
+        """
+        slots = asyncio.Semaphore(max(max_parallel, 1))
+
+        async def refresh(index: int, access_token: str) -> Dict[str, Any]:
+            async with slots:
+                calls = [self.get_account_balances(access_token, force_refresh=force_refresh)]
+                if include_transactions:
+                    calls.append(self.get_transactions(access_token, start_date, end_date, force_refresh=force_refresh))
+                results = await asyncio.gather(*calls)
+
+            failed = next((result for result in results if 'error' in result), None)
+            if failed is not None:
+                return {'index': index, 'status': 'error', 'error': failed['error']}
+            balances = results[0]
+            item_id = (balances.get('item') or {}).get('item_id')
+            entry = {'index': index, 'status': 'ok', 'item_id': item_id, 'accounts': balances['accounts']}
+            if include_transactions:
+                entry['transactions'] = results[1]['transactions']
+            return entry
+
+        entries = await asyncio.gather(*(refresh(index, token) for index, token in enumerate(access_tokens)))
+
+        merged: Dict[str, Any] = {'accounts': [], 'items': []}
+        if include_transactions:
+            merged['transactions'] = []
+        for entry in entries:
+            if entry['status'] == 'ok':
+                for account in entry.pop('accounts'):
+                    merged['accounts'].append({**account, 'item_id': entry['item_id']})
+                if include_transactions:
+                    merged['transactions'].extend(entry.pop('transactions'))
+            merged['items'].append(entry)
+        return merged
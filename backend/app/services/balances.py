@@ -0,0 +1,158 @@
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import and_, bindparam, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.money import to_decimal
+from db.models import BankAccount, Transaction, TransactionRollup
+from services.job_queue import JobHandler
+from services.rollups import next_period_start
+
+RECONCILE_BALANCES_JOB = "accounts.reconcile_balances"
+
+def _counts_toward_balance(row: Dict[str, Any], opened: Optional[datetime.datetime]) -> bool:
+    return opened is None or row["date"] >= opened
+
+
+async def apply_balance_changes(db: AsyncSession, added: List[Dict[str, Any]], removed: List[Dict[str, Any]]) -> None:
+    """
+    Transaction writer hook: add the net change per account onto BankAccount.balance.
+
+    Each account gets a single `balance = balance + :delta` UPDATE, which takes the row lock
+    and increments atomically, so concurrent writers cannot lose each other's updates. Accounts
+    are updated in id order so two writers never wait on each other in opposite orders.
+    """
+    account_ids = {row["bank_account_id"] for row in added} | {row["bank_account_id"] for row in removed}
+    if not account_ids:
+        return
+    opened = dict((await db.execute(
+        select(BankAccount.id, BankAccount.opening_balance_at).where(BankAccount.id.in_(account_ids))
+    )).all())
+
+    deltas: Dict[Any, Decimal] = defaultdict(Decimal)
+    for sign, rows in ((1, added), (-1, removed)):
+        for row in rows:
+            if _counts_toward_balance(row, opened.get(row["bank_account_id"])):
+                deltas[row["bank_account_id"]] += sign * to_decimal(row["amount"])
+
+    params = [{"account_id": account_id, "delta": delta} for account_id, delta in sorted(deltas.items(), key=lambda item: str(item[0])) if delta]
+    if params:
+        table = BankAccount.__table__
+        await db.execute(
+            update(table).where(table.c.id == bindparam("account_id")).values(balance=table.c.balance + bindparam("delta")),
+            params,
+        )
+
+
+async def _raw_net(db: AsyncSession, account_id: Any, start: datetime.datetime, end: datetime.datetime) -> Decimal:
+    total = await db.scalar(
+        select(func.coalesce(func.sum(Transaction.amount), 0))
+        .where(Transaction.bank_account_id == account_id, Transaction.date >= start, Transaction.date < end)
+    )
+    return total
+
+
+def _midnight(day: datetime.date) -> datetime.datetime:
+    return datetime.datetime.combine(day, datetime.time())
+
+
+async def _rollup_net(db: AsyncSession, account: BankAccount, first_day: datetime.date, end_day: datetime.date) -> Decimal:
+    """Net amount over whole days [first_day, end_day): month rollups where a month fits, day rollups for the ends."""
+    months_from = first_day if first_day.day == 1 else next_period_start(first_day, "month")
+    months_to = end_day.replace(day=1)
+
+    def period_range(period: str, start: datetime.date, end: datetime.date):
+        return and_(TransactionRollup.period == period, TransactionRollup.period_start >= start, TransactionRollup.period_start < end)
+
+    if months_from < months_to:
+        ranges = or_(
+            period_range("day", first_day, months_from),
+            period_range("month", months_from, months_to),
+            period_range("day", months_to, end_day),
+        )
+    else:
+        ranges = period_range("day", first_day, end_day)
+    total = await db.scalar(
+        select(func.coalesce(func.sum(TransactionRollup.inflow - TransactionRollup.outflow), 0))
+        .where(TransactionRollup.user_id == account.user_id, TransactionRollup.bank_account_id == account.id, ranges)
+    )
+    return total
+
+
+async def net_between(db: AsyncSession, account: BankAccount, start: datetime.datetime, end: datetime.datetime) -> Decimal:
+    """
+    Net amount of the account's transactions dated in [start, end).
+
+    Whole days come from the rollups, so the cost is bounded by the number of months spanned
+    rather than the number of transactions; only partial days at either end hit the
+    transactions table.
+    """
+    if start >= end:
+        return Decimal(0)
+    first_day = start.date() if start == _midnight(start.date()) else start.date() + datetime.timedelta(days=1)
+    end_day = end.date()
+    if first_day >= end_day:
+        return await _raw_net(db, account.id, start, end)
+
+    total = await _rollup_net(db, account, first_day, end_day)
+    if start < _midnight(first_day):
+        total += await _raw_net(db, account.id, start, _midnight(first_day))
+    if end > _midnight(end_day):
+        total += await _raw_net(db, account.id, _midnight(end_day), end)
+    return total
+
+
+async def balance_as_of(db: AsyncSession, account: BankAccount, as_of: datetime.datetime) -> Decimal:
+    """The account balance counting every transaction dated before as_of."""
+    opened = account.opening_balance_at or datetime.datetime.min
+    opening = to_decimal(account.opening_balance)
+    if as_of >= opened:
+        return opening + await net_between(db, account, opened, as_of)
+    return opening - await net_between(db, account, as_of, opened)
+
+
+async def expected_balance(db: AsyncSession, account: BankAccount) -> Decimal:
+    """Recompute the current balance from the transactions table alone."""
+    stmt = select(func.coalesce(func.sum(Transaction.amount), 0)).where(Transaction.bank_account_id == account.id)
+    if account.opening_balance_at is not None:
+        stmt = stmt.where(Transaction.date >= account.opening_balance_at)
+    return to_decimal(account.opening_balance) + await db.scalar(stmt)
+
+
+async def reconcile_balances(db: AsyncSession, repair: bool = False, account_ids: Optional[Sequence[UUID]] = None) -> List[Dict[str, Any]]:
+    """
+    Compare every maintained balance with one recomputed from transactions.
+
+    Each account is checked under a row lock (FOR UPDATE on PostgreSQL), so a writer's
+    increment either lands before the recomputation sees its rows or waits until the check
+    is done, and committed per account to keep the locks short.
+
+    Returns:
+        One entry per account whose balance had drifted
+    """
+    ids_query = select(BankAccount.id).order_by(BankAccount.id)
+    if account_ids is not None:
+        ids_query = ids_query.where(BankAccount.id.in_(account_ids))
+    drifted = []
+    for account_id in (await db.scalars(ids_query)).all():
+        account = await db.scalar(
+            select(BankAccount).where(BankAccount.id == account_id).with_for_update().execution_options(populate_existing=True)
+        )
+        expected = await expected_balance(db, account)
+        if account.balance != expected:
+            drifted.append({"bank_account_id": account.id, "stored": account.balance, "expected": expected})
+            if repair:
+                account.balance = expected
+        await db.commit()
+    return drifted
+
+
+def balance_job_handlers() -> Dict[str, JobHandler]:
+    async def handle_reconcile(db: AsyncSession, payload: Dict[str, Any]) -> None:
+        await reconcile_balances(db, repair=payload.get("repair", False))
+
+    return {RECONCILE_BALANCES_JOB: handle_reconcile}
@@ -0,0 +1,350 @@
+"""
+Monthly budgets.
+
+Each budget's spending per calendar month is a counter row in budget_spend. The transaction
+writer adds every matching payment onto its month's counter in the same database transaction,
+with one upsert per write however long the history is, so a budget's status is a primary key
+lookup rather than a SUM over transactions. A write that carries the current month past one of
+the budget's alert_percents queues an alert job in that same transaction.
+
+Counters only ever change by the amounts written through the transaction writer; the checker
+recomputes them from the transactions table and can repair any that drifted.
+"""
+import calendar
+import datetime
+import logging
+import re
+from collections import defaultdict
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+import httpx
+from sqlalchemy import BigInteger, and_, bindparam, select, type_coerce, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import BUDGET_ALERT_WEBHOOK_URL, BUDGET_HISTORY_MONTHS
+from app.core.money import from_minor, to_decimal, to_minor
+from db.models import Budget, BudgetSpend, Transaction
+from services.categorization import compile_regex_rule
+from services.job_queue import JobHandler, PermanentJobError, enqueue
+from services.merchants import normalize_description
+from services.rollups import dialect_insert, period_start
+
+logger = logging.getLogger(__name__)
+
+BUDGET_ALERT_JOB = "budgets.alert"
+CHECK_BUDGETS_JOB = "budgets.check"
+
+# (budget id, first day of the month) -> [spent in minor units, transaction count]
+SpendCounters = Dict[Tuple[Any, datetime.date], List[int]]
+
+
+class BudgetScope:
+    """One budget's limit and the test for which payments count toward it."""
+
+    def __init__(self, budget_id: Any, user_id: Any, name: str, amount: Any, bank_account_id: Any = None,
+                 category: Optional[str] = None, pattern: Optional[str] = None, is_regex: bool = False,
+                 alert_percents: Sequence[int] = ()):
+        self.budget_id = budget_id
+        self.user_id = user_id
+        self.name = name
+        self.amount = to_decimal(amount)
+        self.bank_account_id = bank_account_id
+        self.category = category
+        self.alert_percents = sorted(alert_percents)
+        self._is_regex = bool(pattern) and is_regex
+        if not pattern:
+            self._pattern = None
+        elif is_regex:
+            # Searched in the raw description, ignoring case, as regex category rules are
+            self._pattern = compile_regex_rule(pattern)
+        else:
+            # Keywords match whole words of the normalized description, as category rules do
+            self._pattern = re.compile(rf"\b{re.escape(normalize_description(pattern))}\b")
+
+    def matches(self, row: Dict[str, Any]) -> bool:
+        if self.bank_account_id is not None and row["bank_account_id"] != self.bank_account_id:
+            return False
+        if self.category is not None and row.get("category") != self.category:
+            return False
+        if self._pattern is not None:
+            if self._is_regex:
+                text = row["description"]
+            else:
+                text = row.get("search_text") or normalize_description(row["description"])
+            if not self._pattern.search(text):
+                return False
+        return True
+
+    def reached_percent(self, spent: Any) -> int:
+        """The highest of alert_percents that spent has reached, or 0."""
+        spent = to_decimal(spent)
+        reached = [percent for percent in self.alert_percents if self.amount > 0 and spent * 100 >= self.amount * percent]
+        return reached[-1] if reached else 0
+
+
+def month_start(value: datetime.date) -> datetime.date:
+    return period_start(value, "month")
+
+
+def _months_before(month: datetime.date, count: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 - count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def history_start(months: int = BUDGET_HISTORY_MONTHS, today: Optional[datetime.date] = None) -> datetime.date:
+    """First day of the oldest of the last months calendar months, this one included."""
+    return _months_before(month_start(today or datetime.datetime.utcnow().date()), months - 1)
+
+
+def _scope(row: Any) -> BudgetScope:
+    return BudgetScope(row.id, row.user_id, row.name, row.amount, row.bank_account_id, row.category, row.pattern,
+                       row.is_regex, row.alert_percents or ())
+
+
+async def load_budget_scopes(db: AsyncSession, user_ids: Iterable[Any]) -> Dict[Any, List[BudgetScope]]:
+    """Every budget of the given users, by user."""
+    result = await db.execute(
+        select(Budget.id, Budget.user_id, Budget.name, Budget.amount, Budget.bank_account_id, Budget.category,
+               Budget.pattern, Budget.is_regex, Budget.alert_percents)
+        .where(Budget.user_id.in_(list(user_ids)))
+    )
+    scopes: Dict[Any, List[BudgetScope]] = defaultdict(list)
+    for row in result:
+        scopes[row.user_id].append(_scope(row))
+    return scopes
+
+
+def count_spend(counters: SpendCounters, scopes: Dict[Any, List[BudgetScope]], rows: Iterable[Dict[str, Any]], sign: int = 1) -> None:
+    """Add (or with sign=-1, take away) each outgoing payment in rows onto the counters of the budgets it matches."""
+    for row in rows:
+        minor = to_minor(row["amount"])
+        if minor >= 0:
+            continue
+        for scope in scopes.get(row["user_id"], ()):
+            if scope.matches(row):
+                counter = counters.setdefault((scope.budget_id, month_start(row["date"])), [0, 0])
+                counter[0] -= sign * minor
+                counter[1] += sign
+
+
+async def apply_budget_changes(db: AsyncSession, added: List[Dict[str, Any]], removed: List[Dict[str, Any]]) -> None:
+    """
+    Transaction writer hook: move removed payments out of, and added payments into, their budgets' counters.
+
+    All counter changes go out as a single upsert executemany that increments in place, sorted
+    so concurrent writers lock counter rows in the same order. The upsert returns the new totals,
+    which is all that is needed to tell whether an alert threshold was just crossed.
+    """
+    user_ids = {row["user_id"] for rows in (added, removed) for row in rows if to_minor(row["amount"]) < 0}
+    if not user_ids:
+        return
+    scopes = await load_budget_scopes(db, user_ids)
+    if not scopes:
+        return
+    counters: SpendCounters = {}
+    count_spend(counters, scopes, added)
+    count_spend(counters, scopes, removed, sign=-1)
+    params = [
+        {"budget_id": budget_id, "month": month, "spent": from_minor(spent), "transaction_count": count, "alerted_percent": 0}
+        for (budget_id, month), (spent, count) in sorted(counters.items(), key=lambda item: str(item[0]))
+        if spent or count
+    ]
+    if not params:
+        return
+
+    table = BudgetSpend.__table__
+    stmt = dialect_insert(db)(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["budget_id", "month"],
+        set_={
+            "spent": table.c.spent + stmt.excluded.spent,
+            "transaction_count": table.c.transaction_count + stmt.excluded.transaction_count,
+        },
+    ).returning(table.c.budget_id, table.c.month, table.c.spent, table.c.alerted_percent)
+    totals = (await db.execute(stmt, params)).all()
+
+    # Only the month in progress alerts; backdated imports into earlier months stay quiet
+    this_month = month_start(datetime.datetime.utcnow().date())
+    budgets = {scope.budget_id: scope for user_scopes in scopes.values() for scope in user_scopes}
+    alerts = []
+    for budget_id, month, spent, alerted_percent in totals:
+        if month != this_month:
+            continue
+        budget = budgets[budget_id]
+        percent = budget.reached_percent(spent)
+        if percent > alerted_percent:
+            alerts.append((budget, month, spent, percent))
+    if not alerts:
+        return
+    # The upsert holds these rows' locks until commit, so no other writer can queue the same alert
+    await db.execute(
+        update(table)
+        .where(table.c.budget_id == bindparam("alert_budget_id"), table.c.month == bindparam("alert_month"))
+        .values(alerted_percent=bindparam("percent")),
+        [{"alert_budget_id": budget.budget_id, "alert_month": month, "percent": percent} for budget, month, _, percent in alerts],
+    )
+    for budget, month, spent, percent in alerts:
+        await enqueue(db, BUDGET_ALERT_JOB, {
+            "budget_id": str(budget.budget_id),
+            "user_id": str(budget.user_id),
+            "name": budget.name,
+            "month": month.isoformat(),
+            "percent": percent,
+            "spent": str(spent),
+            "amount": str(budget.amount),
+        }, dedup_key=f"budget-alert:{budget.budget_id}:{month.isoformat()}:{percent}")
+
+
+async def recompute_budget_spend(db: AsyncSession, user_id: Any, scopes: Sequence[BudgetScope], since: datetime.date) -> SpendCounters:
+    """Counters for the given budgets of one user from the transactions table, for months from since."""
+    counters: SpendCounters = {}
+    if not scopes:
+        return counters
+    stmt = (
+        select(Transaction.user_id, Transaction.bank_account_id, Transaction.description, Transaction.search_text,
+               Transaction.category, Transaction.date, type_coerce(Transaction.amount, BigInteger).label("minor"))
+        .where(Transaction.user_id == user_id, Transaction.amount < 0,
+               Transaction.date >= datetime.datetime.combine(since, datetime.time()))
+    )
+    account_ids = {scope.bank_account_id for scope in scopes}
+    if None not in account_ids:
+        stmt = stmt.where(Transaction.bank_account_id.in_(account_ids))
+    rows = ({**row._mapping, "amount": from_minor(row.minor)} for row in await db.execute(stmt))
+    count_spend(counters, {user_id: list(scopes)}, rows)
+    return counters
+
+
+async def fill_budget_spend(db: AsyncSession, scope: BudgetScope, months: int = BUDGET_HISTORY_MONTHS) -> None:
+    """
+    Write a new budget's counters for its last months of history; the caller commits.
+
+    Thresholds already reached count as alerted, so creating a budget never alerts by itself.
+    Payments written between this scan and the commit can be missed; check_budget_spend finds them.
+    """
+    counters = await recompute_budget_spend(db, scope.user_id, [scope], history_start(months))
+    rows = [
+        {"budget_id": budget_id, "month": month, "spent": from_minor(spent), "transaction_count": count,
+         "alerted_percent": scope.reached_percent(from_minor(spent))}
+        for (budget_id, month), (spent, count) in sorted(counters.items(), key=lambda item: str(item[0]))
+    ]
+    if rows:
+        await db.execute(BudgetSpend.__table__.insert(), rows)
+
+
+def _status_values(budget: Budget, spend: Optional[BudgetSpend], month: datetime.date, today: datetime.date) -> Dict[str, Any]:
+    spent = spend.spent if spend is not None else Decimal(0)
+    days_in_month = calendar.monthrange(month.year, month.month)[1]
+    if month > today:
+        elapsed = 0
+    elif month == month_start(today):
+        elapsed = today.day
+    else:
+        elapsed = days_in_month
+    burn_rate = (spent / elapsed).quantize(Decimal("0.01")) if elapsed else Decimal(0)
+    projected = spent if elapsed == days_in_month else max(spent, burn_rate * days_in_month)
+    amount = to_decimal(budget.amount)
+    return {
+        "month": month,
+        "spent": spent,
+        "transaction_count": spend.transaction_count if spend is not None else 0,
+        "remaining": amount - spent,
+        "percent_used": float(spent * 100 / amount) if amount else 0.0,
+        "daily_burn_rate": burn_rate,
+        "projected_spend": projected,
+        "days_left": days_in_month - elapsed,
+    }
+
+
+async def budget_statuses(db: AsyncSession, user_id: Any, month: Optional[datetime.date] = None,
+                          budget_id: Optional[Any] = None) -> List[Tuple[Budget, Dict[str, Any]]]:
+    """
+    The user's budgets with their spending in month (default: the current one), read from the counters.
+
+    Returns:
+        (budget, status values) per budget, oldest budget first
+    """
+    today = datetime.datetime.utcnow().date()
+    month = month_start(month or today)
+    stmt = (
+        select(Budget, BudgetSpend)
+        .outerjoin(BudgetSpend, and_(BudgetSpend.budget_id == Budget.id, BudgetSpend.month == month))
+        .where(Budget.user_id == user_id)
+        .order_by(Budget.created_at, Budget.id)
+        # Counters change underneath the ORM, through the writer's upserts
+        .execution_options(populate_existing=True)
+    )
+    if budget_id is not None:
+        stmt = stmt.where(Budget.id == budget_id)
+    return [(budget, _status_values(budget, spend, month, today)) for budget, spend in (await db.execute(stmt)).all()]
+
+
+async def check_budget_spend(db: AsyncSession, repair: bool = False, user_ids: Optional[Sequence[UUID]] = None,
+                             months: int = BUDGET_HISTORY_MONTHS) -> List[Dict[str, Any]]:
+    """
+    Compare every budget counter of the last months with one recomputed from transactions.
+
+    Each user is checked and, with repair, fixed and committed on its own. Writes that commit
+    while a user is being checked can be reported as drift; run it again to confirm.
+
+    Returns:
+        One entry per counter that had drifted
+    """
+    if user_ids is None:
+        user_ids = list(await db.scalars(select(Budget.user_id).distinct()))
+    since = history_start(months)
+    table = BudgetSpend.__table__
+    drifted = []
+    for user_id in user_ids:
+        scopes = (await load_budget_scopes(db, [user_id])).get(user_id, [])
+        if not scopes:
+            continue
+        expected = await recompute_budget_spend(db, user_id, scopes, since)
+        stored = {
+            (row.budget_id, row.month): (row.spent, row.transaction_count)
+            for row in await db.execute(
+                select(table.c.budget_id, table.c.month, type_coerce(table.c.spent, BigInteger).label("spent"), table.c.transaction_count)
+                .where(table.c.budget_id.in_([scope.budget_id for scope in scopes]), table.c.month >= since)
+            )
+        }
+        user_drift = []
+        for key in sorted(set(stored) | set(expected), key=str):
+            stored_spent, stored_count = stored.get(key, (0, 0))
+            expected_spent, expected_count = expected.get(key, (0, 0))
+            if (stored_spent, stored_count) != (expected_spent, expected_count):
+                user_drift.append({"budget_id": key[0], "month": key[1], "stored": from_minor(stored_spent),
+                                   "expected": from_minor(expected_spent), "transaction_count": expected_count})
+        drifted.extend(user_drift)
+        if repair and user_drift:
+            stmt = dialect_insert(db)(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["budget_id", "month"],
+                set_={"spent": stmt.excluded.spent, "transaction_count": stmt.excluded.transaction_count},
+            )
+            await db.execute(stmt, [
+                {"budget_id": entry["budget_id"], "month": entry["month"], "spent": entry["expected"],
+                 "transaction_count": entry["transaction_count"], "alerted_percent": 0}
+                for entry in user_drift
+            ])
+        await db.commit()
+    return drifted
+
+
+def budget_job_handlers() -> Dict[str, JobHandler]:
+    async def handle_alert(db: AsyncSession, payload: Dict[str, Any]) -> None:
+        if "budget_id" not in payload:
+            raise PermanentJobError(f"Bad budget alert payload: {payload!r}")
+        if await db.scalar(select(Budget.id).where(Budget.id == UUID(payload["budget_id"]))) is None:
+            return  # Deleted since
+        logger.info("Budget %s (%s) reached %s%% of %s for %s", payload["name"], payload["budget_id"],
+                    payload["percent"], payload["amount"], payload["month"])
+        if BUDGET_ALERT_WEBHOOK_URL:
+            async with httpx.AsyncClient(timeout=10) as client:
+                response = await client.post(BUDGET_ALERT_WEBHOOK_URL, json=payload)
+                response.raise_for_status()
+
+    async def handle_check(db: AsyncSession, payload: Dict[str, Any]) -> None:
+        await check_budget_spend(db, repair=payload.get("repair", False))
+
+    return {BUDGET_ALERT_JOB: handle_alert, CHECK_BUDGETS_JOB: handle_check}
@@ -0,0 +1,488 @@
+"""
+Transaction categorization.
+
+A transaction's category comes from, in order of precedence: the category it was written with,
+the user's own rules, the category Plaid suggested, the built-in keyword rules, and finally (when
+CATEGORY_CLASSIFIER_ENABLED) a naive Bayes classifier trained on the user's categorized history.
+
+All keyword rules are compiled into one trie-shaped regular expression and all regex rules into a
+single alternation, so matching a description costs one or two scans however many rules there
+are. Keywords are matched against the normalized description and regex rules against the
+description as written, ignoring case; each distinct description is categorized once per batch,
+which keeps a write of tens of thousands of rows to a few tens of milliseconds.
+"""
+import re
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import TTLCache
+from app.core.config import (
+    CATEGORY_CLASSIFIER_ENABLED,
+    CATEGORY_CLASSIFIER_MAX_EXAMPLES,
+    CATEGORY_CLASSIFIER_MIN_CONFIDENCE,
+    CATEGORY_RULES_CACHE_MAX_USERS,
+    CATEGORY_RULES_CACHE_TTL_SECONDS,
+    RECATEGORIZE_BATCH_SIZE,
+)
+from db.models import CategoryRule, Transaction
+from services.job_queue import JobHandler, PermanentJobError
+from services.merchants import normalize_description
+
+RECATEGORIZE_JOB = "transactions.recategorize"
+
+# Values of Transaction.category_source
+USER_SOURCE = "user"
+RULE_SOURCE = "rule"
+PLAID_SOURCE = "plaid"
+CLASSIFIER_SOURCE = "classifier"
+
+# Plaid's personal_finance_category.primary, and the first level of its legacy category list
+PLAID_CATEGORIES = {
+    "INCOME": "income",
+    "TRANSFER_IN": "transfer",
+    "TRANSFER_OUT": "transfer",
+    "LOAN_PAYMENTS": "loans",
+    "BANK_FEES": "fees",
+    "ENTERTAINMENT": "entertainment",
+    "FOOD_AND_DRINK": "dining",
+    "GENERAL_MERCHANDISE": "shopping",
+    "HOME_IMPROVEMENT": "home",
+    "MEDICAL": "health",
+    "PERSONAL_CARE": "personal care",
+    "GENERAL_SERVICES": "services",
+    "GOVERNMENT_AND_NON_PROFIT": "government",
+    "TRANSPORTATION": "transportation",
+    "TRAVEL": "travel",
+    "RENT_AND_UTILITIES": "utilities",
+}
+PLAID_LEGACY_CATEGORIES = {
+    "Bank Fees": "fees",
+    "Community": "services",
+    "Food and Drink": "dining",
+    "Healthcare": "health",
+    "Interest": "income",
+    "Payment": "loans",
+    "Recreation": "entertainment",
+    "Service": "services",
+    "Shops": "shopping",
+    "Tax": "government",
+    "Transfer": "transfer",
+    "Travel": "travel",
+}
+
+
+class Rule(NamedTuple):
+    pattern: str
+    category: str
+    is_regex: bool = False
+    priority: int = 0
+    user_defined: bool = True
+
+
+BUILTIN_RULES: List[Rule] = [
+    Rule(keyword, category, user_defined=False)
+    for category, keywords in {
+        "groceries": ["grocery", "supermarket", "safeway", "loblaws", "whole foods", "trader joe's", "costco", "sobeys", "metro", "kroger"],
+        "dining": ["restaurant", "cafe", "coffee", "starbucks", "tim hortons", "mcdonald's", "doordash", "uber eats", "skip the dishes", "pizza"],
+        "transportation": ["uber", "lyft", "taxi", "transit", "parking", "shell", "esso", "petro canada", "chevron", "gas station"],
+        "utilities": ["hydro", "electric", "water bill", "internet", "rogers", "bell canada", "verizon", "comcast", "telus"],
+        "entertainment": ["netflix", "spotify", "disney", "cinema", "theatre", "steam", "playstation"],
+        "shopping": ["amazon", "walmart", "target", "best buy", "ikea", "canadian tire", "etsy"],
+        "health": ["pharmacy", "shoppers drug mart", "dental", "clinic", "cvs", "walgreens"],
+        "travel": ["airbnb", "hotel", "expedia", "air canada", "westjet", "airlines"],
+        "income": ["payroll", "salary", "direct deposit"],
+        "fees": ["overdraft", "service charge", "atm fee", "interest charge"],
+        "transfer": ["e transfer", "transfer"],
+    }.items()
+    for keyword in keywords
+]
+
+
+def plaid_category_hint(plaid_transaction: Dict[str, Any]) -> Optional[str]:
+    """Our category for the one Plaid suggests for a transaction, if it maps onto one."""
+    primary = (plaid_transaction.get("personal_finance_category") or {}).get("primary")
+    if primary in PLAID_CATEGORIES:
+        return PLAID_CATEGORIES[primary]
+    legacy = plaid_transaction.get("category") or []
+    return PLAID_LEGACY_CATEGORIES.get(legacy[0]) if legacy else None
+
+
+# Regex rules (and budget patterns) run on every transaction written, so they are kept short and
+# free of the nested or ambiguous repetition that makes backtracking exponential
+REGEX_RULE_FLAGS = re.IGNORECASE
+REGEX_RULE_MAX_LENGTH = 200
+
+_REPEATS = {sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, "POSSESSIVE_REPEAT", sre_parse.MAX_REPEAT)}
+
+
+def _first_literal(branch: Any) -> Optional[int]:
+    """The character a branch must start with, if it is a literal one."""
+    items = list(branch)
+    while items:
+        op, av = items[0]
+        if op is sre_parse.LITERAL:
+            return ord(chr(av).lower())
+        if op is sre_parse.SUBPATTERN:
+            items = list(av[-1]) + items[1:]
+        else:
+            return None
+    return None
+
+
+def _check_backtracking(parsed: Any, repeated: bool = False) -> None:
+    """Raise ValueError for a quantifier inside a repeated group, or a repeated alternation whose branches can start alike."""
+    for op, av in parsed:
+        if op in _REPEATS:
+            low, high, body = av
+            if repeated and low != high:
+                raise ValueError("Nested quantifiers are not supported")
+            _check_backtracking(body, repeated or high > 1)
+        elif op is sre_parse.BRANCH:
+            branches = av[1]
+            if repeated:
+                firsts = [_first_literal(branch) for branch in branches]
+                if None in firsts or len(set(firsts)) < len(firsts):
+                    raise ValueError("Alternatives inside a repeated group must start with different characters")
+            for branch in branches:
+                _check_backtracking(branch, repeated)
+        elif op is sre_parse.SUBPATTERN:
+            _check_backtracking(av[-1], repeated)
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            _check_backtracking(av[1], repeated)
+        elif op is getattr(sre_parse, "ATOMIC_GROUP", None):
+            _check_backtracking(av, repeated)
+
+
+def compile_regex_rule(pattern: str) -> "re.Pattern[str]":
+    """A regex rule or budget pattern compiled as it is matched: against the raw description, ignoring case."""
+    return re.compile(pattern, REGEX_RULE_FLAGS)
+
+
+def validate_rule(pattern: str, is_regex: bool) -> None:
+    """
+    Raise ValueError for a pattern that cannot be combined with the others, or could take too long to match.
+
+    Regex rules are embedded as one group of a larger pattern, so they may not carry their own
+    named groups, backreferences or global flags, and may not match the empty string.
+    """
+    if not is_regex:
+        if not normalize_description(pattern):
+            raise ValueError("Keyword has no letters or digits")
+        return
+    if len(pattern) > REGEX_RULE_MAX_LENGTH:
+        raise ValueError(f"Regular expression is longer than {REGEX_RULE_MAX_LENGTH} characters")
+    try:
+        compiled = compile_regex_rule(pattern)
+    except re.error as e:
+        raise ValueError(f"Invalid regular expression: {e}") from e
+    if compiled.groupindex or re.search(r"\\\d|\(\?P=", pattern):
+        raise ValueError("Named groups and backreferences are not supported")
+    parsed = sre_parse.parse(pattern)
+    if parsed.state.flags != sre_parse.parse("").state.flags:
+        raise ValueError("Global inline flags are not supported")
+    if compiled.fullmatch(""):
+        raise ValueError("Pattern matches an empty description")
+    _check_backtracking(parsed)
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    """One pattern matching any of words, with shared prefixes factored out and longer words preferred."""
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def render(node: Dict[str, Any]) -> str:
+        branches = [re.escape(char) + render(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            return (body if len(branches) > 1 else f"(?:{body})") + "?"
+        return body
+
+    return render(trie)
+
+
+class RuleMatcher:
+    """
+    The best matching rule for a description.
+
+    Keywords match whole words of the normalized description; regex rules are searched in the
+    raw description, ignoring case. When several rules match, a user's rule beats a built-in one,
+    then the higher priority wins, then the rule listed first.
+    """
+
+    def __init__(self, rules: Sequence[Rule]):
+        ranked = sorted(enumerate(rules), key=lambda item: (not item[1].user_defined, -item[1].priority, item[0]))
+        self._rank = {id(rule): position for position, (_, rule) in enumerate(ranked)}
+
+        self._keywords: Dict[str, Rule] = {}
+        regex_rules: List[Rule] = []
+        for _, rule in ranked:
+            if rule.is_regex:
+                regex_rules.append(rule)
+            else:
+                # Ranked best first, so the first rule for a keyword is the one that counts
+                self._keywords.setdefault(normalize_description(rule.pattern), rule)
+        self._keywords.pop("", None)
+
+        # Lookaheads consume nothing, so one scan sees every rule matching at every position,
+        # overlapping matches included
+        self._keyword_pattern = re.compile(rf"\b(?=({_trie_regex(self._keywords)})\b)") if self._keywords else None
+        # Best-ranked first, so where several regex rules match at one spot the best one is taken
+        self._regex_rules = regex_rules
+        self._regex_pattern = (
+            re.compile("|".join(f"(?=(?P<r{index}>{rule.pattern}))" for index, rule in enumerate(regex_rules)), REGEX_RULE_FLAGS)
+            if regex_rules else None
+        )
+
+    @property
+    def has_regex_rules(self) -> bool:
+        return self._regex_pattern is not None
+
+    def match(self, normalized: str, description: str) -> Optional[Rule]:
+        best: Optional[Rule] = None
+        if self._keyword_pattern is not None:
+            for found in self._keyword_pattern.finditer(normalized):
+                keyword = found.group(1)
+                best = self._better(best, self._keywords[keyword])
+                # The trie prefers the longest keyword; shorter ones it contains ("uber" in "uber eats") match too
+                for end, char in enumerate(keyword):
+                    if not char.isalnum() and keyword[:end] in self._keywords:
+                        best = self._better(best, self._keywords[keyword[:end]])
+        if self._regex_pattern is not None:
+            for found in self._regex_pattern.finditer(description):
+                best = self._better(best, self._regex_rules[int(found.lastgroup[1:])])
+        return best
+
+    def _better(self, current: Optional[Rule], candidate: Rule) -> Rule:
+        if current is None or self._rank[id(candidate)] < self._rank[id(current)]:
+            return candidate
+        return current
+
+
+class NaiveBayesClassifier:
+    """Multinomial naive Bayes over the words of normalized descriptions."""
+
+    def __init__(self, vocabulary: Dict[str, int], categories: List[str], log_prior: np.ndarray, log_likelihood: np.ndarray,
+                 min_confidence: float = CATEGORY_CLASSIFIER_MIN_CONFIDENCE):
+        self.vocabulary = vocabulary
+        self.categories = categories
+        self.log_prior = log_prior
+        self.log_likelihood = log_likelihood  # categories x vocabulary
+        self.min_confidence = min_confidence
+
+    @classmethod
+    def train(cls, texts: Sequence[str], labels: Sequence[str], alpha: float = 1.0,
+              min_confidence: float = CATEGORY_CLASSIFIER_MIN_CONFIDENCE) -> Optional["NaiveBayesClassifier"]:
+        """Fit on normalized descriptions and their categories; None without at least two categories to tell apart."""
+        categories = sorted(set(labels))
+        if len(categories) < 2:
+            return None
+        category_index = {category: index for index, category in enumerate(categories)}
+        vocabulary: Dict[str, int] = {}
+        rows: List[int] = []
+        columns: List[int] = []
+        for text, label in zip(texts, labels):
+            for word in text.split():
+                rows.append(category_index[label])
+                columns.append(vocabulary.setdefault(word, len(vocabulary)))
+
+        counts = np.zeros((len(categories), len(vocabulary)), dtype=np.float64)
+        np.add.at(counts, (np.array(rows, dtype=np.intp), np.array(columns, dtype=np.intp)), 1)
+        smoothed = counts + alpha
+        log_likelihood = np.log(smoothed) - np.log(smoothed.sum(axis=1, keepdims=True))
+        priors = np.bincount([category_index[label] for label in labels], minlength=len(categories))
+        return cls(vocabulary, categories, np.log(priors / priors.sum()), log_likelihood, min_confidence)
+
+    def predict(self, texts: Sequence[str]) -> List[Optional[str]]:
+        """The most likely category of each text, or None when no known word appears or the best guess is not confident enough."""
+        predictions: List[Optional[str]] = []
+        for text in texts:
+            words = [self.vocabulary[word] for word in text.split() if word in self.vocabulary]
+            if not words:
+                predictions.append(None)
+                continue
+            scores = self.log_prior + self.log_likelihood[:, words].sum(axis=1)
+            probabilities = np.exp(scores - scores.max())
+            probabilities /= probabilities.sum()
+            best = int(probabilities.argmax())
+            predictions.append(self.categories[best] if probabilities[best] >= self.min_confidence else None)
+        return predictions
+
+
+class Categorizer:
+    """One user's rules (plus the built-in ones) and classifier, ready to categorize batches."""
+
+    def __init__(self, rules: Sequence[Rule] = (), classifier: Optional[NaiveBayesClassifier] = None):
+        self.matcher = RuleMatcher([*rules, *BUILTIN_RULES])
+        self.classifier = classifier
+
+    def categorize(self, descriptions: Sequence[str], hints: Optional[Sequence[Optional[str]]] = None) -> List[Tuple[Optional[str], Optional[str]]]:
+        """
+        Categorize descriptions, with Plaid's suggestion for each where there is one.
+
+        Returns:
+            (category, category_source) per description; (None, None) when nothing matched
+        """
+        hints = hints if hints is not None else [None] * len(descriptions)
+        decided: Dict[Tuple[str, Optional[str]], Tuple[Optional[str], Optional[str]]] = {}
+        unmatched: Dict[str, List[Tuple[str, Optional[str]]]] = defaultdict(list)
+        normalized: Dict[str, str] = {}
+        keys: List[Tuple[str, Optional[str]]] = []
+        # Without regex rules, descriptions that normalize alike are decided alike
+        by_raw = self.matcher.has_regex_rules
+        for description, hint in zip(descriptions, hints):
+            if description not in normalized:
+                normalized[description] = normalize_description(description)
+            text = normalized[description]
+            key = (description if by_raw else text, hint)
+            keys.append(key)
+            if key in decided:
+                continue
+            rule = self.matcher.match(text, description)
+            if rule is not None and rule.user_defined:
+                decided[key] = (rule.category, RULE_SOURCE)
+            elif hint:
+                decided[key] = (hint, PLAID_SOURCE)
+            elif rule is not None:
+                decided[key] = (rule.category, RULE_SOURCE)
+            else:
+                decided[key] = (None, None)
+                unmatched[text].append(key)
+
+        if self.classifier is not None and unmatched:
+            texts = list(unmatched)
+            for text, category in zip(texts, self.classifier.predict(texts)):
+                if category is not None:
+                    for key in unmatched[text]:
+                        decided[key] = (category, CLASSIFIER_SOURCE)
+        return [decided[key] for key in keys]
+
+
+_categorizers = TTLCache(maxsize=CATEGORY_RULES_CACHE_MAX_USERS, ttl=CATEGORY_RULES_CACHE_TTL_SECONDS)
+
+
+async def _load_categorizer(db: AsyncSession, user_id: Any) -> Categorizer:
+    result = await db.execute(
+        select(CategoryRule.pattern, CategoryRule.category, CategoryRule.is_regex, CategoryRule.priority)
+        .where(CategoryRule.user_id == user_id)
+        .order_by(CategoryRule.created_at, CategoryRule.id)
+    )
+    rules = [Rule(pattern, category, is_regex, priority) for pattern, category, is_regex, priority in result]
+    classifier = None
+    if CATEGORY_CLASSIFIER_ENABLED:
+        # Learn only from categories a person or a rule chose, never from earlier guesses
+        examples = (await db.execute(
+            select(Transaction.description, Transaction.category)
+            .where(Transaction.user_id == user_id, Transaction.category.is_not(None), Transaction.category_source != CLASSIFIER_SOURCE)
+            .order_by(Transaction.date.desc())
+            .limit(CATEGORY_CLASSIFIER_MAX_EXAMPLES)
+        )).all()
+        classifier = NaiveBayesClassifier.train([normalize_description(description) for description, _ in examples],
+                                                [category for _, category in examples])
+    return Categorizer(rules, classifier)
+
+
+async def categorizer_for(db: AsyncSession, user_id: Any) -> Categorizer:
+    """The user's categorizer, compiled at most once per CATEGORY_RULES_CACHE_TTL_SECONDS."""
+    categorizer = _categorizers.get(user_id)
+    if categorizer is None:
+        categorizer = await _load_categorizer(db, user_id)
+        _categorizers.set(user_id, categorizer)
+    return categorizer
+
+
+def invalidate_categorizer(user_id: Any) -> None:
+    """Drop the cached categorizer after the user's rules change."""
+    _categorizers.pop(user_id)
+
+
+async def assign_categories(db: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+    """
+    Set category and category_source on new transaction rows, in place.
+
+    A row written with a category keeps it as the user's choice. Plaid's suggestion travels in
+    an optional "category_hint" key, which is removed since it is not a column.
+    """
+    pending: Dict[Any, List[Dict[str, Any]]] = defaultdict(list)
+    for row in rows:
+        if row.get("category"):
+            row["category_source"] = row.get("category_source") or USER_SOURCE
+        else:
+            row["category"] = row["category_source"] = None
+            pending[row["user_id"]].append(row)
+    for user_id, user_rows in pending.items():
+        categorizer = await categorizer_for(db, user_id)
+        results = categorizer.categorize([row["description"] for row in user_rows], [row.pop("category_hint", None) for row in user_rows])
+        for row, (category, source) in zip(user_rows, results):
+            row["category"], row["category_source"] = category, source
+    for row in rows:
+        row.pop("category_hint", None)
+
+
+async def recategorize_transactions(db: AsyncSession, user_id: UUID, batch_size: int = RECATEGORIZE_BATCH_SIZE) -> int:
+    """
+    Re-run categorization over a user's whole history, e.g. after their rules changed.
+
+    Categories the user set by hand are left alone; a category Plaid suggested is offered to the
+    categorizer again as the hint. Each batch is written through the transaction writer and
+    committed on its own, so a long history makes steady progress.
+
+    Returns:
+        Number of transactions whose category changed
+    """
+    from services.transaction_writer import update_transactions  # the writer imports this module
+
+    invalidate_categorizer(user_id)
+    categorizer = await categorizer_for(db, user_id)
+    changed = 0
+    last_id = None
+    while True:
+        stmt = (
+            select(Transaction.id, Transaction.description, Transaction.category, Transaction.category_source)
+            .where(Transaction.user_id == user_id, or_(Transaction.category_source.is_(None), Transaction.category_source != USER_SOURCE))
+            .order_by(Transaction.id)
+            .limit(batch_size)
+        )
+        if last_id is not None:
+            stmt = stmt.where(Transaction.id > last_id)
+        batch = (await db.execute(stmt)).all()
+        if not batch:
+            return changed
+        last_id = batch[-1].id
+
+        hints = [row.category if row.category_source == PLAID_SOURCE else None for row in batch]
+        results = categorizer.categorize([row.description for row in batch], hints)
+        updates = [
+            {"id": row.id, "category": category, "category_source": source}
+            for row, (category, source) in zip(batch, results)
+            if (category, source) != (row.category, row.category_source)
+        ]
+        if updates:
+            await update_transactions(db, updates)
+        await db.commit()
+        changed += len(updates)
+
+
+def categorization_job_handlers() -> Dict[str, JobHandler]:
+    async def handle_recategorize(db: AsyncSession, payload: Dict[str, Any]) -> None:
+        try:
+            user_id = UUID(payload["user_id"])
+        except (KeyError, ValueError) as e:
+            raise PermanentJobError(f"Bad recategorize payload: {payload!r}") from e
+        await recategorize_transactions(db, user_id)
+
+    return {RECATEGORIZE_JOB: handle_recategorize}
@@ -0,0 +1,219 @@
+"""
+Currency conversion from daily rates in the fx_rates table.
+
+Rates are held in memory as one sorted NumPy array of days and one of rates per currency, so
+converting a batch is a searchsorted per source currency plus a multiply, whatever its size.
+"""
+import asyncio
+import csv
+import datetime
+import time
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from sqlalchemy import BigInteger, delete, select, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import FX_BASE_CURRENCY, FX_RATES_CACHE_TTL_SECONDS
+from app.core.money import from_minor, to_minor
+from db.models import BankAccount, FxRate, TransactionRollup
+from services.analytics import group_codes
+
+Days = Union[Sequence[Any], np.ndarray]
+
+
+class FxRateUnavailable(ValueError):
+    """No rate is known for a currency on (or before) a requested day."""
+
+
+def as_days(values: Days) -> np.ndarray:
+    """dates or datetimes as a datetime64[D] array; datetimes are truncated to their day."""
+    if isinstance(values, np.ndarray) and values.dtype == "datetime64[D]":
+        return values
+    return np.array([value.date() if isinstance(value, datetime.datetime) else value for value in values], dtype="datetime64[D]")
+
+
+class FxRateTable:
+    """
+    Daily rates for every known currency, quoted as units of the currency per one base unit.
+
+    A day without a rate (a weekend, a holiday, or after the last loaded day) uses the most
+    recent earlier one; days before a currency's first rate cannot be converted.
+    """
+
+    def __init__(self, rates: Dict[str, Tuple[np.ndarray, np.ndarray]], base: str = FX_BASE_CURRENCY):
+        self.base = base
+        self._rates = rates
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[datetime.date, str, Any]], base: str = FX_BASE_CURRENCY) -> "FxRateTable":
+        by_currency: Dict[str, List[Tuple[datetime.date, float]]] = {}
+        for day, currency, rate in rows:
+            by_currency.setdefault(currency, []).append((day, float(rate)))
+        rates = {}
+        for currency, entries in by_currency.items():
+            entries.sort()
+            rates[currency] = (
+                np.array([day for day, _ in entries], dtype="datetime64[D]"),
+                np.array([rate for _, rate in entries], dtype=np.float64),
+            )
+        return cls(rates, base)
+
+    @property
+    def currencies(self) -> List[str]:
+        return sorted({self.base, *self._rates})
+
+    def rates_on(self, currency: str, days: np.ndarray) -> np.ndarray:
+        """Units of currency per base unit on each of days."""
+        if currency == self.base:
+            return np.ones(len(days), dtype=np.float64)
+        if currency not in self._rates:
+            raise FxRateUnavailable(f"No exchange rates for {currency}")
+        known_days, rates = self._rates[currency]
+        index = np.searchsorted(known_days, days, side="right") - 1
+        if len(index) and index.min() < 0:
+            raise FxRateUnavailable(f"No {currency} exchange rate on or before {days[index < 0].min()}")
+        return rates[index]
+
+    def convert_minor(self, minor: Any, from_currencies: Union[str, Sequence[str], np.ndarray], days: Days, to_currency: str) -> np.ndarray:
+        """
+        Convert int64 minor-unit amounts to to_currency at each amount's day, rounding half to even.
+
+        Args:
+            minor: Amounts in minor units
+            from_currencies: The currency of every amount, or one currency for all of them
+            days: The day of every amount
+            to_currency: Currency to convert into
+        """
+        minor = np.asarray(minor, dtype=np.int64)
+        days = as_days(days)
+        if isinstance(from_currencies, str):
+            from_currencies = np.full(len(minor), from_currencies, dtype=object)
+        else:
+            from_currencies = np.asarray(from_currencies, dtype=object)
+        converted = minor.copy()
+        sources = set(from_currencies.tolist()) - {to_currency}
+        if not sources:
+            return converted
+        to_rates = self.rates_on(to_currency, days)
+        for currency in sources:
+            mask = from_currencies == currency
+            factor = to_rates[mask] / self.rates_on(currency, days[mask])
+            converted[mask] = np.rint(minor[mask] * factor).astype(np.int64)
+        return converted
+
+    def convert(self, amount: Any, from_currency: str, day: datetime.date, to_currency: str) -> Decimal:
+        """Convert a single amount in major units."""
+        if from_currency == to_currency:
+            return Decimal(str(amount))
+        return from_minor(self.convert_minor([to_minor(amount)], from_currency, [day], to_currency)[0])
+
+
+class FxRateCache:
+    """The rate table of this process, reloaded from the database once it is ttl seconds old."""
+
+    def __init__(self, ttl: float = FX_RATES_CACHE_TTL_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._table: Optional[FxRateTable] = None
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(self, db: AsyncSession) -> FxRateTable:
+        if self._table is not None and self._clock() - self._loaded_at < self.ttl:
+            return self._table
+        async with self._lock:
+            # Another request may have reloaded while this one waited
+            if self._table is None or self._clock() - self._loaded_at >= self.ttl:
+                rows = await db.execute(select(FxRate.day, FxRate.currency, FxRate.rate))
+                self._table = FxRateTable.from_rows(rows)
+                self._loaded_at = self._clock()
+        return self._table
+
+    def invalidate(self) -> None:
+        self._table = None
+
+
+fx_rates = FxRateCache()
+
+
+def read_rates_file(path: str) -> List[Tuple[datetime.date, str, Decimal]]:
+    """Parse a `date,currency,rate` CSV; lines starting with # are comments."""
+    with open(path, newline="") as f:
+        reader = csv.DictReader(line for line in f if line.strip() and not line.startswith("#"))
+        return [
+            (datetime.date.fromisoformat(row["date"]), row["currency"].strip().upper(), Decimal(row["rate"]))
+            for row in reader
+        ]
+
+
+async def load_fx_rates(db: AsyncSession, rows: Sequence[Tuple[datetime.date, str, Decimal]]) -> int:
+    """
+    Replace the stored rates of each currency over the days the rows cover.
+
+    Returns:
+        Number of rates written
+    """
+    rows = [row for row in rows if row[1] != FX_BASE_CURRENCY]
+    spans: Dict[str, Tuple[datetime.date, datetime.date]] = {}
+    for day, currency, _ in rows:
+        first, last = spans.get(currency, (day, day))
+        spans[currency] = (min(first, day), max(last, day))
+    for currency, (first, last) in spans.items():
+        await db.execute(delete(FxRate).where(FxRate.currency == currency, FxRate.day >= first, FxRate.day <= last))
+    if rows:
+        await db.execute(FxRate.__table__.insert(), [{"day": day, "currency": currency, "rate": rate} for day, currency, rate in rows])
+    fx_rates.invalidate()
+    return len(rows)
+
+
+def _bucket_starts(days: np.ndarray, period: str) -> np.ndarray:
+    """Vectorized rollups.period_start: weeks start on Monday, and 1970-01-01 was a Thursday."""
+    if period == "day":
+        return days
+    if period == "week":
+        return days - ((days.astype(np.int64) + 3) % 7)
+    return days.astype("datetime64[M]").astype("datetime64[D]")
+
+
+async def converted_rollup_totals(db: AsyncSession, rates: FxRateTable, currency: str, user_id: Any, period: str,
+                                  criteria: Sequence[Any] = (), by_account: bool = False) -> List[Tuple[Any, ...]]:
+    """
+    Inflow and outflow per bucket, converted to currency at each day's rate.
+
+    Day rollups are converted before being added up into the requested period, so a month of
+    USD spending is valued at the rate of each day rather than of the first of the month.
+
+    Returns:
+        (period_start, bank_account_id or None, inflow, outflow, transaction_count) per bucket, in order
+    """
+    stmt = (
+        select(
+            TransactionRollup.period_start,
+            TransactionRollup.bank_account_id,
+            BankAccount.currency,
+            type_coerce(TransactionRollup.inflow, BigInteger),
+            type_coerce(TransactionRollup.outflow, BigInteger),
+            TransactionRollup.transaction_count,
+        )
+        .join(BankAccount, BankAccount.id == TransactionRollup.bank_account_id)
+        .where(TransactionRollup.user_id == user_id, TransactionRollup.period == "day", TransactionRollup.transaction_count != 0, *criteria)
+    )
+    rows = (await db.execute(stmt)).all()
+    if not rows:
+        return []
+    days, account_ids, currencies, inflow, outflow, counts = zip(*rows)
+    days = as_days(days)
+    inflow = rates.convert_minor(np.array(inflow, dtype=np.int64), currencies, days, currency)
+    outflow = rates.convert_minor(np.array(outflow, dtype=np.int64), currencies, days, currency)
+
+    buckets = _bucket_starts(days, period).tolist()
+    keys = list(zip(buckets, account_ids)) if by_account else [(bucket, None) for bucket in buckets]
+    uniques, codes = group_codes(keys)
+    totals = np.zeros((len(uniques), 3), dtype=np.int64)
+    np.add.at(totals, codes, np.column_stack([inflow, outflow, np.array(counts, dtype=np.int64)]))
+    return sorted(
+        (bucket, account_id, from_minor(bucket_inflow), from_minor(bucket_outflow), count)
+        for (bucket, account_id), (bucket_inflow, bucket_outflow, count) in zip(uniques, totals.tolist())
+    )
@@ -0,0 +1,105 @@
+"""
+Idempotency keys for write endpoints.
+
+A POST carrying an Idempotency-Key header claims a row in idempotency_keys before it runs. The
+response it produces is stored on that row and replayed to every retry with the same key until
+the row expires, so a retry costs one primary key lookup instead of another write. The claim is
+an INSERT ... ON CONFLICT DO NOTHING, which makes exactly one of several concurrent requests
+(across processes) the one that runs.
+"""
+import datetime
+import hashlib
+from typing import NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models import IdempotencyKey
+from services.rollups import dialect_insert
+
+
+class StoredResponse(NamedTuple):
+    request_hash: str
+    status_code: int
+    content_type: Optional[str]
+    body: bytes
+
+
+def key_hash(method: str, path: str, query_string: bytes, key: str) -> str:
+    """
+    The row key for a client's Idempotency-Key.
+
+    Scoped by endpoint and query string (which carries user_id), so one key sent to two endpoints,
+    or on behalf of two users, names two requests.
+    """
+    return hashlib.sha256(b"\n".join([method.encode(), path.encode(), query_string, key.encode()])).hexdigest()
+
+
+def request_hash(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+def stored_response(row: IdempotencyKey) -> Optional[StoredResponse]:
+    """The response to replay from a row, or None while its request is still in flight."""
+    if row.status_code is None:
+        return None
+    return StoredResponse(row.request_hash, row.status_code, row.content_type, row.body or b"")
+
+
+async def claim_key(db: AsyncSession, key_hash: str, request_hash: str, ttl_seconds: int, lock_timeout_seconds: float,
+                    now: Optional[datetime.datetime] = None) -> Tuple[bool, Optional[IdempotencyKey]]:
+    """
+    Claim key_hash for a request about to run, and commit the claim.
+
+    An expired row is taken over, as is one left in flight for over lock_timeout_seconds by a
+    process that died before completing or releasing it.
+
+    Returns:
+        (True, None) when claimed; otherwise (False, the existing row), in flight or completed.
+        (False, None) means the row went away between the claim and the read (its request
+        failed and was released); claim again.
+    """
+    now = now or datetime.datetime.utcnow()
+    insert = dialect_insert(db)
+    for _ in range(2):
+        result = await db.execute(insert(IdempotencyKey).values(
+            key_hash=key_hash, request_hash=request_hash, created_at=now,
+            expires_at=now + datetime.timedelta(seconds=ttl_seconds),
+        ).on_conflict_do_nothing(index_elements=["key_hash"]))
+        if result.rowcount:
+            await db.commit()
+            return True, None
+        existing = await db.scalar(
+            select(IdempotencyKey).where(IdempotencyKey.key_hash == key_hash).execution_options(populate_existing=True)
+        )
+        abandoned_before = now - datetime.timedelta(seconds=lock_timeout_seconds)
+        if existing is None or (existing.expires_at > now and (existing.status_code is not None or existing.created_at > abandoned_before)):
+            await db.commit()
+            return False, existing
+        await db.execute(delete(IdempotencyKey).where(
+            IdempotencyKey.key_hash == key_hash,
+            or_(IdempotencyKey.expires_at <= now, and_(IdempotencyKey.status_code.is_(None), IdempotencyKey.created_at <= abandoned_before)),
+        ))
+    await db.commit()
+    return False, None
+
+
+async def complete_key(db: AsyncSession, key_hash: str, response: StoredResponse) -> None:
+    """Store the response of a claimed request for replay."""
+    await db.execute(update(IdempotencyKey).where(IdempotencyKey.key_hash == key_hash).values(
+        status_code=response.status_code, content_type=response.content_type, body=response.body,
+    ))
+    await db.commit()
+
+
+async def release_key(db: AsyncSession, key_hash: str) -> None:
+    """Drop the claim of a request that failed, so a retry runs it again."""
+    await db.execute(delete(IdempotencyKey).where(IdempotencyKey.key_hash == key_hash, IdempotencyKey.status_code.is_(None)))
+    await db.commit()
+
+
+async def purge_expired_keys(db: AsyncSession, now: Optional[datetime.datetime] = None) -> int:
+    """Delete expired keys; returns how many. Expired keys are also taken over when reused."""
+    result = await db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= (now or datetime.datetime.utcnow())))
+    await db.commit()
+    return result.rowcount
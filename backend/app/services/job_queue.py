@@ -0,0 +1,248 @@
+import asyncio
+import datetime
+import logging
+import os
+import random
+import socket
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import exists, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import aliased
+
+from app.core.config import (
+    JOB_POLL_INTERVAL_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_RETRY_BASE_SECONDS,
+    JOB_RETRY_MAX_SECONDS,
+    JOB_LOCK_TIMEOUT_SECONDS,
+)
+from db.models import Job
+from db.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+DEAD = "dead"
+
+# A handler gets its own session and the job payload; raising marks the attempt failed
+JobHandler = Callable[[AsyncSession, Dict[str, Any]], Awaitable[Any]]
+
+# Candidates read per claim attempt, so a worker losing a race can try the next row
+CLAIM_BATCH_SIZE = 10
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying cannot help; the job is dead-lettered immediately."""
+
+
+async def enqueue(db: AsyncSession, kind: str, payload: Dict[str, Any], dedup_key: Optional[str] = None,
+                  run_at: Optional[datetime.datetime] = None, max_attempts: int = JOB_MAX_ATTEMPTS) -> Tuple[Job, bool]:
+    """
+    Add a job to the queue as part of the caller's transaction; the caller commits.
+
+    When dedup_key is given and a job with the same key is still waiting to run, no new job is
+    created and the waiting one is returned instead (pulled forward if it was backing off).
+
+    Returns:
+        The queued job and whether it was newly created
+    """
+    now = datetime.datetime.utcnow()
+    if dedup_key is not None:
+        existing = await db.scalar(
+            select(Job).where(Job.dedup_key == dedup_key, Job.status == QUEUED).order_by(Job.run_at).limit(1)
+        )
+        if existing is not None:
+            if existing.run_at > now:
+                existing.run_at = now
+            return existing, False
+
+    job = Job(
+        id=uuid.uuid4(),
+        kind=kind,
+        payload=payload,
+        dedup_key=dedup_key,
+        status=QUEUED,
+        attempts=0,
+        max_attempts=max_attempts,
+        run_at=run_at or now,
+    )
+    db.add(job)
+    await db.flush()
+    return job, True
+
+
+class JobWorker:
+    """
+    Polls the jobs table and runs claimed jobs one at a time.
+
+    Any number of workers, in any number of processes, can share a queue: a job is claimed with a
+    conditional UPDATE (after SELECT ... FOR UPDATE SKIP LOCKED on PostgreSQL), so only one worker
+    wins it. Jobs sharing a dedup_key never run concurrently. Failed jobs are retried with
+    exponential backoff and dead-lettered after max_attempts. A worker renews its lock every third
+    of lock_timeout while a job runs, so only jobs left running by a crashed worker are requeued
+    once their lock times out, however long a live job takes.
+
+    Args:
+        handlers: Job kind -> coroutine function run for it
+        session_factory: Factory for the sessions used to claim and run jobs
+        worker_id: Name recorded in locked_by; defaults to host:pid:random
+    """
+
+    def __init__(
+        self,
+        handlers: Dict[str, JobHandler],
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        worker_id: Optional[str] = None,
+        poll_interval: float = JOB_POLL_INTERVAL_SECONDS,
+        retry_base: float = JOB_RETRY_BASE_SECONDS,
+        retry_max: float = JOB_RETRY_MAX_SECONDS,
+        lock_timeout: float = JOB_LOCK_TIMEOUT_SECONDS,
+    ):
+        self.handlers = handlers
+        self.session_factory = session_factory
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.poll_interval = poll_interval
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.lock_timeout = lock_timeout
+
+    async def claim(self) -> Optional[Job]:
+        """Claim the oldest runnable job, or return None when there is nothing to do."""
+        now = datetime.datetime.utcnow()
+        running = aliased(Job)
+        key_busy = exists().where(running.dedup_key == Job.dedup_key, running.status == RUNNING)
+        async with self.session_factory() as db:
+            candidates = (await db.scalars(
+                select(Job.id)
+                .where(Job.status == QUEUED, Job.run_at <= now, ~key_busy)
+                .order_by(Job.run_at, Job.created_at)
+                .limit(CLAIM_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            )).all()
+            for job_id in candidates:
+                result = await db.execute(
+                    update(Job)
+                    .where(Job.id == job_id, Job.status == QUEUED)
+                    .values(status=RUNNING, locked_by=self.worker_id, locked_at=now, attempts=Job.attempts + 1)
+                )
+                if result.rowcount == 1:
+                    await db.commit()
+                    return await db.get(Job, job_id)
+            await db.commit()
+        return None
+
+    def _retry_delay(self, attempts: int) -> float:
+        delay = min(self.retry_base * 2 ** (attempts - 1), self.retry_max)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _finish(self, job: Job, **values: Any) -> None:
+        async with self.session_factory() as db:
+            await db.execute(
+                update(Job)
+                .where(Job.id == job.id, Job.locked_by == self.worker_id)
+                .values(locked_by=None, locked_at=None, **values)
+            )
+            await db.commit()
+
+    @asynccontextmanager
+    async def _renewing_lock(self, job: Job) -> AsyncIterator[None]:
+        """Renew the job's lock every third of lock_timeout while the block runs, so requeue_stale leaves it alone."""
+        async def renew() -> None:
+            while True:
+                await asyncio.sleep(self.lock_timeout / 3)
+                try:
+                    async with self.session_factory() as db:
+                        await db.execute(
+                            update(Job)
+                            .where(Job.id == job.id, Job.locked_by == self.worker_id)
+                            .values(locked_at=datetime.datetime.utcnow())
+                        )
+                        await db.commit()
+                except Exception:
+                    logger.exception("Job worker %s failed to renew the lock of job %s", self.worker_id, job.id)
+
+        renewing = asyncio.create_task(renew())
+        try:
+            yield
+        finally:
+            renewing.cancel()
+
+    async def _fail(self, job: Job, error: BaseException, retry: bool = True) -> None:
+        now = datetime.datetime.utcnow()
+        message = f"{type(error).__name__}: {error}"[:2000]
+        if retry and job.attempts < job.max_attempts:
+            await self._finish(job, status=QUEUED, last_error=message,
+                               run_at=now + datetime.timedelta(seconds=self._retry_delay(job.attempts)))
+        else:
+            await self._finish(job, status=DEAD, last_error=message, finished_at=now)
+
+    async def run_job(self, job: Job) -> None:
+        """Run a claimed job and record the outcome."""
+        handler = self.handlers.get(job.kind)
+        if handler is None:
+            await self._fail(job, LookupError(f"No handler registered for job kind {job.kind!r}"), retry=False)
+            return
+        try:
+            async with self.session_factory() as db, self._renewing_lock(job):
+                await handler(db, job.payload)
+        except asyncio.CancelledError:
+            # Shutting down mid-job: hand it back without counting the attempt
+            await asyncio.shield(self._finish(job, status=QUEUED, attempts=job.attempts - 1))
+            raise
+        except PermanentJobError as e:
+            await self._fail(job, e, retry=False)
+        except Exception as e:
+            await self._fail(job, e)
+        else:
+            await self._finish(job, status=SUCCEEDED, last_error=None, finished_at=datetime.datetime.utcnow())
+
+    async def requeue_stale(self) -> int:
+        """Requeue jobs whose lock was not renewed within the lock timeout (their worker crashed), or dead-letter them when out of attempts."""
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.lock_timeout)
+        stale = (Job.status == RUNNING, Job.locked_at < cutoff)
+        async with self.session_factory() as db:
+            dead = await db.execute(
+                update(Job).where(*stale, Job.attempts >= Job.max_attempts)
+                .values(status=DEAD, locked_by=None, locked_at=None, last_error="Lock timed out",
+                        finished_at=datetime.datetime.utcnow())
+            )
+            requeued = await db.execute(
+                update(Job).where(*stale).values(status=QUEUED, locked_by=None, locked_at=None, last_error="Lock timed out")
+            )
+            await db.commit()
+        return dead.rowcount + requeued.rowcount
+
+    async def run_once(self) -> bool:
+        """Claim and run a single job. Returns False when the queue had nothing runnable."""
+        job = await self.claim()
+        if job is None:
+            return False
+        await self.run_job(job)
+        return True
+
+    async def run_until_empty(self) -> int:
+        """Run jobs until none are runnable. Returns how many ran."""
+        count = 0
+        while await self.run_once():
+            count += 1
+        return count
+
+    async def run(self, stop: Optional[asyncio.Event] = None) -> None:
+        """Poll the queue until stop is set (or the task is cancelled)."""
+        stop = stop or asyncio.Event()
+        while not stop.is_set():
+            try:
+                if await self.run_once():
+                    continue
+                await self.requeue_stale()
+            except Exception:
+                logger.exception("Job worker %s failed to poll the queue", self.worker_id)
+            try:
+                await asyncio.wait_for(stop.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
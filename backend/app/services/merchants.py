@@ -0,0 +1,28 @@
+import re
+import unicodedata
+
+# Processor and card-network noise banks prepend to the merchant name
+_PREFIXES = re.compile(
+    r"^(?:(?:pos|debit card|visa|mc|interac|point of sale)\s+)?(?:purchase|payment|debit|withdrawal|pmt)?\s*"
+    r"(?:sq\s*\*|tst\s*\*|sp\s*\*|pp\s*\*|paypal\s*\*)?"
+)
+# Store numbers, card suffixes, reference numbers and dates
+_NOISE = re.compile(r"(?:#\s*\d+|\bx+\d+\b|\*+(?=[a-z]*\d)[a-z0-9]+|\b\d{3,}\b|\b\d{1,2}/\d{1,2}(?:/\d{2,4})?\b)")
+_NON_WORD = re.compile(r"[^a-z0-9&' ]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_description(description: str) -> str:
+    """
+    Reduce a bank description to a stable, comparable form.
+
+    "SQ *BLUE BOTTLE #1234  03/14" and "Blue Bottle" both become "blue bottle", so the same
+    purchase reported by different sources (Plaid, a CSV export, manual entry) compares equal.
+    """
+    text = unicodedata.normalize("NFKD", description or "").encode("ascii", "ignore").decode().lower()
+    text = _SPACES.sub(" ", text).strip()
+    stripped = _PREFIXES.sub("", text, count=1)
+    # A description that is nothing but a prefix ("Purchase") is kept as is
+    text = _NOISE.sub(" ", stripped if stripped.strip() else text)
+    text = _NON_WORD.sub(" ", text)
+    return _SPACES.sub(" ", text).strip()
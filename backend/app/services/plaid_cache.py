@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from app.core.cache import TTLCache
+from app.core.config import (
+    PLAID_CACHE_BACKEND,
+    REDIS_URL,
+    PLAID_CACHE_STALE_SECONDS,
+    PLAID_CACHE_MAX_ENTRIES,
+)
+
+# A cached value together with the wall-clock time until which it counts as fresh
+CacheEntry = Tuple[Any, float]
+
+
+class InMemoryCacheBackend:
+    """Per-process LRU backend."""
+
+    def __init__(self, maxsize: int = PLAID_CACHE_MAX_ENTRIES):
+        self._cache = TTLCache(maxsize=maxsize, ttl=PLAID_CACHE_STALE_SECONDS)
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        return self._cache.get(key)
+
+    async def set(self, key: str, entry: CacheEntry, ttl: float) -> None:
+        self._cache.set(key, entry, ttl=ttl)
+
+    async def delete_prefix(self, prefix: str) -> None:
+        self._cache.pop_where(lambda key: key.startswith(prefix))
+
+
+class RedisCacheBackend:
+    """
+    Backend for a shared Redis (or any client exposing the redis.asyncio get/set/delete/scan_iter API).
+
+    Args:
+        client: An asyncio Redis client, e.g. redis.asyncio.from_url(REDIS_URL)
+    """
+
+    def __init__(self, client: Any):
+        self.client = client
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        raw = await self.client.get(key)
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        return data["v"], data["f"]
+
+    async def set(self, key: str, entry: CacheEntry, ttl: float) -> None:
+        value, fresh_until = entry
+        await self.client.set(key, json.dumps({"v": value, "f": fresh_until}, default=str), ex=max(int(ttl), 1))
+
+    async def delete_prefix(self, prefix: str) -> None:
+        keys = [key async for key in self.client.scan_iter(match=f"{prefix}*")]
+        if keys:
+            await self.client.delete(*keys)
+
+
+class PlaidResponseCache:
+    """
+    Stale-while-revalidate cache for Plaid reads.
+
+    A fresh hit is returned as is. A stale hit is returned immediately while a single background
+    task per key refetches it. A miss is fetched inline, with concurrent misses for the same key
+    sharing one upstream call. Error responses are never cached.
+    """
+
+    def __init__(self, backend: Any, stale_seconds: float = PLAID_CACHE_STALE_SECONDS, clock: Callable[[], float] = time.time):
+        self.backend = backend
+        self.stale_seconds = stale_seconds
+        self._clock = clock
+        self._in_flight: Dict[str, "asyncio.Future[Any]"] = {}
+        self._background: Set["asyncio.Task[Any]"] = set()
+
+    @staticmethod
+    def item_prefix(access_token: str) -> str:
+        # Hash the token so credentials never end up in cache keys
+        return f"plaid:{hashlib.sha256(access_token.encode()).hexdigest()[:24]}:"
+
+    def key(self, access_token: str, *parts: str) -> str:
+        return self.item_prefix(access_token) + ":".join(parts)
+
+    async def _fetch_and_store(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: float) -> Any:
+        if key in self._in_flight:
+            return await asyncio.shield(self._in_flight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            value = await fetch()
+            if not (isinstance(value, dict) and "error" in value):
+                await self.backend.set(key, (value, self._clock() + ttl), ttl + self.stale_seconds)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved for the case nobody else was waiting on it
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    def _revalidate(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: float) -> None:
+        if key in self._in_flight:
+            return
+        task = asyncio.create_task(self._fetch_and_store(key, fetch, ttl))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: float, force_refresh: bool = False) -> Any:
+        """
+        Return the cached value for key, fetching it with `fetch` when missing, stale or forced.
+
+        Args:
+            key: Cache key, normally built with key()
+            fetch: Coroutine function producing a fresh value
+            ttl: Seconds a newly fetched value stays fresh
+            force_refresh: Skip the cache read and always fetch from upstream
+        """
+        if not force_refresh:
+            entry = await self.backend.get(key)
+            if entry is not None:
+                value, fresh_until = entry
+                if self._clock() >= fresh_until:
+                    self._revalidate(key, fetch, ttl)
+                return value
+        return await self._fetch_and_store(key, fetch, ttl)
+
+    async def invalidate(self, access_token: str) -> None:
+        """Drop every cached response for the item behind this access token."""
+        await self.backend.delete_prefix(self.item_prefix(access_token))
+
+
+def build_plaid_cache(backend: str = PLAID_CACHE_BACKEND) -> Optional[PlaidResponseCache]:
+    """Create the response cache configured by PLAID_CACHE_BACKEND (None when caching is disabled)."""
+    if backend == "none":
+        return None
+    if backend == "redis":
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError as e:
+            raise RuntimeError("PLAID_CACHE_BACKEND=redis requires the 'redis' package to be installed") from e
+        return PlaidResponseCache(RedisCacheBackend(redis_asyncio.from_url(REDIS_URL)))
+    return PlaidResponseCache(InMemoryCacheBackend())
@@ -4,20 +4,42 @@ from plaid.model.link_token_create_request import LinkTokenCreateRequest
 from plaid.model.link_token_create_request_user import LinkTokenCreateRequestUser
 from plaid.model.item_public_token_exchange_request import ItemPublicTokenExchangeRequest
 from plaid.model.transactions_get_request import TransactionsGetRequest
+from plaid.model.transactions_sync_request import TransactionsSyncRequest
 from plaid.model.accounts_get_request import AccountsGetRequest
 from plaid.model.products import Products
 from plaid.model.country_code import CountryCode
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Union
 import json
+import time
+from app.core.metrics import record_plaid_call
 from app.core.config import (
     PLAID_CLIENT_ID,
     PLAID_SECRET,
     PLAID_ENV,
+    PLAID_BASE_URL,
+    FAKE_PLAID_URL,
     PLAID_COUNTRY_CODES,
     PLAID_PRODUCTS
 )
 
+class _TimedApiClient(plaid.ApiClient):
+    """ApiClient that records every Plaid call in the plaid_request metrics."""
+
+    def call_api(self, resource_path: str, *args, **kwargs):
+        started = time.perf_counter()
+        outcome = '200'
+        try:
+            return super().call_api(resource_path, *args, **kwargs)
+        except plaid.ApiException as e:
+            outcome = str(e.status)
+            raise
+        except Exception as e:
+            outcome = e.__class__.__name__
+            raise
+        finally:
+            record_plaid_call(resource_path, outcome, time.perf_counter() - started)
+
 class PlaidService:
     def __init__(self):
         """Initialize the Plaid client with credentials from config."""
@@ -29,13 +51,17 @@ class PlaidService:
                 'secret': PLAID_SECRET,
             }
         )
-        api_client = plaid.ApiClient(configuration)
+        api_client = _TimedApiClient(configuration)
         self.client = plaid_api.PlaidApi(api_client)
 
     def _get_plaid_host(self) -> str:
         """Get the appropriate Plaid API host based on the environment."""
+        if PLAID_BASE_URL:
+            return PLAID_BASE_URL
         if PLAID_ENV == 'sandbox':
             return plaid.Environment.Sandbox
+        elif PLAID_ENV == 'local':
+            return FAKE_PLAID_URL
         elif PLAID_ENV == 'development':
             return plaid.Environment.Development
         elif PLAID_ENV == 'production':
@@ -200,3 +226,41 @@ class PlaidService:
                     'error_type': error_response.get('error_type', 'API_ERROR')
                 }
             }
+
+    def sync_transactions(self, access_token: str, cursor: Optional[str] = None, count: int = 500) -> Dict[str, Any]:
+        """
+        Fetch one page of transaction changes since the given cursor.
+
+        Args:
+            access_token: The access token for the user's financial institution
+            cursor: The next_cursor returned by the previous page (None for a full initial sync)
+            count: The maximum number of changes to return in this page
+
+        Returns:
+            A dictionary containing added, modified and removed transactions, the next cursor
+            and whether more pages are available
+        """
+        try:
+            request_args = {'access_token': access_token, 'count': count}
+            if cursor:
+                request_args['cursor'] = cursor
+            request = TransactionsSyncRequest(**request_args)
+            response = self.client.transactions_sync(request)
+
+            return {
+                'added': [transaction.to_dict() for transaction in response['added']],
+                'modified': [transaction.to_dict() for transaction in response['modified']],
+                'removed': [transaction.to_dict() for transaction in response['removed']],
+                'next_cursor': response['next_cursor'],
+                'has_more': response['has_more']
+            }
+        except plaid.ApiException as e:
+            error_response = json.loads(e.body)
+            return {
+                'error': {
+                    'status_code': e.status,
+                    'message': error_response.get('error_message', 'An unknown error occurred'),
+                    'error_code': error_response.get('error_code', 'UNKNOWN_ERROR'),
+                    'error_type': error_response.get('error_type', 'API_ERROR')
+                }
+            }
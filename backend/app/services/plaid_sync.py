@@ -0,0 +1,215 @@
+import datetime
+import inspect
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.core.money import DEFAULT_CURRENCY, to_decimal
+from db.models import BankAccount, PlaidItem, Transaction
+from services.categorization import plaid_category_hint
+from services.rollups import dialect_insert
+from services.transaction_writer import delete_transactions, insert_transactions, update_transactions
+
+# Plaid asks clients to restart the pagination loop from the original cursor when this happens
+MUTATION_DURING_PAGINATION = "TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION"
+MAX_PAGINATION_RESTARTS = 3
+
+
+class PlaidSyncError(Exception):
+    """Raised when Plaid returns an error while syncing an item."""
+
+    def __init__(self, error: Dict[str, Any]):
+        super().__init__(error.get("message", "Plaid sync failed"))
+        self.error = error
+
+
+async def _call(fn: Callable[..., Any], *args: Any) -> Any:
+    # Works with both the blocking PlaidService and coroutine-based clients
+    if inspect.iscoroutinefunction(fn):
+        return await fn(*args)
+    return await run_in_threadpool(fn, *args)
+
+
+def _as_dict(value: Any) -> Dict[str, Any]:
+    return value.to_dict() if hasattr(value, "to_dict") else value
+
+
+def _to_datetime(value: Any) -> Optional[datetime.datetime]:
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time())
+    return datetime.datetime.fromisoformat(str(value))
+
+
+def _transaction_values(plaid_transaction: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "description": plaid_transaction.get("merchant_name") or plaid_transaction.get("name") or "",
+        # Plaid reports money leaving the account as a positive amount; we store inflows as positive
+        "amount": -to_decimal(plaid_transaction["amount"]),
+        "date": _to_datetime(plaid_transaction.get("date")),
+        # Used by the categorizer when the user has no rule for the transaction
+        "category_hint": plaid_category_hint(plaid_transaction),
+    }
+
+
+async def _resolve_accounts(db: AsyncSession, item: PlaidItem, plaid_service: Any, plaid_account_ids: Iterable[str]) -> Dict[str, BankAccount]:
+    """
+    Map Plaid account ids onto BankAccount rows, creating rows for accounts seen for the first time.
+
+    New rows are inserted with ON CONFLICT (plaid_account_id) DO NOTHING and then read back, so
+    when two syncs of an item see its accounts for the first time at once, both end up with the
+    row whichever of them created it.
+    """
+    wanted = set(plaid_account_ids)
+    if not wanted:
+        return {}
+
+    accounts = {
+        account.plaid_account_id: account
+        for account in await db.scalars(select(BankAccount).where(BankAccount.plaid_account_id.in_(wanted)))
+    }
+    missing = wanted - accounts.keys()
+    if missing:
+        result = await _call(plaid_service.get_account_balances, item.access_token)
+        if "error" in result:
+            raise PlaidSyncError(result["error"])
+        new_accounts: List[Dict[str, Any]] = []
+        for plaid_account in map(_as_dict, result["accounts"]):
+            if plaid_account["account_id"] not in missing:
+                continue
+            balances = plaid_account.get("balances") or {}
+            current = to_decimal(balances.get("current") or 0)
+            new_accounts.append({
+                "user_id": item.user_id,
+                "institution_name": item.institution_name or plaid_account.get("name") or "Plaid",
+                "account_type": str(plaid_account.get("subtype") or plaid_account.get("type") or "unknown"),
+                "currency": balances.get("iso_currency_code") or balances.get("unofficial_currency_code") or DEFAULT_CURRENCY,
+                # Plaid's current balance already includes the history this sync is about to insert
+                "balance": current,
+                "opening_balance": current,
+                "opening_balance_at": datetime.datetime.utcnow(),
+                "plaid_item_id": item.id,
+                "plaid_account_id": plaid_account["account_id"],
+            })
+        if new_accounts:
+            insert = dialect_insert(db)
+            await db.execute(insert(BankAccount).on_conflict_do_nothing(index_elements=["plaid_account_id"]), new_accounts)
+            accounts.update(
+                (account.plaid_account_id, account)
+                for account in await db.scalars(select(BankAccount).where(
+                    BankAccount.plaid_account_id.in_([account["plaid_account_id"] for account in new_accounts])
+                ))
+            )
+    return accounts
+
+
+async def _lock_item(db: AsyncSession, item: PlaidItem) -> None:
+    """
+    Hold the item's row lock (the database write lock on SQLite) until the page commits.
+
+    Syncs of one item then apply their pages one after the other, and a sync that fetched the
+    same page as another finds its transactions already inserted instead of inserting them twice.
+    """
+    await db.execute(
+        update(PlaidItem).where(PlaidItem.id == item.id).values(transactions_cursor=PlaidItem.transactions_cursor)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def apply_sync_page(db: AsyncSession, item: PlaidItem, plaid_service: Any, page: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Apply one /transactions/sync page of deltas to the transactions table.
+
+    Added and modified transactions are upserted on plaid_transaction_id, so re-applying a page
+    after a pagination restart is harmless.
+
+    Returns:
+        Counts of rows inserted, updated and removed
+    """
+    changed = [_as_dict(t) for t in page.get("added", [])] + [_as_dict(t) for t in page.get("modified", [])]
+    removed_ids = [_as_dict(t)["transaction_id"] for t in page.get("removed", [])]
+
+    # Later entries win if Plaid reports the same transaction more than once in a page
+    by_plaid_id = {t["transaction_id"]: t for t in changed}
+    accounts = await _resolve_accounts(db, item, plaid_service, {t["account_id"] for t in by_plaid_id.values()})
+    await _lock_item(db, item)
+
+    existing: Dict[str, Any] = {}
+    if by_plaid_id:
+        rows = await db.execute(
+            select(Transaction.plaid_transaction_id, Transaction.id)
+            .where(Transaction.plaid_transaction_id.in_(by_plaid_id.keys()))
+        )
+        existing = dict(rows.all())
+
+    inserts: List[Dict[str, Any]] = []
+    updates: List[Dict[str, Any]] = []
+    for plaid_id, plaid_transaction in by_plaid_id.items():
+        account = accounts.get(plaid_transaction["account_id"])
+        if account is None:
+            continue
+        values = _transaction_values(plaid_transaction)
+        values["bank_account_id"] = account.id
+        if plaid_id in existing:
+            updates.append({"id": existing[plaid_id], **values})
+        else:
+            inserts.append({"user_id": item.user_id, "plaid_transaction_id": plaid_id, **values})
+
+    removed_rows: List[Any] = []
+    if removed_ids:
+        removed_rows = list(await db.scalars(
+            select(Transaction.id).where(Transaction.plaid_transaction_id.in_(removed_ids))
+        ))
+
+    if inserts:
+        await insert_transactions(db, inserts)
+    if updates:
+        await update_transactions(db, updates)
+    if removed_rows:
+        await delete_transactions(db, removed_rows)
+    return {"added": len(inserts), "modified": len(updates), "removed": len(removed_rows)}
+
+
+async def sync_item(db: AsyncSession, item: PlaidItem, plaid_service: Any) -> Dict[str, int]:
+    """
+    Pull every change since the item's stored cursor and apply it.
+
+    Each page is committed together with the cursor that follows it, so an interrupted sync
+    resumes where it stopped instead of starting over.
+
+    Args:
+        db: The session to write through
+        item: The Plaid item to sync
+        plaid_service: A PlaidService (or compatible client) exposing sync_transactions and get_account_balances
+
+    Returns:
+        Totals of rows inserted, updated and removed across all pages
+    """
+    totals = {"added": 0, "modified": 0, "removed": 0}
+    start_cursor = item.transactions_cursor
+    cursor = start_cursor
+    restarts = 0
+
+    while True:
+        page = await _call(plaid_service.sync_transactions, item.access_token, cursor)
+        if "error" in page:
+            if page["error"].get("error_code") == MUTATION_DURING_PAGINATION and restarts < MAX_PAGINATION_RESTARTS:
+                restarts += 1
+                cursor = start_cursor
+                continue
+            raise PlaidSyncError(page["error"])
+
+        counts = await apply_sync_page(db, item, plaid_service, page)
+        for key, value in counts.items():
+            totals[key] += value
+
+        item.transactions_cursor = page["next_cursor"]
+        item.last_synced_at = datetime.datetime.utcnow()
+        await db.commit()
+
+        if not page.get("has_more"):
+            return totals
+        cursor = page["next_cursor"]
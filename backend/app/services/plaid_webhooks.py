@@ -0,0 +1,152 @@
+import hashlib
+import hmac
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import jwt
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import TTLCache
+from app.core.config import PLAID_WEBHOOK_MAX_AGE_SECONDS
+from db.models import PlaidItem
+from services.job_queue import JobHandler, PermanentJobError
+from services.plaid_sync import PlaidSyncError, sync_item
+
+SYNC_ITEM_JOB = "plaid.sync_item"
+ITEM_STATUS_JOB = "plaid.item_status"
+
+# TRANSACTIONS webhooks that all mean "call /transactions/sync for this item"
+SYNC_WEBHOOK_CODES = {"SYNC_UPDATES_AVAILABLE", "INITIAL_UPDATE", "HISTORICAL_UPDATE", "DEFAULT_UPDATE", "TRANSACTIONS_REMOVED"}
+# ITEM webhooks that change whether the item still works; None clears the stored error
+ITEM_STATUS_WEBHOOK_CODES = {"ERROR", "PENDING_EXPIRATION", "USER_PERMISSION_REVOKED", "LOGIN_REPAIRED"}
+
+# Verification keys are rotated rarely; cache them by key ID
+VERIFICATION_KEY_TTL_SECONDS = 24 * 60 * 60
+
+
+class WebhookVerificationError(Exception):
+    """Raised when a webhook's Plaid-Verification JWT does not check out."""
+
+
+class WebhookVerifier:
+    """
+    Verify Plaid webhook signatures.
+
+    Plaid signs each webhook with an ES256 JWT in the Plaid-Verification header whose
+    request_body_sha256 claim covers the raw body. The signing key is fetched from
+    /webhook_verification_key/get by the JWT's key ID and cached.
+
+    Args:
+        plaid_service: Client exposing get_webhook_verification_key
+        max_age: Oldest accepted iat, in seconds, to limit replays
+    """
+
+    def __init__(self, plaid_service: Any, max_age: float = PLAID_WEBHOOK_MAX_AGE_SECONDS, clock: Callable[[], float] = time.time):
+        self.plaid_service = plaid_service
+        self.max_age = max_age
+        self._clock = clock
+        self._keys = TTLCache(maxsize=100, ttl=VERIFICATION_KEY_TTL_SECONDS)
+
+    async def _key(self, key_id: str) -> Dict[str, Any]:
+        key = self._keys.get(key_id)
+        if key is None:
+            result = await self.plaid_service.get_webhook_verification_key(key_id)
+            if "error" in result:
+                raise WebhookVerificationError("Unable to fetch the webhook verification key")
+            key = result["key"]
+            self._keys.set(key_id, key)
+        if key.get("expired_at"):
+            raise WebhookVerificationError("Webhook verification key has expired")
+        return key
+
+    async def verify(self, body: bytes, token: Optional[str]) -> None:
+        if not token:
+            raise WebhookVerificationError("Missing Plaid-Verification header")
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.PyJWTError:
+            raise WebhookVerificationError("Malformed Plaid-Verification header")
+        if header.get("alg") != "ES256" or not header.get("kid"):
+            raise WebhookVerificationError("Unexpected webhook signature algorithm")
+
+        key = await self._key(header["kid"])
+        try:
+            claims = jwt.decode(token, jwt.PyJWK(key, algorithm="ES256").key, algorithms=["ES256"],
+                                options={"require": ["iat"]})
+        except jwt.PyJWTError:
+            raise WebhookVerificationError("Invalid webhook signature")
+
+        if self._clock() - claims["iat"] > self.max_age:
+            raise WebhookVerificationError("Webhook is too old")
+        expected = str(claims.get("request_body_sha256", ""))
+        if not hmac.compare_digest(expected, hashlib.sha256(body).hexdigest()):
+            raise WebhookVerificationError("Webhook body does not match its signature")
+
+
+def plan_webhook_job(event: Dict[str, Any]) -> Optional[Tuple[str, Dict[str, Any], Optional[str]]]:
+    """
+    Map a webhook event onto the job that handles it.
+
+    Returns:
+        (kind, payload, dedup_key), or None for events we do not act on
+    """
+    item_id = event.get("item_id")
+    if not item_id:
+        return None
+    webhook_type = event.get("webhook_type")
+    webhook_code = event.get("webhook_code")
+
+    if webhook_type == "TRANSACTIONS" and webhook_code in SYNC_WEBHOOK_CODES:
+        # A sync pulls everything since the stored cursor, so one queued sync covers any number of events
+        return SYNC_ITEM_JOB, {"item_id": item_id}, f"{SYNC_ITEM_JOB}:{item_id}"
+    if webhook_type == "ITEM" and webhook_code in ITEM_STATUS_WEBHOOK_CODES:
+        error_code = None
+        if webhook_code == "ERROR":
+            error_code = (event.get("error") or {}).get("error_code") or "ERROR"
+        elif webhook_code != "LOGIN_REPAIRED":
+            error_code = webhook_code
+        return ITEM_STATUS_JOB, {"item_id": item_id, "error_code": error_code}, None
+    return None
+
+
+def _is_retryable(error: Dict[str, Any]) -> bool:
+    status_code = error.get("status_code", 500)
+    return status_code == 429 or status_code >= 500
+
+
+def plaid_job_handlers(plaid_service: Any) -> Dict[str, JobHandler]:
+    """Job handlers for Plaid webhook work, bound to the given Plaid client."""
+
+    async def get_item(db: AsyncSession, item_id: str) -> Optional[PlaidItem]:
+        return await db.scalar(select(PlaidItem).where(PlaidItem.item_id == item_id))
+
+    async def handle_sync(db: AsyncSession, payload: Dict[str, Any]) -> None:
+        item = await get_item(db, payload["item_id"])
+        if item is None:
+            # Unlinked since the webhook arrived
+            return
+        item_pk, access_token = item.id, item.access_token
+        try:
+            await sync_item(db, item, plaid_service)
+        except PlaidSyncError as e:
+            if _is_retryable(e.error):
+                raise
+            # e.g. ITEM_LOGIN_REQUIRED: record it and wait for the user rather than retrying
+            await db.rollback()
+            await db.execute(update(PlaidItem).where(PlaidItem.id == item_pk).values(error_code=e.error.get("error_code")))
+            await db.commit()
+            raise PermanentJobError(e.error.get("message", "Plaid sync failed"))
+        if item.error_code is not None:
+            item.error_code = None
+            await db.commit()
+        await plaid_service.invalidate_cache(access_token)
+
+    async def handle_item_status(db: AsyncSession, payload: Dict[str, Any]) -> None:
+        item = await get_item(db, payload["item_id"])
+        if item is None:
+            return
+        item.error_code = payload.get("error_code")
+        await db.commit()
+
+    return {SYNC_ITEM_JOB: handle_sync, ITEM_STATUS_JOB: handle_item_status}
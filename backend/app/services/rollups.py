@@ -0,0 +1,145 @@
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.money import to_decimal
+from db.models import Transaction, TransactionRollup
+
+PERIODS = ("day", "week", "month")
+
+# (user_id, period, period_start, bank_account_id)
+RollupKey = Tuple[Any, str, datetime.date, Any]
+
+
+def period_start(value: datetime.date, period: str) -> datetime.date:
+    """The first day of the day/week/month bucket containing value. Weeks start on Monday."""
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    if period == "day":
+        return value
+    if period == "week":
+        return value - datetime.timedelta(days=value.weekday())
+    if period == "month":
+        return value.replace(day=1)
+    raise ValueError(f"Unknown period {period!r}")
+
+
+def next_period_start(value: datetime.date, period: str) -> datetime.date:
+    """The first day of the bucket after the one containing value."""
+    start = period_start(value, period)
+    if period == "day":
+        return start + datetime.timedelta(days=1)
+    if period == "week":
+        return start + datetime.timedelta(days=7)
+    return (start + datetime.timedelta(days=32)).replace(day=1)
+
+
+class RollupDeltas:
+    """Accumulates signed changes to rollup buckets before they are written."""
+
+    def __init__(self):
+        self.buckets: Dict[RollupKey, List[Any]] = defaultdict(lambda: [Decimal(0), Decimal(0), 0])
+
+    def add_totals(self, user_id: Any, bank_account_id: Any, day: datetime.date, inflow: Any, outflow: Any, count: int, sign: int = 1) -> None:
+        inflow, outflow = to_decimal(inflow), to_decimal(outflow)
+        for period in PERIODS:
+            bucket = self.buckets[(user_id, period, period_start(day, period), bank_account_id)]
+            bucket[0] += sign * inflow
+            bucket[1] += sign * outflow
+            bucket[2] += sign * count
+
+    def add_rows(self, rows: Iterable[Dict[str, Any]], sign: int = 1) -> None:
+        for row in rows:
+            amount = to_decimal(row["amount"])
+            inflow = amount if amount > 0 else 0
+            outflow = -amount if amount < 0 else 0
+            self.add_totals(row["user_id"], row["bank_account_id"], row["date"], inflow, outflow, 1, sign)
+
+    def rows(self) -> List[Dict[str, Any]]:
+        # Sorted so concurrent writers lock rollup rows in the same order
+        return [
+            {"user_id": user_id, "period": period, "period_start": start, "bank_account_id": account_id,
+             "inflow": inflow, "outflow": outflow, "transaction_count": count}
+            for (user_id, period, start, account_id), (inflow, outflow, count) in sorted(self.buckets.items(), key=lambda item: str(item[0]))
+            if inflow or outflow or count
+        ]
+
+
+def dialect_insert(db: AsyncSession):
+    """The insert() of the session's dialect, which supports ON CONFLICT on both SQLite and PostgreSQL."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+async def write_deltas(db: AsyncSession, deltas: RollupDeltas) -> None:
+    """Add the accumulated deltas onto the rollup rows with a single upsert executemany."""
+    rows = deltas.rows()
+    if not rows:
+        return
+    table = TransactionRollup.__table__
+    stmt = dialect_insert(db)(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[column.name for column in table.primary_key.columns],
+        set_={
+            "inflow": table.c.inflow + stmt.excluded.inflow,
+            "outflow": table.c.outflow + stmt.excluded.outflow,
+            "transaction_count": table.c.transaction_count + stmt.excluded.transaction_count,
+        },
+    )
+    await db.execute(stmt, rows)
+
+
+async def apply_rollup_changes(db: AsyncSession, added: List[Dict[str, Any]], removed: List[Dict[str, Any]]) -> None:
+    """Transaction writer hook: move the amounts of removed rows out of, and added rows into, their buckets."""
+    deltas = RollupDeltas()
+    deltas.add_rows(added)
+    deltas.add_rows(removed, sign=-1)
+    await write_deltas(db, deltas)
+
+
+async def rebuild_rollups(db: AsyncSession, user_id: Optional[UUID] = None) -> int:
+    """
+    Recompute rollups from the transactions table, for one user or everyone.
+
+    Transactions are aggregated per account and day in the database, so only one row per
+    active account-day comes back. Writes that commit while a rebuild is running can be
+    missed; run it while ingest is paused, or run it again afterwards.
+
+    Returns:
+        Number of rollup rows written
+    """
+    clear = delete(TransactionRollup)
+    day = func.date(Transaction.date)
+    stmt = (
+        select(
+            Transaction.user_id,
+            Transaction.bank_account_id,
+            day,
+            func.sum(case((Transaction.amount > 0, Transaction.amount), else_=0)),
+            func.sum(case((Transaction.amount < 0, -Transaction.amount), else_=0)),
+            func.count(),
+        )
+        .group_by(Transaction.user_id, Transaction.bank_account_id, day)
+    )
+    if user_id is not None:
+        clear = clear.where(TransactionRollup.user_id == user_id)
+        stmt = stmt.where(Transaction.user_id == user_id)
+    await db.execute(clear)
+
+    deltas = RollupDeltas()
+    for row_user_id, account_id, row_day, inflow, outflow, count in await db.execute(stmt):
+        if isinstance(row_day, str):
+            # SQLite's date() returns text
+            row_day = datetime.date.fromisoformat(row_day)
+        deltas.add_totals(row_user_id, account_id, row_day, inflow or 0, outflow or 0, count)
+    rows = deltas.rows()
+    await write_deltas(db, deltas)
+    return len(rows)
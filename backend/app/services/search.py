@@ -0,0 +1,91 @@
+"""
+Full-text search over transaction descriptions.
+
+Each transaction stores search_text, its description as normalize_description reduces it, so
+"SQ *STARBUCKS #0423" is indexed as "starbucks". PostgreSQL indexes it with a GIN index over a
+tsvector and SQLite with an FTS5 table (see db.models); every query term matches as a prefix,
+and results are ordered by relevance, then newest first.
+"""
+import re
+from typing import Any, List, Sequence
+from uuid import UUID
+
+from sqlalchemy import column, func, literal_column, select, table, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import SEARCH_BACKFILL_BATCH_SIZE
+from db.models import SEARCH_VECTOR_SQL, Transaction
+from services.merchants import normalize_description
+
+_TERM = re.compile(r"[a-z0-9]+")
+# At most this many terms are used from a query; the rest are ignored
+MAX_SEARCH_TERMS = 8
+
+_fts = table("transactions_fts", column("rowid"), column("rank"))
+
+
+def search_terms(query: str) -> List[str]:
+    """The words of a query, normalized the same way descriptions are indexed."""
+    return _TERM.findall(normalize_description(query))[:MAX_SEARCH_TERMS]
+
+
+async def search_transactions(db: AsyncSession, user_id: Any, query: str, criteria: Sequence[Any] = (),
+                              limit: int = 20, offset: int = 0) -> List[Transaction]:
+    """
+    A user's transactions containing every term of query, as a word or the start of one.
+
+    Args:
+        db: The session to query through
+        user_id: Whose transactions to search
+        query: Free text, e.g. "starb" or "tim hortons"
+        criteria: Extra WHERE clauses on Transaction, e.g. a date range
+        limit: Maximum number of results
+        offset: Number of results to skip, for paging
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+    stmt = select(Transaction).where(Transaction.user_id == user_id, *criteria)
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        vector = literal_column(SEARCH_VECTOR_SQL)
+        tsquery = func.to_tsquery(literal_column("'simple'::regconfig"), " & ".join(f"{term}:*" for term in terms))
+        stmt = stmt.where(vector.op("@@")(tsquery)).order_by(func.ts_rank(vector, tsquery).desc())
+    elif dialect == "sqlite":
+        stmt = (
+            stmt.join(_fts, _fts.c.rowid == literal_column("transactions.rowid"))
+            # SQLite stores UUIDs as 32 hex digits, which is also how the user_id column was indexed
+            .where(literal_column("transactions_fts").op("MATCH")(
+                f'user_id:"{UUID(str(user_id)).hex}" AND search_text:(' + " ".join(f'"{term}"*' for term in terms) + ")"
+            ))
+            .order_by(_fts.c.rank)
+        )
+    else:
+        # No full-text index to use; correct, but a scan
+        stmt = stmt.where(*(Transaction.search_text.like(f"%{term}%") for term in terms))
+    stmt = stmt.order_by(Transaction.date.desc(), Transaction.id.desc()).limit(limit).offset(offset)
+    return list((await db.scalars(stmt)).all())
+
+
+async def rebuild_search_index(db: AsyncSession, batch_size: int = SEARCH_BACKFILL_BATCH_SIZE) -> int:
+    """
+    Fill in search_text for transactions written before it existed, committing after every batch,
+    then on SQLite rebuild the FTS5 table from the transactions table.
+
+    Returns:
+        Number of rows whose search_text was filled in
+    """
+    total = 0
+    while True:
+        rows = (await db.execute(
+            select(Transaction.id, Transaction.description).where(Transaction.search_text.is_(None)).limit(batch_size)
+        )).all()
+        if not rows:
+            break
+        await db.execute(update(Transaction), [{"id": row.id, "search_text": normalize_description(row.description)} for row in rows])
+        await db.commit()
+        total += len(rows)
+    if db.get_bind().dialect.name == "sqlite":
+        await db.execute(text("INSERT INTO transactions_fts(transactions_fts) VALUES ('rebuild')"))
+        await db.commit()
+    return total
@@ -0,0 +1,324 @@
+import codecs
+import csv
+import datetime
+import html
+import re
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from pydantic import ValidationError
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import IMPORT_BATCH_SIZE, IMPORT_DEDUP_TRACKED_KEYS, IMPORT_MAX_REPORTED_ERRORS
+from db.models import Transaction
+from db.schemas import TransactionCreate
+from services.transaction_writer import insert_transactions, prepare_transaction_row, transaction_dedup_hash
+
+# (row number, TransactionCreate fields other than bank_account_id, parse error)
+ParsedRow = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+
+DATE_COLUMNS = ("date", "transaction date", "posted date", "posting date", "trans date", "value date")
+DESCRIPTION_COLUMNS = ("description", "transaction description", "name", "payee", "merchant", "details", "memo")
+AMOUNT_COLUMNS = ("amount", "transaction amount")
+DEBIT_COLUMNS = ("debit", "debit amount", "withdrawal", "withdrawals", "money out")
+CREDIT_COLUMNS = ("credit", "credit amount", "deposit", "deposits", "money in")
+
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%Y/%m/%d", "%d %b %Y", "%b %d, %Y", "%d-%b-%Y", "%Y%m%d")
+
+# Rows searched for the header line, to skip the preamble some banks put above it
+MAX_PREAMBLE_ROWS = 20
+OFX_READ_SIZE = 64 * 1024
+
+
+class StatementFormatError(ValueError):
+    """Raised when an upload cannot be read as the requested statement format at all."""
+
+
+def parse_amount(value: str) -> Decimal:
+    """Parse "1,234.56", "$-4.50", "(4.50)", "4.50-" or "4.50 DR" style amounts."""
+    text = value.strip().upper().replace(",", "").replace("$", "").replace(" ", "")
+    negative = False
+    if text.startswith("(") and text.endswith(")"):
+        negative, text = True, text[1:-1]
+    if text.endswith("DR"):
+        negative, text = True, text[:-2]
+    elif text.endswith("CR"):
+        text = text[:-2]
+    if text.endswith("-"):
+        negative, text = True, text[:-1]
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount {value!r}")
+    return -amount if negative else amount
+
+
+def parse_date(value: str, date_format: Optional[str] = None) -> datetime.datetime:
+    text = value.strip()
+    if date_format:
+        return datetime.datetime.strptime(text, date_format)
+    try:
+        return datetime.datetime.fromisoformat(text)
+    except ValueError:
+        pass
+    for candidate in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, candidate)
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized date {value!r}")
+
+
+def _find_column(header: Sequence[str], names: Sequence[str]) -> Optional[int]:
+    normalized = [column.strip().lower() for column in header]
+    for name in names:
+        if name in normalized:
+            return normalized.index(name)
+    return None
+
+
+def parse_csv(fileobj: BinaryIO, date_format: Optional[str] = None, negate_amounts: bool = False) -> Iterator[ParsedRow]:
+    """
+    Parse a bank CSV export row by row.
+
+    Columns are matched by common header names. Either a signed amount column or separate
+    debit/credit columns are accepted; amounts are positive for money coming in unless
+    negate_amounts is set.
+    """
+    # Decoded line by line rather than through io.TextIOWrapper: before Python 3.11 the
+    # SpooledTemporaryFile behind an UploadFile has no readable() and cannot be wrapped
+    lines = codecs.iterdecode(iter(fileobj.readline, b""), "utf-8-sig", errors="replace")
+    reader = csv.reader(lines)
+
+    columns = None
+    for header in islice(reader, MAX_PREAMBLE_ROWS):
+        date_column = _find_column(header, DATE_COLUMNS)
+        description_column = _find_column(header, DESCRIPTION_COLUMNS)
+        amount_column = _find_column(header, AMOUNT_COLUMNS)
+        debit_column = _find_column(header, DEBIT_COLUMNS)
+        credit_column = _find_column(header, CREDIT_COLUMNS)
+        if date_column is not None and description_column is not None and (amount_column is not None or debit_column is not None or credit_column is not None):
+            columns = (date_column, description_column, amount_column, debit_column, credit_column)
+            break
+    if columns is None:
+        raise StatementFormatError("Could not find date, description and amount columns in the CSV header")
+    date_column, description_column, amount_column, debit_column, credit_column = columns
+
+    def cell(row: List[str], index: Optional[int]) -> str:
+        return row[index].strip() if index is not None and index < len(row) else ""
+
+    for row in reader:
+        line = reader.line_num
+        if not any(value.strip() for value in row):
+            continue
+        try:
+            if amount_column is not None and cell(row, amount_column):
+                amount = parse_amount(cell(row, amount_column))
+            else:
+                debit, credit = cell(row, debit_column), cell(row, credit_column)
+                if not debit and not credit:
+                    raise ValueError("Missing amount")
+                amount = (parse_amount(credit) if credit else 0) - (abs(parse_amount(debit)) if debit else 0)
+            if negate_amounts:
+                amount = -amount
+            yield line, {
+                "date": parse_date(cell(row, date_column), date_format),
+                "description": cell(row, description_column),
+                "amount": amount,
+            }, None
+        except ValueError as e:
+            yield line, None, str(e)
+
+
+_OFX_TRANSACTION_END = re.compile(r"</STMTTRN>", re.IGNORECASE)
+_OFX_TRANSACTION_START = re.compile(r"<STMTTRN>", re.IGNORECASE)
+# OFX 1.x is SGML and leaves element tags unclosed, so read each value up to the next tag or line end
+_OFX_ELEMENT = re.compile(r"<([A-Za-z0-9.]+)>([^<\r\n]*)")
+
+
+def _ofx_transaction(block: str) -> Dict[str, Any]:
+    values: Dict[str, str] = {}
+    for match in _OFX_ELEMENT.finditer(block):
+        values.setdefault(match.group(1).upper(), html.unescape(match.group(2).strip()))
+    posted = values.get("DTPOSTED", "")
+    if len(posted) < 8 or not posted[:8].isdigit():
+        raise ValueError(f"Invalid DTPOSTED {posted!r}")
+    if "TRNAMT" not in values:
+        raise ValueError("Missing TRNAMT")
+    return {
+        "date": datetime.datetime.strptime(posted[:8], "%Y%m%d"),
+        "description": values.get("NAME") or values.get("MEMO") or values.get("PAYEE") or "",
+        "amount": parse_amount(values["TRNAMT"]),
+    }
+
+
+def parse_ofx(fileobj: BinaryIO, negate_amounts: bool = False) -> Iterator[ParsedRow]:
+    """
+    Parse OFX/QFX (SGML 1.x or XML 2.x) statement transactions as the file is read.
+
+    Only the text of the transaction currently being assembled is buffered. Rows are numbered
+    by their position among the file's transactions.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buffer = ""
+    position = 0
+    found_any = False
+    while True:
+        chunk = fileobj.read(OFX_READ_SIZE)
+        buffer += decoder.decode(chunk, final=not chunk)
+        while True:
+            end = _OFX_TRANSACTION_END.search(buffer)
+            if end is None:
+                break
+            block, buffer = buffer[:end.start()], buffer[end.end():]
+            start = None
+            for start in _OFX_TRANSACTION_START.finditer(block):
+                pass
+            if start is None:
+                continue
+            found_any = True
+            position += 1
+            try:
+                values = _ofx_transaction(block[start.end():])
+                if negate_amounts:
+                    values["amount"] = -values["amount"]
+                yield position, values, None
+            except ValueError as e:
+                yield position, None, str(e)
+        # Drop everything before the transaction being assembled, keeping a tail in case a tag is split
+        last_start = None
+        for last_start in _OFX_TRANSACTION_START.finditer(buffer):
+            pass
+        buffer = buffer[last_start.start():] if last_start is not None else buffer[-16:]
+        if not chunk:
+            break
+    if not found_any:
+        raise StatementFormatError("No <STMTTRN> transactions found in the OFX file")
+
+
+class _OccurrenceCounter:
+    """
+    Counts how often each transaction identity has appeared so far in a statement.
+
+    Bounded LRU: statements are ordered by date, so identities from long-past days fall out first.
+    """
+
+    def __init__(self, max_keys: int = IMPORT_DEDUP_TRACKED_KEYS):
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+        self._max_keys = max_keys
+
+    def next(self, key: str) -> int:
+        # 64 bits of the sha256 hex digest are plenty to tell identities apart within one statement
+        key = key[:16]
+        count = self._counts.pop(key, 0)
+        self._counts[key] = count + 1
+        if len(self._counts) > self._max_keys:
+            self._counts.popitem(last=False)
+        return count
+
+
+def _take(rows: Iterator[ParsedRow], size: int) -> List[ParsedRow]:
+    return list(islice(rows, size))
+
+
+async def import_statement(db: AsyncSession, user_id: UUID, bank_account_id: UUID, rows: Iterator[ParsedRow],
+                           batch_size: int = IMPORT_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Import parsed statement rows into a bank account, skipping rows already recorded.
+
+    Rows are pulled from the parser batch_size at a time (parsing runs in a worker thread),
+    checked against existing dedup hashes for the account with one indexed lookup per batch,
+    and inserted and committed per batch. Memory therefore depends on the batch size, not the
+    statement size, and an interrupted import can simply be run again.
+
+    Returns:
+        Counts of parsed, imported, duplicate and failed rows, plus the first errors
+    """
+    occurrences = _OccurrenceCounter()
+    result: Dict[str, Any] = {"parsed": 0, "imported": 0, "duplicates": 0, "failed": 0, "errors": []}
+
+    def fail(row_number: int, error: str) -> None:
+        result["failed"] += 1
+        if len(result["errors"]) < IMPORT_MAX_REPORTED_ERRORS:
+            result["errors"].append({"row": row_number, "error": error})
+
+    while True:
+        batch = await run_in_threadpool(_take, rows, batch_size)
+        if not batch:
+            break
+
+        candidates: Dict[str, Dict[str, Any]] = {}
+        for row_number, payload, error in batch:
+            if error is not None:
+                fail(row_number, error)
+                continue
+            try:
+                transaction = TransactionCreate(bank_account_id=bank_account_id, **payload)
+            except ValidationError as e:
+                fail(row_number, "; ".join(err["msg"] for err in e.errors()))
+                continue
+            result["parsed"] += 1
+            identity = transaction_dedup_hash(bank_account_id, transaction.date, payload["amount"], transaction.description)
+            occurrence = occurrences.next(identity)
+            dedup_hash = identity if occurrence == 0 else transaction_dedup_hash(
+                bank_account_id, transaction.date, payload["amount"], transaction.description, occurrence)
+            candidates[dedup_hash] = {
+                "user_id": user_id,
+                "bank_account_id": bank_account_id,
+                "description": transaction.description,
+                "amount": payload["amount"],
+                "date": transaction.date,
+                "dedup_hash": dedup_hash,
+            }
+
+        if not candidates:
+            continue
+        existing = set(await db.scalars(
+            select(Transaction.dedup_hash)
+            .where(Transaction.bank_account_id == bank_account_id, Transaction.dedup_hash.in_(candidates.keys()))
+        ))
+        new_rows = [prepare_transaction_row(row) for dedup_hash, row in candidates.items() if dedup_hash not in existing]
+        result["duplicates"] += len(candidates) - len(new_rows)
+        if new_rows:
+            await insert_transactions(db, new_rows)
+            await db.commit()
+            result["imported"] += len(new_rows)
+    return result
+
+
+async def backfill_dedup_hashes(db: AsyncSession, batch_size: int = IMPORT_BATCH_SIZE) -> int:
+    """
+    Hash transactions written before dedup_hash existed, committing after every batch.
+
+    Rows are walked per account in date order so repeated identical rows get increasing
+    occurrence numbers, exactly as an import of the same rows would.
+
+    Returns:
+        Number of rows hashed
+    """
+    occurrences = _OccurrenceCounter()
+    table = Transaction.__table__
+    total = 0
+    while True:
+        rows = (await db.execute(
+            select(table.c.id, table.c.bank_account_id, table.c.date, table.c.amount, table.c.description)
+            .where(table.c.dedup_hash.is_(None))
+            .order_by(table.c.bank_account_id, table.c.date, table.c.id)
+            .limit(batch_size)
+        )).all()
+        if not rows:
+            return total
+        updates = []
+        for row in rows:
+            identity = transaction_dedup_hash(row.bank_account_id, row.date, row.amount, row.description)
+            occurrence = occurrences.next(identity)
+            updates.append({"id": row.id, "dedup_hash": identity if occurrence == 0 else transaction_dedup_hash(
+                row.bank_account_id, row.date, row.amount, row.description, occurrence)})
+        await db.execute(update(Transaction), updates)
+        await db.commit()
+        total += len(updates)
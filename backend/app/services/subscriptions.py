@@ -0,0 +1,243 @@
+"""
+Recurring payment (subscription) detection.
+
+Outgoing payments are grouped by account and normalized merchant. Each group keeps its latest
+SUBSCRIPTION_HISTORY_LENGTH payments as sorted day and amount arrays on its subscriptions row,
+so the transaction writer can fold new, edited and deleted payments into just the groups they
+belong to and re-run detection on those, without reading any other history.
+
+A group is recurring when the gaps between its payment days sit near one of PERIODS and its
+amounts sit near their median.
+"""
+import bisect
+import calendar
+import datetime
+import uuid
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import BigInteger, delete, select, tuple_, type_coerce, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import SUBSCRIPTION_HISTORY_LENGTH, SUBSCRIPTION_LOOKBACK_DAYS
+from app.core.money import from_minor, to_minor
+from db.models import Subscription, Transaction
+from services.job_queue import JobHandler, PermanentJobError
+from services.merchants import normalize_description
+from services.rollups import dialect_insert
+
+DETECT_SUBSCRIPTIONS_JOB = "subscriptions.detect"
+
+# (account id, merchant) within one user, and (day ordinal, amount in minor units)
+GroupKey = Tuple[Any, Any, str]
+Payment = Tuple[int, int]
+
+
+class Period(NamedTuple):
+    name: str
+    days: float  # Average length
+    tolerance: int  # Days a gap may differ from the average and still count
+    months: int  # Calendar months per period, 0 for periods counted in days
+
+
+PERIODS = [
+    Period("weekly", 7, 1, 0),
+    Period("biweekly", 14, 2, 0),
+    Period("monthly", 30.44, 3, 1),
+    Period("quarterly", 91.31, 7, 3),
+    Period("yearly", 365.25, 10, 12),
+]
+PERIODS_BY_NAME = {period.name: period for period in PERIODS}
+MIN_PAYMENTS = 3
+# Share of gaps, and of amounts, that must fit the pattern; the rest may be late, early or one-off
+REGULAR_SHARE = 0.75
+AMOUNT_TOLERANCE = 0.1  # Relative to the median amount
+
+
+class Detection(NamedTuple):
+    period: Period
+    amount: int  # Median, in minor units
+    next_date: datetime.date
+    next_amount: int  # The latest amount, in minor units
+
+
+def _add_months(day: datetime.date, months: int) -> datetime.date:
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def next_payment_date(last: datetime.date, period: Period) -> datetime.date:
+    if period.months:
+        return _add_months(last, period.months)
+    return last + datetime.timedelta(days=round(period.days))
+
+
+def detect_recurring(days: Sequence[int], amounts: Sequence[int]) -> Optional[Detection]:
+    """
+    The recurring pattern in a group's payments, if there is one.
+
+    Args:
+        days: Payment days as date ordinals, sorted
+        amounts: Payment amounts in minor units, aligned with days
+    """
+    paid_on = np.unique(np.asarray(days, dtype=np.int64))
+    if len(paid_on) < MIN_PAYMENTS:
+        return None
+    # Several payments on one day count as one occurrence
+    gaps = np.diff(paid_on)
+    median_gap = float(np.median(gaps))
+    period = next((period for period in PERIODS if abs(median_gap - period.days) <= period.tolerance), None)
+    if period is None or np.mean(np.abs(gaps - period.days) <= period.tolerance) < REGULAR_SHARE:
+        return None
+
+    amounts = np.asarray(amounts, dtype=np.int64)
+    typical = int(np.median(amounts))
+    if np.mean(np.abs(amounts - typical) <= abs(typical) * AMOUNT_TOLERANCE) < REGULAR_SHARE:
+        return None
+    last = datetime.date.fromordinal(int(paid_on[-1]))
+    return Detection(period, typical, next_payment_date(last, period), int(amounts[-1]))
+
+
+def is_lapsed(subscription: Subscription, today: datetime.date) -> bool:
+    """Whether the predicted payment is overdue by more than the period's tolerance."""
+    period = PERIODS_BY_NAME[subscription.period]
+    return today > subscription.next_date + datetime.timedelta(days=period.tolerance)
+
+
+def merge_payments(days: Sequence[int], amounts: Sequence[int], added: Sequence[Payment], removed: Sequence[Payment],
+                   limit: int = SUBSCRIPTION_HISTORY_LENGTH) -> Tuple[List[int], List[int]]:
+    """
+    Apply added and removed payments to a group's sorted arrays, keeping the latest limit of them.
+
+    A removed payment that is not in the arrays (it had already been dropped as too old) is ignored.
+    """
+    payments = list(zip(days, amounts))
+    for payment in removed:
+        if payment in payments:
+            payments.remove(payment)
+    for payment in added:
+        bisect.insort(payments, tuple(payment))
+    payments = payments[-limit:]
+    return [day for day, _ in payments], [amount for _, amount in payments]
+
+
+def _series_values(days: List[int], amounts: List[int]) -> Dict[str, Any]:
+    """Column values for a group with these payments."""
+    detection = detect_recurring(days, amounts)
+    return {
+        "days": days,
+        "amounts": amounts,
+        "is_recurring": detection is not None,
+        "period": detection.period.name if detection else None,
+        "amount": from_minor(detection.amount) if detection else None,
+        "last_date": datetime.date.fromordinal(days[-1]) if days else None,
+        "next_date": detection.next_date if detection else None,
+        "next_amount": from_minor(detection.next_amount) if detection else None,
+        "updated_at": datetime.datetime.utcnow(),
+    }
+
+
+def _payment(row: Dict[str, Any]) -> Optional[Tuple[Tuple[Any, Any, str], Payment]]:
+    minor = to_minor(row["amount"])
+    if minor >= 0:
+        return None
+    merchant = row.get("search_text") or normalize_description(row["description"])
+    if not merchant:
+        return None
+    return (row["user_id"], row["bank_account_id"], merchant), (row["date"].toordinal(), minor)
+
+
+async def apply_subscription_changes(db: AsyncSession, added: List[Dict[str, Any]], removed: List[Dict[str, Any]]) -> None:
+    """
+    Transaction writer hook: fold payments into their groups and re-detect only those groups.
+
+    Missing groups are created with INSERT ... ON CONFLICT DO NOTHING, then every affected group
+    is locked with SELECT ... FOR UPDATE in key order, so concurrent writers neither collide on
+    creation nor lose each other's payments.
+    """
+    changes: Dict[Tuple[Any, Any, str], Tuple[Counter, Counter]] = defaultdict(lambda: (Counter(), Counter()))
+    for rows, side in ((added, 0), (removed, 1)):
+        for row in rows:
+            payment = _payment(row)
+            if payment is not None:
+                changes[payment[0]][side][payment[1]] += 1
+    for key, (adds, removes) in list(changes.items()):
+        # An update that left the payment as it was (e.g. a new category) changes nothing here
+        unchanged = adds & removes
+        adds.subtract(unchanged)
+        removes.subtract(unchanged)
+        if not +adds and not +removes:
+            del changes[key]
+    if not changes:
+        return
+
+    keys = sorted(changes, key=str)
+    table = Subscription.__table__
+    now = datetime.datetime.utcnow()
+    await db.execute(
+        dialect_insert(db)(table).on_conflict_do_nothing(index_elements=["user_id", "bank_account_id", "merchant"]),
+        [{"id": uuid.uuid4(), "user_id": user_id, "bank_account_id": account_id, "merchant": merchant,
+          "days": [], "amounts": [], "is_recurring": False, "updated_at": now} for user_id, account_id, merchant in keys],
+    )
+    groups = await db.execute(
+        select(table.c.id, table.c.user_id, table.c.bank_account_id, table.c.merchant, table.c.days, table.c.amounts)
+        .where(tuple_(table.c.user_id, table.c.bank_account_id, table.c.merchant).in_(keys))
+        .order_by(table.c.user_id, table.c.bank_account_id, table.c.merchant)
+        .with_for_update()
+    )
+    updates = []
+    for group in groups:
+        adds, removes = changes[(group.user_id, group.bank_account_id, group.merchant)]
+        days, amounts = merge_payments(group.days, group.amounts, sorted((+adds).elements()), list((+removes).elements()))
+        updates.append({"id": group.id, **_series_values(days, amounts)})
+    if updates:
+        await db.execute(update(Subscription), updates)
+
+
+async def detect_subscriptions(db: AsyncSession, user_id: UUID, lookback_days: int = SUBSCRIPTION_LOOKBACK_DAYS) -> int:
+    """
+    Rebuild a user's groups from their last lookback_days of payments, e.g. for history written
+    before detection existed. Payments written while it runs can be missed; the caller commits.
+
+    Returns:
+        Number of recurring payments found
+    """
+    since = datetime.datetime.utcnow() - datetime.timedelta(days=lookback_days)
+    payments = await db.execute(
+        select(Transaction.bank_account_id, Transaction.search_text, Transaction.description, Transaction.date,
+               type_coerce(Transaction.amount, BigInteger))
+        .where(Transaction.user_id == user_id, Transaction.amount < 0, Transaction.date >= since)
+        .order_by(Transaction.date, Transaction.id)
+    )
+    series: Dict[Tuple[Any, str], Tuple[List[int], List[int]]] = {}
+    for account_id, search_text, description, date, minor in payments:
+        merchant = search_text or normalize_description(description)
+        if merchant:
+            days, amounts = series.setdefault((account_id, merchant), ([], []))
+            days.append(date.toordinal())
+            amounts.append(minor)
+
+    await db.execute(delete(Subscription).where(Subscription.user_id == user_id))
+    rows = [
+        {"id": uuid.uuid4(), "user_id": user_id, "bank_account_id": account_id, "merchant": merchant,
+         **_series_values(days[-SUBSCRIPTION_HISTORY_LENGTH:], amounts[-SUBSCRIPTION_HISTORY_LENGTH:])}
+        for (account_id, merchant), (days, amounts) in series.items()
+    ]
+    if rows:
+        await db.execute(Subscription.__table__.insert(), rows)
+    return sum(row["is_recurring"] for row in rows)
+
+
+def subscription_job_handlers() -> Dict[str, JobHandler]:
+    async def handle_detect(db: AsyncSession, payload: Dict[str, Any]) -> None:
+        try:
+            user_id = UUID(payload["user_id"])
+        except (KeyError, ValueError) as e:
+            raise PermanentJobError(f"Bad subscription detection payload: {payload!r}") from e
+        await detect_subscriptions(db, user_id)
+        await db.commit()
+
+    return {DETECT_SUBSCRIPTIONS_JOB: handle_detect}
@@ -0,0 +1,145 @@
+import csv
+import datetime
+import io
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.config import EXPORT_BATCH_SIZE
+from db.models import Transaction
+
+EXPORT_COLUMNS = ("id", "user_id", "bank_account_id", "date", "description", "amount")
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def export_query(user_id: Any, bank_account_id: Optional[Any] = None, start_date: Optional[datetime.datetime] = None,
+                 end_date: Optional[datetime.datetime] = None) -> Select:
+    """Core select over the exported columns, in the same (date, id) order as the listing endpoint."""
+    table = Transaction.__table__
+    stmt = select(*(table.c[name] for name in EXPORT_COLUMNS)).where(table.c.user_id == user_id)
+    if bank_account_id is not None:
+        stmt = stmt.where(table.c.bank_account_id == bank_account_id)
+    if start_date is not None:
+        stmt = stmt.where(table.c.date >= start_date)
+    if end_date is not None:
+        stmt = stmt.where(table.c.date < end_date)
+    return stmt.order_by(table.c.date, table.c.id)
+
+
+async def stream_partitions(session_factory: async_sessionmaker, stmt: Select, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[Sequence[Any]]:
+    """
+    Yield result rows in lists of at most batch_size, reading through a server-side cursor.
+
+    The session is opened here rather than taken from the request, because a StreamingResponse
+    body keeps running after request-scoped dependencies have been closed.
+    """
+    async with session_factory() as db:
+        result = await db.stream(stmt.execution_options(yield_per=batch_size))
+        async for partition in result.partitions():
+            yield partition
+
+
+def _row_values(row: Any) -> Dict[str, Any]:
+    return {
+        "id": str(row.id),
+        "user_id": str(row.user_id),
+        "bank_account_id": str(row.bank_account_id),
+        "date": row.date.isoformat() if row.date is not None else None,
+        "description": row.description,
+        "amount": float(row.amount),
+    }
+
+
+async def to_csv(partitions: AsyncIterator[Sequence[Any]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    async for partition in partitions:
+        for row in partition:
+            values = _row_values(row)
+            writer.writerow([values[name] for name in EXPORT_COLUMNS])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def to_ndjson(partitions: AsyncIterator[Sequence[Any]]) -> AsyncIterator[bytes]:
+    async for partition in partitions:
+        yield "".join(json.dumps(_row_values(row)) + "\n" for row in partition).encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def to_parquet(partitions: AsyncIterator[Sequence[Any]]) -> AsyncIterator[bytes]:
+    """Write each partition as its own row group, so only one batch is ever held in memory."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id", pa.string()),
+        ("user_id", pa.string()),
+        ("bank_account_id", pa.string()),
+        ("date", pa.timestamp("us")),
+        ("description", pa.string()),
+        ("amount", pa.float64()),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        async for partition in partitions:
+            columns = {
+                "id": [str(row.id) for row in partition],
+                "user_id": [str(row.user_id) for row in partition],
+                "bank_account_id": [str(row.bank_account_id) for row in partition],
+                "date": [row.date for row in partition],
+                "description": [row.description for row in partition],
+                "amount": [float(row.amount) for row in partition],
+            }
+            writer.write_table(pa.table(columns, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+SERIALIZERS = {"csv": to_csv, "ndjson": to_ndjson, "parquet": to_parquet}
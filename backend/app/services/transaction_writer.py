@@ -0,0 +1,182 @@
+import datetime
+import hashlib
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Sequence
+from uuid import UUID
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import TRANSACTION_INSERT_BATCH_SIZE
+from db.models import Transaction
+from services.balances import apply_balance_changes
+from services.budgets import apply_budget_changes
+from services.categorization import assign_categories
+from services.merchants import normalize_description
+from services.rollups import apply_rollup_changes
+from services.subscriptions import apply_subscription_changes
+
+# Derived state kept in step with the transactions table. Each hook runs on the writer's session,
+# in the same database transaction, with the rows a write added and removed; an update removes
+# the old version of a row and adds the new one.
+TransactionHook = Callable[[AsyncSession, List[Dict[str, Any]], List[Dict[str, Any]]], Awaitable[None]]
+TRANSACTION_HOOKS: List[TransactionHook] = [
+    apply_rollup_changes, apply_balance_changes, apply_subscription_changes, apply_budget_changes,
+]
+
+
+def _batches(rows: Sequence[Dict[str, Any]], size: int) -> Iterator[Sequence[Dict[str, Any]]]:
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+async def _run_hooks(db: AsyncSession, added: List[Dict[str, Any]], removed: List[Dict[str, Any]]) -> None:
+    for hook in TRANSACTION_HOOKS:
+        await hook(db, added, removed)
+
+
+async def _current_rows(db: AsyncSession, transaction_ids: Sequence[UUID], batch_size: int) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    for batch in _batches(list(transaction_ids), batch_size):
+        result = await db.execute(select(Transaction.__table__).where(Transaction.id.in_(batch)))
+        rows.extend(dict(row._mapping) for row in result)
+    return rows
+
+
+def transaction_dedup_hash(bank_account_id: Any, date: datetime.datetime, amount: Any, description: str, occurrence: int = 0) -> str:
+    """
+    Identity of a transaction for duplicate detection across sources.
+
+    occurrence tells apart genuinely repeated rows (two identical coffees on one day): the nth
+    identical row of an account is occurrence n - 1, whichever path wrote it.
+    """
+    day = date.date() if isinstance(date, datetime.datetime) else date
+    cents = Decimal(str(amount)).quantize(Decimal("0.01"))
+    key = f"{bank_account_id}|{day.isoformat()}|{cents}|{normalize_description(description)}|{occurrence}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def prepare_transaction_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fill in client-side defaults so every row carries its own id, date and search text.
+
+    The dedup hash depends on the rows already stored, so insert_transactions assigns it.
+
+    Args:
+        row: Column values for a new transactions row
+
+    Returns:
+        The same dictionary, with id, date and search_text populated if they were missing
+    """
+    if row.get("id") is None:
+        row["id"] = uuid.uuid4()
+    if row.get("date") is None:
+        row["date"] = datetime.datetime.utcnow()
+    if row.get("search_text") is None:
+        row["search_text"] = normalize_description(row["description"])
+    return row
+
+
+async def assign_dedup_hashes(db: AsyncSession, rows: Sequence[Dict[str, Any]], batch_size: int = TRANSACTION_INSERT_BATCH_SIZE) -> None:
+    """
+    Give each row without a dedup_hash the first occurrence of its identity not yet taken.
+
+    Identical rows are numbered after those already stored and then in the order given, as an
+    import of the same rows would number them. Usually one indexed lookup per batch_size rows;
+    identities with stored repeats beyond the window looked at take another round.
+    """
+    supplied = set()
+    pending: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for row in rows:
+        if row.get("dedup_hash") is not None:
+            supplied.add(row["dedup_hash"])
+        else:
+            pending[transaction_dedup_hash(row["bank_account_id"], row["date"], row["amount"], row["description"])].append(row)
+    offsets = dict.fromkeys(pending, 0)
+    while pending:
+        # The next len(group) occurrences of each identity not yet looked at
+        window = {
+            identity: [transaction_dedup_hash(group[0]["bank_account_id"], group[0]["date"], group[0]["amount"],
+                                              group[0]["description"], occurrence) if occurrence else identity
+                       for occurrence in range(offsets[identity], offsets[identity] + len(group))]
+            for identity, group in pending.items()
+        }
+        candidates = [dedup_hash for hashes in window.values() for dedup_hash in hashes]
+        taken = set(supplied)
+        for batch in _batches(candidates, batch_size):
+            taken.update(await db.scalars(select(Transaction.dedup_hash).where(Transaction.dedup_hash.in_(batch))))
+        still_pending: Dict[str, List[Dict[str, Any]]] = {}
+        for identity, group in pending.items():
+            free = [dedup_hash for dedup_hash in window[identity] if dedup_hash not in taken]
+            for row, dedup_hash in zip(group, free):
+                row["dedup_hash"] = dedup_hash
+            if len(group) > len(free):
+                still_pending[identity] = group[len(free):]
+                offsets[identity] += len(group)
+        pending = still_pending
+
+
+async def insert_transactions(db: AsyncSession, rows: List[Dict[str, Any]], batch_size: int = TRANSACTION_INSERT_BATCH_SIZE) -> None:
+    """
+    Insert transaction rows in batched executemany INSERT statements.
+
+    The rows are written on the caller's session and transaction; committing is left to the caller
+    so a whole ingest either lands or rolls back together.
+
+    Args:
+        db: The session to write through
+        rows: Column values for each new row, as produced by prepare_transaction_row. Rows
+            without a category are categorized first (see services.categorization), and rows
+            without a dedup_hash get one from assign_dedup_hashes
+        batch_size: Number of rows sent per INSERT executemany
+    """
+    table = Transaction.__table__
+    rows = [prepare_transaction_row(row) for row in rows]
+    await assign_dedup_hashes(db, rows, batch_size)
+    await assign_categories(db, rows)
+    for batch in _batches(rows, batch_size):
+        # Core executemany without RETURNING: SQLAlchemy hands the batch to the driver's executemany
+        # (sqlite3's loop over one prepared statement, asyncpg's pipelined prepared statement);
+        # it does not render multi-row VALUES
+        await db.execute(table.insert(), list(batch))
+    await _run_hooks(db, rows, [])
+
+
+async def update_transactions(db: AsyncSession, rows: List[Dict[str, Any]], batch_size: int = TRANSACTION_INSERT_BATCH_SIZE) -> None:
+    """
+    Update existing transactions by primary key in batched executemany statements.
+
+    Args:
+        db: The session to write through
+        rows: Changed column values for each row; every dictionary must include "id"
+        batch_size: Number of rows sent per UPDATE executemany
+    """
+    for row in rows:
+        # Only new rows are categorized automatically; an update keeps the category it has
+        row.pop("category_hint", None)
+        if "description" in row:
+            row["search_text"] = normalize_description(row["description"])
+    previous = {row["id"]: row for row in await _current_rows(db, [row["id"] for row in rows], batch_size)} if TRANSACTION_HOOKS else {}
+    for batch in _batches(rows, batch_size):
+        await db.execute(update(Transaction), list(batch))
+    if previous:
+        updated = [{**previous[row["id"]], **row} for row in rows if row["id"] in previous]
+        await _run_hooks(db, updated, [previous[row["id"]] for row in updated])
+
+
+async def delete_transactions(db: AsyncSession, transaction_ids: Sequence[UUID], batch_size: int = TRANSACTION_INSERT_BATCH_SIZE) -> None:
+    """
+    Delete transactions by primary key.
+
+    Args:
+        db: The session to write through
+        transaction_ids: IDs of the rows to delete
+        batch_size: Maximum number of IDs per DELETE ... IN statement
+    """
+    previous = await _current_rows(db, transaction_ids, batch_size) if TRANSACTION_HOOKS else []
+    for batch in _batches(list(transaction_ids), batch_size):
+        await db.execute(delete(Transaction).where(Transaction.id.in_(batch)))
+    if previous:
+        await _run_hooks(db, [], previous)
@@ -0,0 +1,40 @@
+import asyncio
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from db.base import Base
+from db import models  # noqa: F401  (registers every table on Base.metadata)
+from db.session import create_async_db_engine
+
+def _run_against_fresh_db(scenario, with_factory):
+    async def main():
+        engine = create_async_db_engine("sqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+        try:
+            if with_factory:
+                return await scenario(session_factory)
+            async with session_factory() as session:
+                return await scenario(session)
+        finally:
+            await engine.dispose()
+    return asyncio.run(main())
+
+@pytest.fixture
+def run_in_db():
+    """
+    Run an async scenario against a fresh in-memory SQLite database.
+
+    Usage: run_in_db(scenario) where scenario is `async def scenario(session) -> result`.
+    """
+    return lambda scenario: _run_against_fresh_db(scenario, with_factory=False)
+
+@pytest.fixture
+def run_with_sessions():
+    """
+    Like run_in_db, for code that opens its own sessions.
+
+    Usage: run_with_sessions(scenario) where scenario is `async def scenario(session_factory) -> result`.
+    """
+    return lambda scenario: _run_against_fresh_db(scenario, with_factory=True)
@@ -1,6 +1,6 @@
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from unittest.mock import MagicMock
 from uuid import uuid4, UUID
 from datetime import datetime, timezone
@@ -14,7 +14,7 @@ client = TestClient(app)
 # Fixture to provide a MagicMock for the database session.
 @pytest.fixture
 def mock_db():
-    db = MagicMock(spec=Session)
+    db = MagicMock(spec=AsyncSession)
     yield db
 
 # Automatically clear dependency overrides after each test.
@@ -38,7 +38,7 @@ def test_create_account_success(mock_db):
         created_at=datetime.now(timezone.utc)
     )
     # When querying for the user, return fake_user.
-    mock_db.query(User).filter().first.return_value = fake_user
+    mock_db.scalar.return_value = fake_user
 
     # Prepare expected values for the created bank account.
     fake_account_id = uuid4()
@@ -72,11 +72,14 @@ def test_create_account_success(mock_db):
     except ValueError:
         pytest.fail("Invalid UUID format for id")
     assert "created_at" in data
+    # Accounts default to the owner's currency
+    assert data["currency"] == "CAD"
+    assert data["balance"] == 100.0
 
 def test_create_account_user_not_found(mock_db):
     app.dependency_overrides[get_db] = lambda: mock_db
     # Simulate that the user is not found.
-    mock_db.query(User).filter().first.return_value = None
+    mock_db.scalar.return_value = None
 
     fake_user_id = uuid4()
     account_data = {
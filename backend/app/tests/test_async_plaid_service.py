@@ -0,0 +1,162 @@
+import asyncio
+import httpx
+import json
+
+from services.async_plaid_service import AsyncPlaidService, CircuitBreaker
+
+async def no_sleep(seconds):
+    no_sleep.delays.append(seconds)
+
+def make_service(handler, **kwargs):
+    no_sleep.delays = []
+    client = httpx.AsyncClient(base_url="https://plaid.test", transport=httpx.MockTransport(handler))
+    options = {"backoff_base": 0.01, "max_retries": 3, "sleep": no_sleep}
+    options.update(kwargs)
+    return AsyncPlaidService(base_url="https://plaid.test", client=client, **options)
+
+def test_retries_rate_limited_calls_honoring_retry_after():
+    calls = []
+
+    def handler(request):
+        calls.append(json.loads(request.content))
+        if len(calls) < 3:
+            return httpx.Response(429, headers={"Retry-After": "2"}, json={"error_code": "RATE_LIMIT_EXCEEDED", "error_message": "slow down"})
+        return httpx.Response(200, json={"accounts": [{"account_id": "a1"}], "item": {"item_id": "i1"}})
+
+    service = make_service(handler)
+    result = asyncio.run(service.get_account_balances("access-token"))
+
+    assert result["accounts"] == [{"account_id": "a1"}]
+    assert len(calls) == 3
+    assert calls[0]["access_token"] == "access-token"
+    assert no_sleep.delays == [2, 2]
+
+def test_client_errors_are_not_retried():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(400, json={"error_code": "ITEM_LOGIN_REQUIRED", "error_type": "ITEM_ERROR", "error_message": "login required"})
+
+    service = make_service(handler)
+    result = asyncio.run(service.get_account_balances("access-token"))
+
+    assert len(calls) == 1
+    assert result["error"]["status_code"] == 400
+    assert result["error"]["error_code"] == "ITEM_LOGIN_REQUIRED"
+    assert service.breaker.state == CircuitBreaker.CLOSED
+
+def test_circuit_opens_after_repeated_failures():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503, json={"error_message": "unavailable"})
+
+    service = make_service(handler, max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+
+    async def run():
+        return [await service.get_account_balances("access-token") for _ in range(3)]
+
+    results = asyncio.run(run())
+    assert len(calls) == 2
+    assert results[-1]["error"]["error_code"] == "CIRCUIT_OPEN"
+    assert service.breaker.state == CircuitBreaker.OPEN
+
+def test_deadline_bounds_slow_calls():
+    async def handler(request):
+        await asyncio.sleep(1)
+        return httpx.Response(200, json={})
+
+    service = make_service(handler, deadline=0.05)
+    result = asyncio.run(service.get_account_balances("access-token"))
+    assert result["error"]["status_code"] == 504
+    assert result["error"]["error_code"] == "TIMEOUT"
+
+def test_get_transactions_follows_pagination():
+    def handler(request):
+        body = json.loads(request.content)
+        offset = body["options"]["offset"]
+        page = [{"transaction_id": f"t{i}"} for i in range(offset, min(offset + 2, 5))]
+        return httpx.Response(200, json={"accounts": [], "transactions": page, "total_transactions": 5, "item": {}})
+
+    service = make_service(handler)
+    result = asyncio.run(service.get_transactions("access-token", page_size=2))
+    assert [t["transaction_id"] for t in result["transactions"]] == ["t0", "t1", "t2", "t3", "t4"]
+
+def test_per_item_concurrency_is_limited():
+    in_flight = {"now": 0, "max": 0}
+
+    async def handler(request):
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await asyncio.sleep(0.01)
+        in_flight["now"] -= 1
+        return httpx.Response(200, json={"accounts": [], "item": {}})
+
+    service = make_service(handler, per_item_concurrency=1)
+
+    async def run():
+        await asyncio.gather(*(service.get_account_balances("same-item") for _ in range(4)))
+
+    asyncio.run(run())
+    assert in_flight["max"] == 1
+    assert service._item_slots == {}
+
+def test_refresh_items_fans_out_and_reports_partial_failures():
+    in_flight = {"now": 0, "max": 0}
+
+    async def handler(request):
+        body = json.loads(request.content)
+        token = body["access_token"]
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await asyncio.sleep(0.01)
+        in_flight["now"] -= 1
+        if token == "broken":
+            return httpx.Response(400, json={"error_code": "ITEM_LOGIN_REQUIRED", "error_message": "login required"})
+        if request.url.path == "/accounts/get":
+            return httpx.Response(200, json={"accounts": [{"account_id": f"{token}-acc"}], "item": {"item_id": f"{token}-item"}})
+        return httpx.Response(200, json={"accounts": [], "transactions": [{"transaction_id": f"{token}-t"}], "total_transactions": 1, "item": {}})
+
+    service = make_service(handler)
+    result = asyncio.run(service.refresh_items(["bank-a", "broken", "bank-b"], max_parallel=3))
+
+    assert [item["status"] for item in result["items"]] == ["ok", "error", "ok"]
+    assert result["items"][1]["error"]["error_code"] == "ITEM_LOGIN_REQUIRED"
+    assert [account["item_id"] for account in result["accounts"]] == ["bank-a-item", "bank-b-item"]
+    assert [t["transaction_id"] for t in result["transactions"]] == ["bank-a-t", "bank-b-t"]
+    # Balances and transactions for all three items were in flight together.
+    assert in_flight["max"] == 6
+
+def test_trial_call_cut_off_by_the_deadline_does_not_wedge_the_circuit():
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(500, json={"error_message": "boom"})
+        if len(calls) == 2:
+            await asyncio.sleep(1)  # The half-open trial hangs past the deadline
+        return httpx.Response(200, json={"accounts": [], "item": {}})
+
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=lambda: now[0])
+    service = make_service(handler, max_retries=0, deadline=0.05, breaker=breaker)
+
+    async def run():
+        results = [await service.get_account_balances("access-token")]
+        now[0] += 30
+        results.append(await service.get_account_balances("access-token"))
+        state_after_trial = breaker.state
+        results.append(await service.get_account_balances("access-token"))
+        now[0] += 30
+        results.append(await service.get_account_balances("access-token"))
+        return results, state_after_trial
+
+    results, state_after_trial = asyncio.run(run())
+    assert [result.get("error", {}).get("error_code") for result in results] == ["UNKNOWN_ERROR", "TIMEOUT", "CIRCUIT_OPEN", None]
+    # The abandoned trial re-opened the circuit; the next trial got through and closed it
+    assert state_after_trial == CircuitBreaker.OPEN
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert len(calls) == 3
@@ -0,0 +1,79 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession
+from unittest.mock import MagicMock
+from uuid import uuid4
+from datetime import datetime, timezone
+from passlib.context import CryptContext
+
+from main import app
+from db.models import User
+from api.routes.auth import get_db
+from app.core.security import PasswordHasher, pwd_context
+
+client = TestClient(app)
+
+# A cheap, outdated cost factor so the login flow has something to upgrade.
+legacy_context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+
+@pytest.fixture
+def mock_db():
+    db = MagicMock(spec=AsyncSession)
+    yield db
+
+@pytest.fixture(autouse=True)
+def clear_overrides():
+    yield
+    app.dependency_overrides.clear()
+
+def make_user(password_hash: str) -> User:
+    return User(
+        id=uuid4(),
+        email="user@example.com",
+        password_hash=password_hash,
+        name="User",
+        currency="CAD",
+        created_at=datetime.now(timezone.utc)
+    )
+
+def test_login_rehashes_outdated_password(mock_db):
+    app.dependency_overrides[get_db] = lambda: mock_db
+    user = make_user(legacy_context.hash("secret"))
+    legacy_hash = user.password_hash
+    mock_db.scalar.return_value = user
+
+    response = client.post("/auth/login", data={"username": "user@example.com", "password": "secret"})
+    assert response.status_code == 200, response.text
+    assert response.json()["token_type"] == "bearer"
+    assert user.password_hash != legacy_hash
+    assert not pwd_context.needs_update(user.password_hash)
+    mock_db.commit.assert_awaited_once()
+
+def test_login_wrong_password(mock_db):
+    app.dependency_overrides[get_db] = lambda: mock_db
+    mock_db.scalar.return_value = make_user(legacy_context.hash("secret"))
+
+    response = client.post("/auth/login", data={"username": "user@example.com", "password": "wrong"})
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Incorrect username or password"
+    mock_db.commit.assert_not_awaited()
+
+def test_password_hasher_rejects_when_saturated():
+    hasher = PasswordHasher(max_workers=1, max_pending=0)
+    stored = legacy_context.hash("secret")
+
+    async def run():
+        first = asyncio.ensure_future(hasher.verify_and_update("secret", stored))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as exc_info:
+            await hasher.verify_and_update("secret", stored)
+        await first
+        return exc_info.value
+
+    error = asyncio.run(run())
+    hasher.shutdown()
+    assert error.status_code == 429
+    assert error.headers["Retry-After"] == "1"
+    assert hasher.in_flight == 0
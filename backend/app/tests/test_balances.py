@@ -0,0 +1,99 @@
+import datetime
+from sqlalchemy import update
+
+from db.models import BankAccount, User
+from services.balances import balance_as_of, reconcile_balances
+from services.transaction_writer import delete_transactions, insert_transactions, update_transactions
+
+OPENED = datetime.datetime(2025, 3, 10, 12, 0)
+
+async def create_account(session, opening_balance=1000.0, opened=OPENED):
+    user = User(email="balances@example.com", password_hash="x")
+    session.add(user)
+    await session.flush()
+    account = BankAccount(
+        user_id=user.id, institution_name="Bank", account_type="checking",
+        balance=opening_balance, opening_balance=opening_balance, opening_balance_at=opened,
+    )
+    session.add(account)
+    await session.flush()
+    return user, account
+
+def row(user, account, description, amount, date):
+    return {"user_id": user.id, "bank_account_id": account.id, "description": description, "amount": amount, "date": date}
+
+async def current_balance(session, account):
+    await session.refresh(account)
+    return float(account.balance)
+
+def test_writers_maintain_the_balance(run_in_db):
+    async def scenario(session):
+        user, account = await create_account(session)
+        rows = [
+            row(user, account, "Salary", 3000.0, datetime.datetime(2025, 3, 15)),
+            row(user, account, "Rent", -1500.0, datetime.datetime(2025, 4, 1)),
+            # Already part of the opening balance
+            row(user, account, "Old coffee", -4.5, datetime.datetime(2025, 3, 1)),
+        ]
+        await insert_transactions(session, rows)
+        await session.commit()
+        after_insert = await current_balance(session, account)
+
+        await update_transactions(session, [{"id": rows[1]["id"], "amount": -1400.0}])
+        await session.commit()
+        after_update = await current_balance(session, account)
+
+        await delete_transactions(session, [rows[0]["id"], rows[2]["id"]])
+        await session.commit()
+        after_delete = await current_balance(session, account)
+        return after_insert, after_update, after_delete
+
+    assert run_in_db(scenario) == (2500.0, 2600.0, -400.0)
+
+def test_balance_as_of_either_side_of_opening(run_in_db):
+    async def scenario(session):
+        user, account = await create_account(session)
+        await insert_transactions(session, [
+            row(user, account, "January", 200.0, datetime.datetime(2025, 1, 20)),
+            row(user, account, "February", -50.0, datetime.datetime(2025, 2, 14, 9)),
+            row(user, account, "Morning of opening", -30.0, datetime.datetime(2025, 3, 10, 8)),
+            row(user, account, "Evening of opening", 70.0, datetime.datetime(2025, 3, 10, 18)),
+            row(user, account, "April", -500.0, datetime.datetime(2025, 4, 2)),
+            row(user, account, "June", 1000.0, datetime.datetime(2025, 6, 30, 23)),
+        ])
+        await session.commit()
+
+        def end_of(day):
+            return datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time())
+
+        return [
+            float(await balance_as_of(session, account, end_of(day)))
+            for day in (
+                datetime.date(2024, 12, 31), datetime.date(2025, 1, 31), datetime.date(2025, 3, 9),
+                datetime.date(2025, 3, 10), datetime.date(2025, 5, 31), datetime.date(2025, 6, 30),
+            )
+        ] + [await current_balance(session, account)]
+
+    # Transactions before opening reconstruct the history backwards from the opening balance
+    assert run_in_db(scenario) == [880.0, 1080.0, 1030.0, 1070.0, 570.0, 1570.0, 1570.0]
+
+def test_reconcile_reports_and_repairs_drift(run_in_db):
+    async def scenario(session):
+        user, account = await create_account(session, opened=None)
+        await insert_transactions(session, [row(user, account, "Salary", 3000.0, datetime.datetime(2025, 3, 15))])
+        await session.commit()
+        clean = await reconcile_balances(session)
+
+        await session.execute(update(BankAccount).where(BankAccount.id == account.id).values(balance=12.0))
+        await session.commit()
+        reported = await reconcile_balances(session)
+        still_drifted = await current_balance(session, account)
+        repaired = await reconcile_balances(session, repair=True)
+        return clean, reported, still_drifted, repaired, await current_balance(session, account)
+
+    clean, reported, still_drifted, repaired, balance = run_in_db(scenario)
+    assert clean == []
+    assert [(float(d["stored"]), float(d["expected"])) for d in reported] == [(12.0, 4000.0)]
+    assert still_drifted == 12.0
+    assert len(repaired) == 1
+    assert balance == 4000.0
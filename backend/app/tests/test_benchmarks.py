@@ -0,0 +1,61 @@
+import asyncio
+
+import httpx
+from sqlalchemy import func, select
+
+from benchmarks.dataset import seed_dataset
+from benchmarks.workloads import Workload, compare_to_baseline, run_workload, summarize
+from db.models import BankAccount, Transaction, TransactionRollup
+from db.session import create_async_db_engine
+from fake_plaid import FakePlaidSettings, create_app
+
+def test_summaries_and_baseline_comparison():
+    summary = summarize([0.01] * 90 + [0.1] * 10, errors=2, elapsed=2.0)
+    assert (summary["requests"], summary["errors"], summary["rps"]) == (100, 2, 50.0)
+    assert (summary["p50_ms"], summary["p99_ms"], summary["max_ms"]) == (10.0, 100.0, 100.0)
+
+    baseline = {"list": {"p95_ms": 10.0, "rps": 100.0, "errors": 0}, "gone": {"p95_ms": 1.0, "rps": 1.0, "errors": 0}}
+    within = {"list": {"p95_ms": 12.0, "rps": 80.0, "errors": 0}, "new": {"p95_ms": 99.0, "rps": 1.0, "errors": 0}}
+    assert compare_to_baseline(within, baseline, tolerance=0.25) == []
+    worse = {"list": {"p95_ms": 13.0, "rps": 70.0, "errors": 3}}
+    assert compare_to_baseline(worse, baseline, tolerance=0.25) == [
+        "list: p95 10.0 ms -> 13.0 ms",
+        "list: throughput 100.0 -> 70.0 req/s",
+        "list: 3 errors, none in the baseline",
+    ]
+
+def test_workloads_are_measured_per_request():
+    async def scenario():
+        app = create_app(FakePlaidSettings(latency_ms=0, error_rate=0, rate_limit_rate=0))
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://local-plaid")
+
+        async def request(http, rng, index):
+            return await http.post("/link/token/create", json={"user": {"client_user_id": str(rng.random())}})
+
+        summary = await run_workload(client, Workload("link", request), requests=25, concurrency=4, warmup=2)
+        await client.aclose()
+        return summary
+
+    summary = asyncio.run(scenario())
+    assert (summary["requests"], summary["errors"]) == (25, 0)
+
+def test_seeded_dataset_is_reproducible_and_goes_through_the_writer():
+    async def seed():
+        engine = create_async_db_engine("sqlite://")
+        try:
+            manifest = await seed_dataset(engine, users=2, accounts=2, transactions=15, seed=7)
+            async with engine.connect() as conn:
+                counts = (
+                    await conn.scalar(select(func.count()).select_from(Transaction)),
+                    await conn.scalar(select(func.count()).select_from(BankAccount)),
+                    await conn.scalar(select(func.count()).select_from(TransactionRollup)),
+                )
+            return manifest, counts
+        finally:
+            await engine.dispose()
+
+    first, counts = asyncio.run(seed())
+    second, _ = asyncio.run(seed())
+    assert counts[:2] == (60, 4) and counts[2] > 0
+    assert first == second and first["transactions"] == 60
+    assert [len(user["account_ids"]) for user in first["users"]] == [2, 2]
@@ -0,0 +1,94 @@
+import datetime
+from decimal import Decimal
+
+from sqlalchemy import select, update
+
+from api.routes.budgets import create_budget, list_budgets
+from db.models import BankAccount, BudgetSpend, Job, User
+from db.schemas import BudgetCreate
+from services.budgets import BUDGET_ALERT_JOB, BudgetScope, check_budget_spend, history_start
+from services.merchants import normalize_description
+from services.transaction_writer import delete_transactions, insert_transactions, update_transactions
+
+def test_history_start_counts_back_whole_months():
+    assert history_start(12, today=datetime.date(2025, 3, 17)) == datetime.date(2024, 4, 1)
+    assert history_start(1, today=datetime.date(2025, 1, 31)) == datetime.date(2025, 1, 1)
+
+def test_regex_patterns_search_the_raw_description():
+    amazon = BudgetScope(1, "u1", "Amazon", 100, pattern=r"^AMZN Mktp \w+\*", is_regex=True)
+    coffee = BudgetScope(2, "u1", "Coffee", 100, pattern="coffee")
+
+    def row(description):
+        return {"bank_account_id": 1, "description": description, "search_text": normalize_description(description)}
+
+    assert [amazon.matches(row(text)) for text in ["AMZN Mktp US*2K4", "amzn mktp ca*99", "Refund AMZN Mktp US*1"]] == [True, True, False]
+    assert [coffee.matches(row(text)) for text in ["SQ *COFFEE CORNER #12", "Coffeehouse"]] == [True, False]
+
+def test_counters_follow_writes_and_alert_once_per_threshold(run_in_db):
+    async def scenario(session):
+        user = User(email="budgets@example.com", password_hash="x")
+        session.add(user)
+        await session.flush()
+        checking = BankAccount(user_id=user.id, institution_name="Bank", account_type="checking", balance=0)
+        card = BankAccount(user_id=user.id, institution_name="Bank", account_type="credit", balance=0)
+        session.add_all([checking, card])
+        await session.flush()
+        user_id, checking_id, card_id = user.id, checking.id, card.id
+        this_month = datetime.datetime.utcnow().replace(day=1, hour=9, minute=0, second=0, microsecond=0)
+        last_month = (this_month - datetime.timedelta(days=1)).replace(day=1)
+
+        def row(description, amount, date=this_month, account_id=checking_id):
+            return {"user_id": user_id, "bank_account_id": account_id, "description": description, "amount": amount, "date": date}
+
+        await insert_transactions(session, [
+            row("Coffee Corner", -20),
+            row("Coffee Corner", -30, last_month),
+            row("Coffee Corner", -25, account_id=card_id),
+        ])
+        await session.commit()
+
+        created = await create_budget(
+            BudgetCreate(name="Coffee", amount=Decimal("100"), bank_account_id=checking_id, pattern="coffee", alert_percents=[50, 100]),
+            user_id=user_id, db=session,
+        )
+        latte = row("SQ *COFFEE CORNER #12", -40)
+        await insert_transactions(session, [
+            latte,
+            row("Groceries", -10),
+            row("Coffee Corner refund", 5),
+        ])
+        await session.commit()
+        await update_transactions(session, [{"id": latte["id"], "amount": Decimal("-45")}])
+        big = row("Coffee beans", -50)
+        await insert_transactions(session, [big])
+        await session.commit()
+        over = (await list_budgets(user_id=user_id, month=None, db=session))[0]
+        await delete_transactions(session, [big["id"]])
+        await session.commit()
+        after_delete = (await list_budgets(user_id=user_id, month=None, db=session))[0]
+        previous = (await list_budgets(user_id=user_id, month=last_month.date(), db=session))[0]
+        alerts = [(job.payload["percent"], job.payload["spent"]) for job in (await session.scalars(
+            select(Job).where(Job.kind == BUDGET_ALERT_JOB).order_by(Job.created_at)
+        )).all()]
+
+        # Drift is found and repaired by recomputing from transactions
+        await session.execute(update(BudgetSpend).values(spent=Decimal("1")))
+        await session.commit()
+        drifted = await check_budget_spend(session, repair=True)
+        clean = await check_budget_spend(session)
+        return created, over, after_delete, previous, alerts, drifted, clean
+
+    created, over, after_delete, previous, alerts, drifted, clean = run_in_db(scenario)
+    # Filled from history on creation: only this month's coffee on the checking account
+    assert (created.spent, created.transaction_count, created.remaining) == (Decimal("20"), 1, Decimal("80"))
+    assert created.alert_percents == [50, 100]
+    assert (over.spent, over.transaction_count, over.remaining) == (Decimal("115"), 3, Decimal("-15"))
+    assert over.percent_used == 115.0
+    today = datetime.datetime.utcnow().date()
+    assert over.daily_burn_rate == (Decimal("115") / today.day).quantize(Decimal("0.01"))
+    assert after_delete.spent == Decimal("65")
+    assert (previous.spent, previous.projected_spend, previous.days_left) == (Decimal("30"), Decimal("30"), 0)
+    # The later edit and delete move the counter but never queue the same alert again
+    assert alerts == [(50, "60.00"), (100, "115.00")]
+    assert len(drifted) == 2 and all(entry["stored"] == Decimal("1") for entry in drifted)
+    assert clean == []
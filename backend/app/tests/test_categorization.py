@@ -0,0 +1,105 @@
+import datetime
+
+import pytest
+from sqlalchemy import select
+
+from db.models import BankAccount, CategoryRule, Transaction, User
+from services.categorization import (
+    RECATEGORIZE_JOB,
+    Categorizer,
+    NaiveBayesClassifier,
+    Rule,
+    categorization_job_handlers,
+    plaid_category_hint,
+    validate_rule,
+)
+from services.merchants import normalize_description
+from services.transaction_writer import insert_transactions
+
+def test_rule_precedence():
+    categorizer = Categorizer([
+        Rule("uber", "work travel"),
+        Rule(r"blue\s+bottle|starbucks", "coffee", is_regex=True, priority=5),
+        Rule("starbucks reserve", "treats", priority=1),
+    ])
+    descriptions = ["UBER *TRIP 1234", "UBER EATS 03/14", "SQ *BLUE BOTTLE #42", "Starbucks Reserve Roastery", "NETFLIX.COM", "Mystery shop", "Mystery shop"]
+    hints = [None, "dining", None, None, "shopping", "shopping", None]
+    assert categorizer.categorize(descriptions, hints) == [
+        ("work travel", "rule"),
+        # The user's keyword beats both Plaid and the built-in "uber eats"
+        ("work travel", "rule"),
+        ("coffee", "rule"),
+        # Both user rules match; the higher priority wins
+        ("coffee", "rule"),
+        # Plaid's suggestion beats the built-in rules
+        ("shopping", "plaid"),
+        ("shopping", "plaid"),
+        (None, None),
+    ]
+    # Keywords match whole words only, and the longest one wins
+    assert Categorizer().categorize(["Uber Eats order", "Uberx ride", "Metro"]) == [("dining", "rule"), (None, None), ("groceries", "rule")]
+
+    assert plaid_category_hint({"personal_finance_category": {"primary": "FOOD_AND_DRINK"}}) == "dining"
+    assert plaid_category_hint({"category": ["Travel", "Taxi"]}) == "travel"
+    assert plaid_category_hint({"category": None}) is None
+
+    # Regex rules see the description as written, ignoring case
+    raw = Categorizer([Rule(r"^AMZN Mktp", "shopping", is_regex=True), Rule(r"uber trip \d+", "work travel", is_regex=True)])
+    assert raw.categorize(["AMZN Mktp US*2K4", "amzn mktp ca", "Paid to AMZN Mktp", "UBER TRIP 4432", "UBER TRIP"]) == [
+        ("shopping", "rule"), ("shopping", "rule"), (None, None), ("work travel", "rule"), ("transportation", "rule"),
+    ]
+
+    for pattern in ["(?P<x>a)", r"(a)\1", "a*", "(", "(?i)amzn", "x" * 201, r"(a+)+b", r"(\w+\s?)*$", r"(a|ab)+c"]:
+        with pytest.raises(ValueError):
+            validate_rule(pattern, is_regex=True)
+    for pattern in [r"\*", r"sq \*(?:blue|green)", r"(?:ab|cd)+", r"(\d{2}/)+\d{4}"]:
+        validate_rule(pattern, is_regex=True)
+    with pytest.raises(ValueError):
+        validate_rule("#1234", is_regex=False)
+
+def test_classifier_learns_from_history():
+    texts = ["green grocer", "fresh market", "green market", "bus pass", "metro pass", "bus ticket"]
+    labels = ["groceries", "groceries", "groceries", "transit", "transit", "transit"]
+    classifier = NaiveBayesClassifier.train([normalize_description(text) for text in texts], labels, min_confidence=0.7)
+    assert classifier.predict(["fresh green market", "monthly bus pass", "unknown words"]) == ["groceries", "transit", None]
+    assert NaiveBayesClassifier.train(["a"], ["only"]) is None
+
+    categorizer = Categorizer(classifier=classifier)
+    # Rules still come first; the classifier only fills in what nothing else matched
+    assert categorizer.categorize(["Costco", "Fresh Market #12"]) == [("groceries", "rule"), ("groceries", "classifier")]
+
+def test_writes_are_categorized_and_history_can_be_recategorized(run_in_db):
+    async def scenario(session):
+        user = User(email="categories@example.com", password_hash="x")
+        session.add(user)
+        await session.flush()
+        account = BankAccount(user_id=user.id, institution_name="Bank", account_type="checking", balance=0)
+        session.add(account)
+        await session.flush()
+        day = datetime.datetime(2025, 5, 1)
+        await insert_transactions(session, [
+            {"user_id": user.id, "bank_account_id": account.id, "description": "LOCAL BAKERY", "amount": -8, "date": day},
+            {"user_id": user.id, "bank_account_id": account.id, "description": "Netflix", "amount": -15, "date": day},
+            {"user_id": user.id, "bank_account_id": account.id, "description": "Corner store", "amount": -3, "date": day, "category_hint": "shopping"},
+            {"user_id": user.id, "bank_account_id": account.id, "description": "Local bakery", "amount": -4, "date": day, "category": "gifts"},
+        ])
+        session.add(CategoryRule(user_id=user.id, pattern="bakery", category="treats"))
+        session.add(CategoryRule(user_id=user.id, pattern="corner", category="snacks"))
+        await session.commit()
+
+        def categories():
+            return session.execute(select(Transaction.amount, Transaction.category, Transaction.category_source).order_by(Transaction.amount))
+
+        before = (await categories()).all()
+        await categorization_job_handlers()[RECATEGORIZE_JOB](session, {"user_id": str(user.id)})
+        session.expire_all()
+        return before, (await categories()).all()
+
+    before, after = run_in_db(scenario)
+    assert [(float(amount), category, source) for amount, category, source in before] == [
+        (-15, "entertainment", "rule"), (-8, None, None), (-4, "gifts", "user"), (-3, "shopping", "plaid"),
+    ]
+    # The new rules apply to history, and beat Plaid's suggestion; the user's own choice is kept
+    assert [(float(amount), category, source) for amount, category, source in after] == [
+        (-15, "entertainment", "rule"), (-8, "treats", "rule"), (-4, "gifts", "user"), (-3, "snacks", "rule"),
+    ]
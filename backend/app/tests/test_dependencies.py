@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from unittest.mock import MagicMock
+from uuid import uuid4
+
+from api.dependencies import get_current_user, invalidate_principal, principal_cache, token_claims_cache
+from api.routes.auth import create_access_token
+from db.base import Base
+from db.models import User
+from db.session import create_db_engine
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    principal_cache.clear()
+    token_claims_cache.clear()
+    yield
+    principal_cache.clear()
+    token_claims_cache.clear()
+
+def make_user() -> User:
+    return User(
+        id=uuid4(),
+        email="user@example.com",
+        password_hash="hashed",
+        name="User",
+        currency="CAD",
+        created_at=datetime.now(timezone.utc)
+    )
+
+def test_get_current_user_is_served_from_cache():
+    user = make_user()
+    mock_db = MagicMock(spec=AsyncSession)
+    mock_db.get.return_value = user
+    token = create_access_token({"sub": str(user.id)}, timedelta(minutes=5))
+
+    first = asyncio.run(get_current_user(token=token, db=mock_db))
+    second = asyncio.run(get_current_user(token=token, db=mock_db))
+
+    assert first is user
+    assert second.id == user.id and second.email == user.email
+    assert mock_db.get.await_count == 1
+    assert token in token_claims_cache
+
+    invalidate_principal(user.id)
+    asyncio.run(get_current_user(token=token, db=mock_db))
+    assert mock_db.get.await_count == 2
+
+def test_user_update_invalidates_cached_principal():
+    engine = create_db_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    user = make_user()
+    cache_key = (str(user.id), None)
+    with Session(engine) as session:
+        session.add(user)
+        session.commit()
+        principal_cache.set(cache_key, {"id": user.id})
+
+        user.name = "Renamed"
+        session.commit()
+
+    assert cache_key not in principal_cache
+    engine.dispose()
@@ -0,0 +1,80 @@
+import asyncio
+import datetime
+
+import httpx
+from sqlalchemy import func, select
+
+from app.core.metrics import PLAID_REQUESTS
+from db.models import BankAccount, PlaidItem, Transaction, User
+from fake_plaid import FakePlaidData, FakePlaidSettings, create_app
+from services.async_plaid_service import AsyncPlaidService
+from services.plaid_sync import sync_item
+
+TODAY = datetime.date(2025, 6, 30)
+
+def local_plaid(settings, **options):
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app(settings, today=TODAY)), base_url="http://local-plaid")
+
+    async def no_sleep(seconds):
+        pass
+
+    return AsyncPlaidService(base_url="http://local-plaid", client=client, sleep=no_sleep, **options)
+
+def test_data_is_derived_from_the_token_and_seed():
+    settings = FakePlaidSettings(accounts=3, transactions=10, history_days=30, seed=5)
+    first, again = FakePlaidData(settings, TODAY), FakePlaidData(settings, TODAY)
+    assert first.transactions("access-local-a") == again.transactions("access-local-a")
+    assert first.transactions("access-local-a") != first.transactions("access-local-b")
+    assert first.transactions("access-local-a") != FakePlaidData(settings._replace(seed=6), TODAY).transactions("access-local-a")
+    assert [account["subtype"] for account in first.accounts("access-local-a")] == ["checking", "savings", "credit card"]
+    assert len(first.transactions("access-local-a")) == 30
+
+def test_sync_imports_the_items_history_through_the_real_client(run_in_db):
+    settings = FakePlaidSettings(accounts=2, transactions=40, history_days=60, latency_ms=0, error_rate=0, rate_limit_rate=0, seed=1)
+
+    async def scenario(session):
+        plaid_service = local_plaid(settings)
+        exchanged = await plaid_service.exchange_public_token("public-local-test")
+        user = User(email="local-plaid@example.com", password_hash="x")
+        session.add(user)
+        await session.flush()
+        item = PlaidItem(user_id=user.id, item_id=exchanged["item_id"], access_token=exchanged["access_token"])
+        session.add(item)
+        await session.commit()
+
+        first = await sync_item(session, item, plaid_service)
+        second = await sync_item(session, item, plaid_service)
+        window = await plaid_service.get_transactions(exchanged["access_token"], datetime.datetime(2025, 6, 1), datetime.datetime(2025, 6, 30), page_size=7)
+        stored = await session.scalar(select(func.count()).select_from(Transaction))
+        accounts = await session.scalar(select(func.count()).select_from(BankAccount))
+        await plaid_service.aclose()
+        return first, second, window, stored, accounts
+
+    first, second, window, stored, accounts = run_in_db(scenario)
+    assert first == {"added": 80, "modified": 0, "removed": 0}
+    assert second == {"added": 0, "modified": 0, "removed": 0}
+    assert (stored, accounts) == (80, 2)
+    # Paged through 7 at a time, newest first, within the window
+    assert len(window["transactions"]) == window["total_transactions"] > 7
+    dates = [transaction["date"] for transaction in window["transactions"]]
+    assert dates == sorted(dates, reverse=True) and dates[-1] >= "2025-06-01"
+
+def test_injected_failures_are_retried_or_reported():
+    flaky = FakePlaidSettings(accounts=1, transactions=5, latency_ms=0, error_rate=0.3, rate_limit_rate=0.2, seed=3)
+    broken = flaky._replace(error_rate=1.0, rate_limit_rate=0)
+
+    async def scenario():
+        service = local_plaid(flaky, max_retries=20)
+        before = PLAID_REQUESTS.value(endpoint="/accounts/get", outcome="500") + PLAID_REQUESTS.value(endpoint="/accounts/get", outcome="429")
+        results = [await service.get_account_balances(f"access-local-{index}") for index in range(10)]
+        after = PLAID_REQUESTS.value(endpoint="/accounts/get", outcome="500") + PLAID_REQUESTS.value(endpoint="/accounts/get", outcome="429")
+        failing = local_plaid(broken, max_retries=2)
+        failed = await failing.create_link_token("user-1")
+        await service.aclose()
+        await failing.aclose()
+        return results, after - before, failed
+
+    results, failures, failed = asyncio.run(scenario())
+    assert all("error" not in result for result in results)
+    assert failures > 0
+    assert failed["error"]["status_code"] == 500 and failed["error"]["error_code"] == "INTERNAL_SERVER_ERROR"
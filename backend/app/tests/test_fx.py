@@ -0,0 +1,98 @@
+import datetime
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from api.routes.accounts import list_accounts
+from api.routes.transactions import list_transactions, summarize_transactions
+from app.core.config import FX_RATES_FILE
+from db.models import BankAccount, User
+from services.fx import FxRateTable, FxRateUnavailable, load_fx_rates, read_rates_file
+from services.transaction_writer import insert_transactions
+
+FRIDAY, SATURDAY, MONDAY = datetime.date(2025, 1, 3), datetime.date(2025, 1, 4), datetime.date(2025, 1, 6)
+RATES = [
+    (FRIDAY, "CAD", Decimal("1.25")),
+    (MONDAY, "CAD", Decimal("1.5")),
+    (FRIDAY, "EUR", Decimal("0.8")),
+]
+
+def test_rates_carry_forward_and_cross():
+    table = FxRateTable.from_rows(RATES, base="USD")
+    # Saturday uses Friday's rate; EUR to CAD goes through USD
+    assert table.convert(Decimal("100"), "USD", SATURDAY, "CAD") == Decimal("125.00")
+    assert table.convert(Decimal("100"), "EUR", MONDAY, "CAD") == Decimal("187.50")
+    assert table.convert(Decimal("125"), "CAD", FRIDAY, "USD") == Decimal("100.00")
+    assert table.convert(Decimal("3.33"), "JPY", FRIDAY, "JPY") == Decimal("3.33")
+
+    converted = table.convert_minor(
+        np.array([10000, 10000, 10000, 1]),
+        ["USD", "EUR", "CAD", "USD"],
+        [SATURDAY, MONDAY, MONDAY, datetime.datetime(2025, 1, 6, 23, 59)],
+        "CAD",
+    )
+    # Half a cent rounds to even
+    assert converted.tolist() == [12500, 18750, 10000, 2]
+
+    with pytest.raises(FxRateUnavailable):
+        table.convert(Decimal("1"), "USD", datetime.date(2025, 1, 2), "CAD")
+    with pytest.raises(FxRateUnavailable):
+        table.convert(Decimal("1"), "CHF", FRIDAY, "CAD")
+
+def test_bundled_rates_file_parses():
+    rows = read_rates_file(FX_RATES_FILE)
+    assert {currency for _, currency, _ in rows} >= {"CAD", "EUR", "GBP"}
+    assert all(rate > 0 for _, _, rate in rows)
+
+def test_mixed_currency_accounts_total_in_home_currency(run_in_db):
+    async def scenario(session):
+        await load_fx_rates(session, RATES)
+        user = User(email="fx@example.com", password_hash="x", currency="CAD")
+        session.add(user)
+        await session.flush()
+        cad = BankAccount(user_id=user.id, institution_name="Bank", account_type="checking", currency="CAD", balance=0)
+        usd = BankAccount(user_id=user.id, institution_name="Bank", account_type="checking", currency="USD", balance=0)
+        session.add_all([cad, usd])
+        await session.flush()
+        await insert_transactions(session, [
+            {"user_id": user.id, "bank_account_id": cad.id, "description": "Pay", "amount": 500, "date": datetime.datetime(2025, 1, 3, 9)},
+            {"user_id": user.id, "bank_account_id": usd.id, "description": "Hotel", "amount": -100, "date": datetime.datetime(2025, 1, 4, 20)},
+            {"user_id": user.id, "bank_account_id": usd.id, "description": "Refund", "amount": 10, "date": datetime.datetime(2025, 1, 6, 8)},
+        ])
+        await session.commit()
+
+        summary = await summarize_transactions(
+            user_id=user.id, period="month", start_date=None, end_date=None, bank_account_id=None,
+            by_account=False, currency="CAD", db=session,
+        )
+        by_account = await summarize_transactions(
+            user_id=user.id, period="week", start_date=None, end_date=datetime.datetime(2025, 1, 5), bank_account_id=None,
+            by_account=True, currency="CAD", db=session,
+        )
+        user_id, usd_id = user.id, usd.id
+        session.expire_all()  # balances were incremented in SQL
+        accounts = await list_accounts(user_id=user_id, currency="CAD", db=session)
+        page = await list_transactions(
+            user_id=user_id, bank_account_id=None, start_date=None, end_date=None, min_amount=None, max_amount=None,
+            category=None, cursor=None, limit=50, currency="CAD", db=session,
+        )
+        return usd_id, summary, by_account, accounts, page
+
+    usd_id, summary, by_account, accounts, page = run_in_db(scenario)
+    [month] = summary.buckets
+    assert summary.currency == "CAD"
+    # 500 CAD, plus 10 USD at Monday's 1.5, less 100 USD at Friday's 1.25
+    assert (month.inflow, month.outflow, month.net, month.transaction_count) == (Decimal("515.00"), Decimal("125.00"), Decimal("390.00"), 3)
+    # Only the week starting Monday 2024-12-30 starts before the end date
+    assert [(b.period_start, b.inflow, b.outflow) for b in by_account.buckets if b.bank_account_id == usd_id] == [
+        (datetime.date(2024, 12, 30), Decimal("0.00"), Decimal("125.00"))
+    ]
+    # Balances convert at the latest rate: -90 USD at 1.5
+    assert [account.converted_balance for account in accounts.accounts] == [Decimal("500.00"), Decimal("-135.00")]
+    assert accounts.total_balance == Decimal("365.00")
+    # Each transaction converts at its own day's rate
+    assert page.currency == "CAD"
+    assert [(item.amount, item.converted_amount) for item in page.items] == [
+        (Decimal("10.00"), Decimal("15.00")), (Decimal("-100.00"), Decimal("-125.00")), (Decimal("500.00"), Decimal("500.00"))
+    ]
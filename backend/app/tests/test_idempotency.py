@@ -0,0 +1,119 @@
+import asyncio
+import datetime
+
+import httpx
+from fastapi import FastAPI, Query
+from fastapi.responses import JSONResponse
+from sqlalchemy import func, select
+
+from api.dependencies import get_db, get_session_factory
+from api.middleware import IdempotencyMiddleware
+from db.models import IdempotencyKey, User
+from main import app as main_app
+from services.idempotency import claim_key, key_hash, purge_expired_keys, request_hash
+
+def counting_app(session_factory, **options):
+    """A stand-in for the write endpoints that counts how often each actually runs."""
+    app = FastAPI()
+    calls = {"created": 0, "failing": 0}
+
+    @app.post("/transactions/")
+    async def create(payload: dict, user_id: str = Query(...)):
+        calls["created"] += 1
+        await asyncio.sleep(0.05)  # Long enough for duplicates to arrive while it runs
+        return {"id": calls["created"], "user_id": user_id, **payload}
+
+    @app.post("/accounts/")
+    async def failing_once(payload: dict):
+        calls["failing"] += 1
+        if calls["failing"] == 1:
+            return JSONResponse({"detail": "database unavailable"}, status_code=503)
+        return {"id": calls["failing"]}
+
+    app.add_middleware(IdempotencyMiddleware, session_factory=session_factory, **options)
+    return app, calls
+
+def client_for(app):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+def test_retries_replay_the_first_response_and_concurrent_duplicates_coalesce(run_with_sessions):
+    async def scenario(session_factory):
+        app, calls = counting_app(session_factory)
+        async with client_for(app) as client:
+            def post(key, body, user_id="u1"):
+                return client.post(f"/transactions/?user_id={user_id}", json=body, headers={"Idempotency-Key": key})
+
+            concurrent = await asyncio.gather(*(post("key-1", {"amount": 5}) for _ in range(5)))
+            retried = await post("key-1", {"amount": 5})
+            reused = await post("key-1", {"amount": 6})
+            other_user = await post("key-1", {"amount": 5}, user_id="u2")
+            unkeyed = await client.post("/transactions/?user_id=u1", json={"amount": 5})
+            too_long = await post("k" * 300, {"amount": 5})
+
+            failed = await client.post("/accounts/", json={}, headers={"Idempotency-Key": "key-2"})
+            rerun = await client.post("/accounts/", json={}, headers={"Idempotency-Key": "key-2"})
+            replayed = await client.post("/accounts/", json={}, headers={"Idempotency-Key": "key-2"})
+        return calls, concurrent, retried, reused, other_user, unkeyed, too_long, (failed, rerun, replayed)
+
+    calls, concurrent, retried, reused, other_user, unkeyed, too_long, (failed, rerun, replayed) = run_with_sessions(scenario)
+    assert {response.json()["id"] for response in concurrent + [retried]} == {1}
+    assert sum(response.headers.get("Idempotent-Replayed") == "true" for response in concurrent) == 4
+    assert retried.headers["Idempotent-Replayed"] == "true"
+    assert retried.headers["content-type"] == "application/json"
+    assert reused.status_code == 422
+    assert other_user.json()["id"] == 2 and unkeyed.json()["id"] == 3
+    assert too_long.status_code == 400
+    assert calls["created"] == 3
+    # A 5xx is not stored: the retry runs again, and its success is what gets replayed
+    assert (failed.status_code, rerun.json(), replayed.json()) == (503, {"id": 2}, {"id": 2})
+    assert calls["failing"] == 2
+
+def test_duplicates_of_a_request_running_elsewhere_wait_then_conflict(run_with_sessions):
+    async def scenario(session_factory):
+        app, calls = counting_app(session_factory, wait_seconds=0.2, lock_timeout_seconds=60)
+        row_key = key_hash("POST", "/transactions/", b"user_id=u1", "key-3")
+        now = datetime.datetime.utcnow()
+        async with session_factory() as db:
+            # Another process claimed the key and is still running the request
+            assert await claim_key(db, row_key, request_hash(b'{"amount":5}'), 3600, 60, now=now) == (True, None)
+        async with client_for(app) as client:
+            waiting = await client.post("/transactions/?user_id=u1", json={"amount": 5}, headers={"Idempotency-Key": "key-3"})
+            async with session_factory() as db:
+                # That process died: once the lock times out the claim is taken over
+                taken_over = await claim_key(db, row_key, request_hash(b"{}"), 3600, 60, now=now + datetime.timedelta(seconds=61))
+                purged = await purge_expired_keys(db, now=now + datetime.timedelta(hours=2))
+        return calls, waiting, taken_over, purged
+
+    calls, waiting, taken_over, purged = run_with_sessions(scenario)
+    assert waiting.status_code == 409 and calls["created"] == 0
+    assert taken_over == (True, None)
+    assert purged == 1
+
+def test_registration_retried_through_the_real_app_creates_one_user(run_with_sessions):
+    async def scenario(session_factory):
+        async def sessions():
+            async with session_factory() as db:
+                yield db
+
+        main_app.dependency_overrides[get_db] = sessions
+        main_app.dependency_overrides[get_session_factory] = lambda: session_factory
+        try:
+            async with client_for(main_app) as client:
+                body = {"email": "retry@example.com", "password": "correct horse battery"}
+                first = await client.post("/users/register", json=body, headers={"Idempotency-Key": "signup-1"})
+                retried = await client.post("/users/register", json=body, headers={"Idempotency-Key": "signup-1"})
+                # Without a key the duplicate reaches the route and is refused
+                unkeyed = await client.post("/users/register", json=body)
+        finally:
+            main_app.dependency_overrides.clear()
+        async with session_factory() as db:
+            users = await db.scalar(select(func.count()).select_from(User).where(User.email == body["email"]))
+            keys = await db.scalar(select(func.count()).select_from(IdempotencyKey))
+        return first, retried, unkeyed, users, keys
+
+    first, retried, unkeyed, users, keys = run_with_sessions(scenario)
+    assert first.status_code == 200 and "Idempotent-Replayed" not in first.headers
+    assert retried.status_code == 200 and retried.headers["Idempotent-Replayed"] == "true"
+    assert retried.json() == first.json()
+    assert unkeyed.status_code == 400
+    assert (users, keys) == (1, 1)
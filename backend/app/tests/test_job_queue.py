@@ -0,0 +1,130 @@
+import asyncio
+
+from sqlalchemy import select
+
+from db.models import Job
+from services.job_queue import JobWorker, PermanentJobError, enqueue
+
+def test_enqueue_deduplicates_waiting_jobs(run_with_sessions):
+    async def scenario(session_factory):
+        async with session_factory() as db:
+            first, first_created = await enqueue(db, "sync", {"item_id": "i1"}, dedup_key="sync:i1")
+            second, second_created = await enqueue(db, "sync", {"item_id": "i1"}, dedup_key="sync:i1")
+            other, other_created = await enqueue(db, "sync", {"item_id": "i2"}, dedup_key="sync:i2")
+            await db.commit()
+            count = len((await db.scalars(select(Job))).all())
+        return first.id == second.id, first_created, second_created, other_created, count
+
+    assert run_with_sessions(scenario) == (True, True, False, True, 2)
+
+def test_worker_runs_jobs_and_records_success(run_with_sessions):
+    seen = []
+
+    async def handler(db, payload):
+        seen.append(payload)
+
+    async def scenario(session_factory):
+        async with session_factory() as db:
+            job, _ = await enqueue(db, "sync", {"item_id": "i1"})
+            await db.commit()
+        ran = await JobWorker({"sync": handler}, session_factory=session_factory).run_until_empty()
+        async with session_factory() as db:
+            job = await db.get(Job, job.id)
+        return ran, job.status, job.attempts, job.locked_by
+
+    assert run_with_sessions(scenario) == (1, "succeeded", 1, None)
+    assert seen == [{"item_id": "i1"}]
+
+def test_failing_jobs_are_retried_then_dead_lettered(run_with_sessions):
+    calls = []
+
+    async def handler(db, payload):
+        calls.append(payload)
+        raise RuntimeError("upstream unavailable")
+
+    async def scenario(session_factory):
+        async with session_factory() as db:
+            job, _ = await enqueue(db, "sync", {}, max_attempts=3)
+            await db.commit()
+        # No backoff, so every retry is immediately runnable
+        worker = JobWorker({"sync": handler}, session_factory=session_factory, retry_base=0)
+        ran = await worker.run_until_empty()
+        async with session_factory() as db:
+            job = await db.get(Job, job.id)
+        return ran, job.status, job.attempts, job.last_error
+
+    assert run_with_sessions(scenario) == (3, "dead", 3, "RuntimeError: upstream unavailable")
+    assert len(calls) == 3
+
+def test_permanent_errors_and_unknown_kinds_skip_retries(run_with_sessions):
+    async def handler(db, payload):
+        raise PermanentJobError("login required")
+
+    async def scenario(session_factory):
+        async with session_factory() as db:
+            permanent, _ = await enqueue(db, "sync", {})
+            unknown, _ = await enqueue(db, "mystery", {})
+            await db.commit()
+        await JobWorker({"sync": handler}, session_factory=session_factory, retry_base=0).run_until_empty()
+        async with session_factory() as db:
+            return [(job.status, job.attempts) for job in (await db.get(Job, permanent.id), await db.get(Job, unknown.id))]
+
+    assert run_with_sessions(scenario) == [("dead", 1), ("dead", 1)]
+
+def test_jobs_sharing_a_key_do_not_run_concurrently(run_with_sessions):
+    async def scenario(session_factory):
+        async with session_factory() as db:
+            await enqueue(db, "sync", {}, dedup_key="sync:i1")
+            await db.commit()
+        worker = JobWorker({}, session_factory=session_factory)
+        running = await worker.claim()
+        async with session_factory() as db:
+            # A new event while the first sync is running queues a follow-up sync
+            _, created = await enqueue(db, "sync", {}, dedup_key="sync:i1")
+            await db.commit()
+        blocked = await worker.claim()
+        return running is not None, created, blocked
+
+    assert run_with_sessions(scenario) == (True, True, None)
+
+def test_stale_running_jobs_are_requeued(run_with_sessions):
+    async def scenario(session_factory):
+        async with session_factory() as db:
+            job, _ = await enqueue(db, "sync", {})
+            await db.commit()
+        crashed = JobWorker({}, session_factory=session_factory, lock_timeout=-1)
+        await crashed.claim()
+        requeued = await crashed.requeue_stale()
+        async with session_factory() as db:
+            job = await db.get(Job, job.id)
+        return requeued, job.status, job.locked_by
+
+    assert run_with_sessions(scenario) == (1, "queued", None)
+
+def test_jobs_running_past_the_lock_timeout_keep_their_lock(run_with_sessions):
+    calls = []
+
+    async def slow(db, payload):
+        calls.append(payload)
+        await asyncio.sleep(0.5)
+
+    async def scenario(session_factory):
+        async with session_factory() as db:
+            job, _ = await enqueue(db, "recategorize", {})
+            await db.commit()
+        worker = JobWorker({"recategorize": slow}, session_factory=session_factory, lock_timeout=0.15)
+        other = JobWorker({"recategorize": slow}, session_factory=session_factory, lock_timeout=0.15)
+        running = asyncio.create_task(worker.run_once())
+        requeued, stolen = 0, []
+        while not running.done():
+            # Another worker idling meanwhile finds the job's lock fresh and nothing to claim
+            await asyncio.sleep(0.05)
+            requeued += await other.requeue_stale()
+            stolen.append(await other.claim())
+        await running
+        async with session_factory() as db:
+            job = await db.get(Job, job.id)
+        return requeued, any(stolen), job.status, job.attempts
+
+    assert run_with_sessions(scenario) == (0, False, "succeeded", 1)
+    assert len(calls) == 1
@@ -0,0 +1,62 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from api.middleware import InstrumentationMiddleware
+from app.core.metrics import HTTP_REQUEST_SQL_STATEMENTS, REGISTRY, Counter, Histogram, record_plaid_call
+from db.session import attach_statement_metrics, create_async_db_engine
+from main import app
+
+def test_histograms_render_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.7, 3):
+        histogram.observe(value, route="/a")
+    counter = Counter("calls_total", "Calls", ("path",))
+    counter.inc(path='say "hi"\n')
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/a",le="0.1"} 1',
+        'latency_seconds_bucket{route="/a",le="1"} 3',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 4.25',
+        'latency_seconds_count{route="/a"} 4',
+    ]
+    assert counter.render()[-1] == 'calls_total{path="say \\"hi\\"\\n"} 1'
+
+def test_requests_are_labelled_by_route_with_their_sql_and_plaid_work():
+    engine = create_async_db_engine("sqlite://")
+    attach_statement_metrics(engine.sync_engine, "test")
+    probe = FastAPI()
+    probe.add_middleware(InstrumentationMiddleware)
+
+    @probe.get("/items/{item_id}")
+    async def item(item_id: int):
+        async with engine.connect() as conn:
+            for _ in range(item_id):
+                await conn.execute(text("SELECT 1"))
+        record_plaid_call("/accounts/get", "200", 0.002)
+        return {"ok": True}
+
+    client = TestClient(probe)
+    before = HTTP_REQUEST_SQL_STATEMENTS.count(method="GET", route="/items/{item_id}")
+    response = client.get("/items/3")
+    assert response.status_code == 200
+    timing = response.headers["server-timing"]
+    assert timing.startswith("app;dur=")
+    assert 'desc="3 queries"' in timing and 'desc="1 calls"' in timing
+    assert client.get("/nowhere").status_code == 404
+    assert HTTP_REQUEST_SQL_STATEMENTS.count(method="GET", route="/items/{item_id}") == before + 1
+
+    exposed = REGISTRY.render()
+    assert 'http_requests_total{method="GET",route="/items/{item_id}",status="200"}' in exposed
+    assert 'http_requests_total{method="GET",route="unmatched",status="404"}' in exposed
+    assert 'plaid_requests_total{endpoint="/accounts/get",outcome="200"}' in exposed
+    assert 'db_statements_total{engine="test"}' in exposed
+
+def test_metrics_endpoint_serves_prometheus_text():
+    response = TestClient(app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE http_request_duration_seconds histogram" in response.text
+    assert "db_pool_checked_out" in response.text
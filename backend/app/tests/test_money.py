@@ -0,0 +1,61 @@
+import datetime
+from decimal import Decimal
+
+import numpy as np
+from sqlalchemy import BigInteger, func, select, type_coerce
+
+from app.core.money import from_minor, to_minor
+from db.models import BankAccount, Transaction, User
+from services.analytics import fetch_amounts, inflow_outflow, minor_array, total, totals_by
+from services.transaction_writer import insert_transactions
+
+def test_minor_unit_conversion():
+    assert to_minor(Decimal("12.34")) == 1234
+    assert to_minor(0.1) == 10
+    assert to_minor("-4.5") == -450
+    # Half a cent rounds to even
+    assert to_minor(Decimal("0.125")) == 12
+    assert to_minor(Decimal("0.135")) == 14
+    assert from_minor(1250) == Decimal("12.50")
+    assert from_minor(Decimal(-5)) == Decimal("-0.05")
+
+def test_amounts_are_stored_as_exact_minor_units(run_in_db):
+    async def scenario(session):
+        user = User(email="money@example.com", password_hash="x")
+        session.add(user)
+        await session.flush()
+        account = BankAccount(user_id=user.id, institution_name="Bank", account_type="checking", currency="USD", balance=0)
+        session.add(account)
+        await session.flush()
+        await insert_transactions(session, [
+            {"user_id": user.id, "bank_account_id": account.id, "description": "Dime", "amount": 0.1, "date": datetime.datetime(2025, 1, 1)}
+            for _ in range(10)
+        ] + [{"user_id": user.id, "bank_account_id": account.id, "description": "Fee", "amount": Decimal("-2.25"), "date": datetime.datetime(2025, 1, 2)}])
+        await session.commit()
+
+        raw = (await session.scalars(select(type_coerce(Transaction.amount, BigInteger)).order_by(Transaction.date))).all()
+        summed = await session.scalar(select(func.sum(Transaction.amount)))
+        filtered = (await session.scalars(select(Transaction.amount).where(Transaction.amount < -2))).all()
+        await session.refresh(account)
+        amounts = await fetch_amounts(session, Transaction.bank_account_id == account.id)
+        return raw, summed, filtered, account.balance, amounts
+
+    raw, summed, filtered, balance, amounts = run_in_db(scenario)
+    assert sorted(raw) == [-225] + [10] * 10
+    assert summed == Decimal("-1.25")
+    assert filtered == [Decimal("-2.25")]
+    assert balance == Decimal("-1.25")
+    assert amounts.dtype == np.int64
+    assert total(amounts) == Decimal("-1.25")
+
+def test_vectorized_aggregation_is_exact():
+    amounts = minor_array([Decimal("10.10"), "-3.05", 0.2, -1])
+    assert amounts.tolist() == [1010, -305, 20, -100]
+    assert total(amounts) == Decimal("6.25")
+    assert inflow_outflow(amounts) == (Decimal("10.30"), Decimal("4.05"))
+    assert totals_by(["a", "b", "a", "b"], amounts) == {"a": Decimal("10.30"), "b": Decimal("-4.05")}
+
+    # A million cents sum exactly, with no float in between
+    many = np.full(1_000_000, 1, dtype=np.int64)
+    many[::2] = 900_719_925_474  # large enough that a float64 running sum would round
+    assert total(many) == from_minor(500_000 * 900_719_925_474 + 500_000)
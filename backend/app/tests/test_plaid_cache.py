@@ -0,0 +1,115 @@
+import asyncio
+import fnmatch
+
+from services.plaid_cache import InMemoryCacheBackend, PlaidResponseCache, RedisCacheBackend
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class FakeRedis:
+    """Just enough of redis.asyncio for RedisCacheBackend."""
+
+    def __init__(self):
+        self.data = {}
+        self.expiries = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+        self.expiries[key] = ex
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def scan_iter(self, match="*"):
+        for key in list(self.data):
+            if fnmatch.fnmatch(key, match):
+                yield key
+
+def counting_fetch(results):
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0)
+        return results[min(len(calls), len(results)) - 1]
+    return fetch, calls
+
+def test_fresh_hit_does_not_refetch():
+    cache = PlaidResponseCache(InMemoryCacheBackend(), clock=FakeClock())
+    fetch, calls = counting_fetch([{"accounts": [1]}])
+
+    async def run():
+        first = await cache.get_or_fetch("k", fetch, ttl=60)
+        second = await cache.get_or_fetch("k", fetch, ttl=60)
+        return first, second
+
+    assert asyncio.run(run()) == ({"accounts": [1]}, {"accounts": [1]})
+    assert len(calls) == 1
+
+def test_stale_hit_is_served_while_refreshing_in_background():
+    clock = FakeClock()
+    cache = PlaidResponseCache(InMemoryCacheBackend(), stale_seconds=600, clock=clock)
+    fetch, calls = counting_fetch([{"v": 1}, {"v": 2}])
+
+    async def run():
+        await cache.get_or_fetch("k", fetch, ttl=60)
+        clock.now += 120
+        stale = await cache.get_or_fetch("k", fetch, ttl=60)
+        await asyncio.gather(*cache._background)
+        refreshed = await cache.get_or_fetch("k", fetch, ttl=60)
+        return stale, refreshed
+
+    assert asyncio.run(run()) == ({"v": 1}, {"v": 2})
+    assert len(calls) == 2
+
+def test_concurrent_misses_share_one_fetch():
+    cache = PlaidResponseCache(InMemoryCacheBackend(), clock=FakeClock())
+    fetch, calls = counting_fetch([{"v": 1}])
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_fetch("k", fetch, ttl=60) for _ in range(5)))
+
+    assert asyncio.run(run()) == [{"v": 1}] * 5
+    assert len(calls) == 1
+
+def test_errors_are_not_cached_and_force_refresh_bypasses_cache():
+    cache = PlaidResponseCache(InMemoryCacheBackend(), clock=FakeClock())
+    fetch, calls = counting_fetch([{"error": {"message": "boom"}}, {"v": 1}, {"v": 2}])
+
+    async def run():
+        error = await cache.get_or_fetch("k", fetch, ttl=60)
+        value = await cache.get_or_fetch("k", fetch, ttl=60)
+        forced = await cache.get_or_fetch("k", fetch, ttl=60, force_refresh=True)
+        return error, value, forced
+
+    assert asyncio.run(run()) == ({"error": {"message": "boom"}}, {"v": 1}, {"v": 2})
+    assert len(calls) == 3
+
+def test_redis_backend_round_trip_and_invalidation():
+    redis = FakeRedis()
+    cache = PlaidResponseCache(RedisCacheBackend(redis), stale_seconds=600, clock=FakeClock())
+    fetch, calls = counting_fetch([{"v": 1}, {"v": 2}])
+    key = cache.key("access-token", "balances")
+    other_key = cache.key("other-token", "balances")
+
+    async def run():
+        await cache.get_or_fetch(key, fetch, ttl=60)
+        await cache.get_or_fetch(other_key, fetch, ttl=60)
+        cached = await cache.get_or_fetch(key, fetch, ttl=60)
+        await cache.invalidate("access-token")
+        return cached
+
+    assert asyncio.run(run()) == {"v": 1}
+    assert len(calls) == 2
+    assert key not in redis.data
+    assert other_key in redis.data
+    assert redis.expiries[other_key] == 660
+    assert "access-token" not in key
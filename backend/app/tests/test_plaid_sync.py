@@ -0,0 +1,154 @@
+import asyncio
+import datetime
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from db.base import Base
+from db.models import BankAccount, PlaidItem, Transaction, User
+from db.session import create_async_db_engine
+from services.plaid_sync import MUTATION_DURING_PAGINATION, sync_item
+
+class FakePlaidService:
+    """Replays canned /transactions/sync pages keyed by the cursor they were requested with."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requested_cursors = []
+        self.balance_calls = 0
+
+    def sync_transactions(self, access_token, cursor=None):
+        self.requested_cursors.append(cursor)
+        page = self.pages[cursor]
+        return page.pop(0) if isinstance(page, list) else page
+
+    def get_account_balances(self, access_token):
+        self.balance_calls += 1
+        return {
+            "accounts": [{"account_id": "acc-1", "type": "depository", "subtype": "checking", "balances": {"current": 120.0}}],
+            "item": {},
+        }
+
+def plaid_transaction(transaction_id, amount, name="Coffee Shop", day=1):
+    return {
+        "transaction_id": transaction_id,
+        "account_id": "acc-1",
+        "amount": amount,
+        "name": name,
+        "merchant_name": None,
+        "date": datetime.date(2025, 1, day),
+    }
+
+async def create_item(session):
+    user = User(email="sync@example.com", password_hash="x")
+    session.add(user)
+    await session.flush()
+    item = PlaidItem(user_id=user.id, item_id="item-1", access_token="access-sandbox-1")
+    session.add(item)
+    await session.commit()
+    return item
+
+def test_sync_applies_deltas_and_persists_cursor(run_in_db):
+    service = FakePlaidService({
+        None: {"added": [plaid_transaction("t1", 4.5), plaid_transaction("t2", 10.0)], "modified": [], "removed": [],
+               "next_cursor": "c1", "has_more": True},
+        "c1": {"added": [plaid_transaction("t3", -100.0, name="Payroll")], "modified": [], "removed": [],
+               "next_cursor": "c2", "has_more": False},
+        "c2": {"added": [], "modified": [plaid_transaction("t1", 5.0, name="Coffee Shop Downtown")],
+               "removed": [{"transaction_id": "t2"}], "next_cursor": "c3", "has_more": False},
+    })
+
+    async def scenario(session):
+        item = await create_item(session)
+        first = await sync_item(session, item, service)
+        assert item.transactions_cursor == "c2"
+        second = await sync_item(session, item, service)
+        transactions = (await session.scalars(select(Transaction).order_by(Transaction.plaid_transaction_id))).all()
+        accounts = (await session.scalars(select(BankAccount))).all()
+        return first, second, item, transactions, accounts
+
+    first, second, item, transactions, accounts = run_in_db(scenario)
+    assert first == {"added": 3, "modified": 0, "removed": 0}
+    assert second == {"added": 0, "modified": 1, "removed": 1}
+    assert item.transactions_cursor == "c3"
+    assert service.requested_cursors == [None, "c1", "c2"]
+    # The account is created once, on first sight, from /accounts/get.
+    assert service.balance_calls == 1
+    assert [account.plaid_account_id for account in accounts] == ["acc-1"]
+    assert [(t.plaid_transaction_id, t.description, float(t.amount)) for t in transactions] == [
+        ("t1", "Coffee Shop Downtown", -5.0),
+        ("t3", "Payroll", 100.0),
+    ]
+
+def test_sync_restarts_pagination_after_mutation(run_in_db):
+    mutation_error = {"error": {"status_code": 400, "error_code": MUTATION_DURING_PAGINATION, "message": "retry"}}
+    service = FakePlaidService({
+        None: [
+            {"added": [plaid_transaction("t1", 1.0)], "modified": [], "removed": [], "next_cursor": "c1", "has_more": True},
+            {"added": [plaid_transaction("t1", 1.0)], "modified": [], "removed": [], "next_cursor": "c1", "has_more": True},
+        ],
+        "c1": [mutation_error, {"added": [], "modified": [], "removed": [], "next_cursor": "c2", "has_more": False}],
+    })
+
+    async def scenario(session):
+        item = await create_item(session)
+        counts = await sync_item(session, item, service)
+        count = len((await session.scalars(select(Transaction))).all())
+        return counts, count, item.transactions_cursor
+
+    counts, count, cursor = run_in_db(scenario)
+    assert service.requested_cursors == [None, "c1", None, "c1"]
+    # Replaying the first page after the restart updates rather than duplicates t1.
+    assert count == 1
+    assert counts == {"added": 1, "modified": 1, "removed": 0}
+    assert cursor == "c2"
+
+class SlowPlaidService(FakePlaidService):
+    """Answers after a pause, so concurrent syncs all fetch their pages before any applies one."""
+
+    async def sync_transactions(self, access_token, cursor=None):
+        await asyncio.sleep(0.05)
+        return super().sync_transactions(access_token, cursor)
+
+    async def get_account_balances(self, access_token):
+        await asyncio.sleep(0.05)
+        return super().get_account_balances(access_token)
+
+@pytest.mark.parametrize("account_exists", [False, True])
+def test_concurrent_first_syncs_of_an_item_create_each_row_once(tmp_path, account_exists):
+    page = {"added": [plaid_transaction("t1", 4.5), plaid_transaction("t2", 10.0)], "modified": [], "removed": [],
+            "next_cursor": "c1", "has_more": False}
+    service = SlowPlaidService({None: page})
+
+    async def scenario():
+        # A file database, so each session has its own connection and transaction
+        engine = create_async_db_engine(f"sqlite:///{tmp_path / 'sync.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+        try:
+            async with session_factory() as session:
+                item = await create_item(session)
+                item_id = item.id
+                if account_exists:
+                    session.add(BankAccount(user_id=item.user_id, institution_name="Bank", account_type="checking", balance=0,
+                                            plaid_item_id=item_id, plaid_account_id="acc-1"))
+                    await session.commit()
+
+            async def sync():
+                async with session_factory() as session:
+                    return await sync_item(session, await session.get(PlaidItem, item_id), service)
+
+            counts = await asyncio.gather(*(sync() for _ in range(3)))
+            async with session_factory() as session:
+                accounts = (await session.scalars(select(BankAccount.plaid_account_id))).all()
+                transactions = (await session.scalars(select(Transaction.plaid_transaction_id))).all()
+            return counts, accounts, transactions
+        finally:
+            await engine.dispose()
+
+    counts, accounts, transactions = asyncio.run(scenario())
+    assert accounts == ["acc-1"]
+    assert sorted(transactions) == ["t1", "t2"]
+    # One sync inserts the page; the others find it applied and update in place
+    assert sorted(count["added"] for count in counts) == [0, 0, 2]
@@ -0,0 +1,127 @@
+import asyncio
+import hashlib
+import json
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ec
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from main import app
+from db.models import Job, PlaidItem, User
+from services.job_queue import JobWorker, enqueue
+from services.plaid_webhooks import (
+    ITEM_STATUS_JOB,
+    SYNC_ITEM_JOB,
+    WebhookVerificationError,
+    WebhookVerifier,
+    plaid_job_handlers,
+    plan_webhook_job,
+)
+
+client = TestClient(app)
+
+SIGNING_KEY = ec.generate_private_key(ec.SECP256R1())
+
+class FakeKeyService:
+    def __init__(self):
+        self.key_requests = []
+
+    async def get_webhook_verification_key(self, key_id):
+        self.key_requests.append(key_id)
+        jwk = jwt.algorithms.ECAlgorithm.to_jwk(SIGNING_KEY.public_key(), as_dict=True)
+        return {"key": {**jwk, "alg": "ES256", "kid": key_id, "expired_at": None}}
+
+def sign(body, iat=None, kid="key-1"):
+    claims = {"iat": int(iat if iat is not None else time.time()), "request_body_sha256": hashlib.sha256(body).hexdigest()}
+    return jwt.encode(claims, SIGNING_KEY, algorithm="ES256", headers={"kid": kid})
+
+def test_verifier_accepts_signed_webhooks_and_caches_keys():
+    service = FakeKeyService()
+    verifier = WebhookVerifier(service)
+    body = b'{"webhook_type": "TRANSACTIONS"}'
+
+    async def run():
+        await verifier.verify(body, sign(body))
+        await verifier.verify(body, sign(body))
+
+    asyncio.run(run())
+    assert service.key_requests == ["key-1"]
+
+@pytest.mark.parametrize("token_for", [
+    lambda body: None,
+    lambda body: "not-a-jwt",
+    lambda body: sign(b'{"webhook_type": "ITEM"}'),
+    lambda body: sign(body, iat=time.time() - 3600),
+])
+def test_verifier_rejects_bad_webhooks(token_for):
+    verifier = WebhookVerifier(FakeKeyService())
+    body = b'{"webhook_type": "TRANSACTIONS"}'
+
+    with pytest.raises(WebhookVerificationError):
+        asyncio.run(verifier.verify(body, token_for(body)))
+
+def test_plan_webhook_job():
+    assert plan_webhook_job({"webhook_type": "TRANSACTIONS", "webhook_code": "SYNC_UPDATES_AVAILABLE", "item_id": "i1"}) == (
+        SYNC_ITEM_JOB, {"item_id": "i1"}, "plaid.sync_item:i1")
+    assert plan_webhook_job({"webhook_type": "ITEM", "webhook_code": "ERROR", "item_id": "i1",
+                             "error": {"error_code": "ITEM_LOGIN_REQUIRED"}}) == (
+        ITEM_STATUS_JOB, {"item_id": "i1", "error_code": "ITEM_LOGIN_REQUIRED"}, None)
+    assert plan_webhook_job({"webhook_type": "ITEM", "webhook_code": "LOGIN_REPAIRED", "item_id": "i1"})[1]["error_code"] is None
+    assert plan_webhook_job({"webhook_type": "AUTH", "webhook_code": "AUTOMATICALLY_VERIFIED", "item_id": "i1"}) is None
+
+class FakeSyncService:
+    def __init__(self, page):
+        self.page = page
+        self.invalidated = []
+
+    async def sync_transactions(self, access_token, cursor=None):
+        return self.page
+
+    async def invalidate_cache(self, access_token):
+        self.invalidated.append(access_token)
+
+def test_sync_job_records_item_errors_without_retrying(run_with_sessions):
+    service = FakeSyncService({"error": {"status_code": 400, "error_code": "ITEM_LOGIN_REQUIRED", "message": "login required"}})
+
+    async def scenario(session_factory):
+        async with session_factory() as db:
+            user = User(email="hook@example.com", password_hash="x")
+            db.add(user)
+            await db.flush()
+            db.add(PlaidItem(user_id=user.id, item_id="item-1", access_token="access-1"))
+            job, _ = await enqueue(db, SYNC_ITEM_JOB, {"item_id": "item-1"})
+            await db.commit()
+        await JobWorker(plaid_job_handlers(service), session_factory=session_factory).run_until_empty()
+        async with session_factory() as db:
+            item = await db.scalar(select(PlaidItem))
+            job = await db.get(Job, job.id)
+        return item.error_code, job.status, job.attempts
+
+    assert run_with_sessions(scenario) == ("ITEM_LOGIN_REQUIRED", "dead", 1)
+
+def test_sync_job_clears_errors_and_invalidates_cache(run_with_sessions):
+    service = FakeSyncService({"added": [], "modified": [], "removed": [], "next_cursor": "c1", "has_more": False})
+
+    async def scenario(session_factory):
+        async with session_factory() as db:
+            user = User(email="hook@example.com", password_hash="x")
+            db.add(user)
+            await db.flush()
+            db.add(PlaidItem(user_id=user.id, item_id="item-1", access_token="access-1", error_code="ITEM_LOGIN_REQUIRED"))
+            await enqueue(db, SYNC_ITEM_JOB, {"item_id": "item-1"})
+            await db.commit()
+        await JobWorker(plaid_job_handlers(service), session_factory=session_factory).run_until_empty()
+        async with session_factory() as db:
+            item = await db.scalar(select(PlaidItem))
+        return item.error_code, item.transactions_cursor
+
+    assert run_with_sessions(scenario) == (None, "c1")
+    assert service.invalidated == ["access-1"]
+
+def test_webhook_route_requires_a_signature():
+    response = client.post("/plaid/webhook", json={"webhook_type": "TRANSACTIONS", "webhook_code": "SYNC_UPDATES_AVAILABLE", "item_id": "i1"})
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Missing Plaid-Verification header"
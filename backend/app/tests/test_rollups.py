@@ -0,0 +1,71 @@
+import datetime
+from sqlalchemy import select
+
+from api.routes.transactions import summarize_transactions
+from db.models import BankAccount, TransactionRollup, User
+from services.rollups import period_start, rebuild_rollups
+from services.transaction_writer import delete_transactions, insert_transactions, update_transactions
+
+async def create_accounts(session):
+    user = User(email="rollups@example.com", password_hash="x")
+    session.add(user)
+    await session.flush()
+    accounts = [BankAccount(user_id=user.id, institution_name="Bank", account_type=kind, balance=0) for kind in ("checking", "savings")]
+    session.add_all(accounts)
+    await session.flush()
+    return user, accounts
+
+async def rollup_snapshot(session):
+    rows = await session.execute(select(TransactionRollup).where(TransactionRollup.transaction_count != 0))
+    return sorted(
+        (r.period, r.period_start, str(r.bank_account_id), float(r.inflow), float(r.outflow), r.transaction_count)
+        for r in rows.scalars()
+    )
+
+async def summarize(session, user, **kwargs):
+    options = {"period": "month", "start_date": None, "end_date": None, "bank_account_id": None, "by_account": False, "currency": None}
+    options.update(kwargs)
+    return await summarize_transactions(user_id=user.id, db=session, **options)
+
+def test_period_start():
+    day = datetime.datetime(2025, 3, 13, 18, 30)  # a Thursday
+    assert period_start(day, "day") == datetime.date(2025, 3, 13)
+    assert period_start(day, "week") == datetime.date(2025, 3, 10)
+    assert period_start(day, "month") == datetime.date(2025, 3, 1)
+
+def test_writers_keep_rollups_in_step(run_in_db):
+    async def scenario(session):
+        user, (checking, savings) = await create_accounts(session)
+        rows = [
+            {"user_id": user.id, "bank_account_id": checking.id, "description": "Salary", "amount": 3000.0, "date": datetime.datetime(2025, 1, 31)},
+            {"user_id": user.id, "bank_account_id": checking.id, "description": "Rent", "amount": -1500.0, "date": datetime.datetime(2025, 2, 1)},
+            {"user_id": user.id, "bank_account_id": checking.id, "description": "Coffee", "amount": -4.5, "date": datetime.datetime(2025, 2, 3)},
+            {"user_id": user.id, "bank_account_id": savings.id, "description": "Interest", "amount": 12.0, "date": datetime.datetime(2025, 2, 28)},
+        ]
+        await insert_transactions(session, rows)
+        await update_transactions(session, [{"id": rows[2]["id"], "amount": -5.5}])
+        await delete_transactions(session, [rows[3]["id"]])
+        await session.commit()
+
+        monthly = await summarize(session, user)
+        by_account = await summarize(session, user, by_account=True, start_date=datetime.datetime(2025, 2, 15))
+        weekly = await summarize(session, user, period="week", bank_account_id=checking.id)
+
+        incremental = await rollup_snapshot(session)
+        await rebuild_rollups(session)
+        rebuilt = await rollup_snapshot(session)
+        return checking, monthly, by_account, weekly, incremental, rebuilt
+
+    checking, monthly, by_account, weekly, incremental, rebuilt = run_in_db(scenario)
+
+    assert [(b.period_start, b.inflow, b.outflow, b.net, b.transaction_count) for b in monthly.buckets] == [
+        (datetime.date(2025, 1, 1), 3000.0, 0.0, 3000.0, 1),
+        (datetime.date(2025, 2, 1), 0.0, 1505.5, -1505.5, 2),
+    ]
+    # start_date is widened to the start of its bucket; the deleted savings row leaves no bucket behind
+    assert [(b.period_start, b.bank_account_id) for b in by_account.buckets] == [(datetime.date(2025, 2, 1), checking.id)]
+    assert [(b.period_start, b.transaction_count) for b in weekly.buckets] == [
+        (datetime.date(2025, 1, 27), 2),
+        (datetime.date(2025, 2, 3), 1),
+    ]
+    assert incremental == rebuilt
@@ -0,0 +1,73 @@
+import datetime
+
+from db.models import BankAccount, Transaction, User
+from services.search import rebuild_search_index, search_terms, search_transactions
+from services.transaction_writer import delete_transactions, insert_transactions, update_transactions
+from sqlalchemy import update
+
+def test_search_terms_are_normalized_like_descriptions():
+    assert search_terms("SQ *Starbucks #12") == ["starbucks"]
+    assert search_terms("Tim  Horton's") == ["tim", "horton", "s"]
+    assert search_terms("#1234 ***") == []
+
+def test_search_matches_prefixes_within_one_user(run_in_db):
+    async def scenario(session):
+        users, accounts = [], []
+        for email in ("search@example.com", "other@example.com"):
+            user = User(email=email, password_hash="x")
+            session.add(user)
+            await session.flush()
+            account = BankAccount(user_id=user.id, institution_name="Bank", account_type="checking", balance=0)
+            session.add(account)
+            await session.flush()
+            users.append(user)
+            accounts.append(account)
+        (me, other), (mine, theirs) = users, accounts
+
+        def row(user, account, description, amount, day):
+            return {"user_id": user.id, "bank_account_id": account.id, "description": description, "amount": amount,
+                    "date": datetime.datetime(2025, 1, day)}
+
+        rows = [
+            row(me, mine, "SQ *STARBUCKS #0423", -5, 1),
+            row(me, mine, "Starbucks Reserve", -9, 2),
+            row(me, mine, "Tim Hortons", -3, 3),
+            row(me, mine, "Old bookstore", -20, 4),
+            row(other, theirs, "STARBUCKS", -4, 5),
+        ]
+        await insert_transactions(session, rows)
+        await session.commit()
+        big_spends = [Transaction.amount < -5]
+
+        results = {
+            "starbucks": await search_transactions(session, me.id, "starbucks"),
+            "starb": await search_transactions(session, me.id, "  starb "),
+            "filtered": await search_transactions(session, me.id, "starb", big_spends),
+            "two words": await search_transactions(session, me.id, "tim hort"),
+            "no match": await search_transactions(session, me.id, "bucks"),
+            "noise only": await search_transactions(session, me.id, "#42"),
+        }
+
+        # Edits and deletes keep the index in step
+        await update_transactions(session, [{"id": rows[3]["id"], "description": "Starbucks beans"}])
+        await delete_transactions(session, [rows[1]["id"]])
+        await session.commit()
+        results["after edits"] = await search_transactions(session, me.id, "starbucks")
+
+        # Rows from before search_text existed are found once the index is rebuilt
+        await session.execute(update(Transaction).where(Transaction.id == rows[2]["id"]).values(search_text=None))
+        await session.commit()
+        results["before rebuild"] = await search_transactions(session, me.id, "tim")
+        filled = await rebuild_search_index(session)
+        results["after rebuild"] = await search_transactions(session, me.id, "tim")
+        return filled, {name: [t.description for t in found] for name, found in results.items()}
+
+    filled, results = run_in_db(scenario)
+    assert sorted(results["starbucks"]) == ["SQ *STARBUCKS #0423", "Starbucks Reserve"]
+    assert sorted(results["starb"]) == sorted(results["starbucks"])
+    assert results["filtered"] == ["Starbucks Reserve"]
+    assert results["two words"] == ["Tim Hortons"]
+    assert results["no match"] == [] and results["noise only"] == []
+    assert sorted(results["after edits"]) == ["SQ *STARBUCKS #0423", "Starbucks beans"]
+    assert filled == 1
+    assert results["before rebuild"] == [] and results["after rebuild"] == ["Tim Hortons"]
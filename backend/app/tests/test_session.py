@@ -0,0 +1,50 @@
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import StaticPool
+
+from db.session import PoolMetrics, async_database_url, create_async_db_engine, create_db_engine, engine_options
+
+
+def test_postgres_engine_options_use_pool_settings():
+    options = engine_options(make_url("postgresql://user:pw@localhost/dinero"), pool_size=3)
+    assert options["pool_size"] == 3
+    assert "max_overflow" in options
+    assert options["pool_pre_ping"] in (True, False)
+    assert options["connect_args"]["options"].startswith("-c statement_timeout=")
+
+def test_sqlite_memory_engine_shares_one_connection():
+    engine = create_db_engine("sqlite://")
+    assert isinstance(engine.pool, StaticPool)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+
+def test_sqlite_file_engine_enables_wal_and_records_metrics(tmp_path):
+    metrics = PoolMetrics()
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'pool.db'}", metrics=metrics)
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert metrics.snapshot()["checked_out"] == 1
+    with engine.connect():
+        pass
+
+    stats = metrics.snapshot()
+    assert stats["connects"] == 1
+    assert stats["checkouts"] == 2
+    assert stats["checked_out"] == 0
+    assert stats["wait_count"] == 2
+    engine.dispose()
+
+def test_async_engine_uses_async_driver():
+    assert async_database_url("postgresql://u:p@localhost/dinero").drivername == "postgresql+asyncpg"
+    assert async_database_url("sqlite:///./test.db").drivername == "sqlite+aiosqlite"
+
+    async def run():
+        engine = create_async_db_engine("sqlite://")
+        async with engine.connect() as conn:
+            value = (await conn.execute(text("SELECT 1"))).scalar()
+        await engine.dispose()
+        return value
+
+    assert asyncio.run(run()) == 1
@@ -0,0 +1,194 @@
+import io
+import datetime
+from decimal import Decimal
+
+import httpx
+import pytest
+from sqlalchemy import func, select
+
+from api.dependencies import get_db
+from db.models import BankAccount, Transaction, User
+from main import app
+from services import statement_import
+from services.merchants import normalize_description
+from services.statement_import import (
+    StatementFormatError,
+    backfill_dedup_hashes,
+    import_statement,
+    parse_amount,
+    parse_csv,
+    parse_ofx,
+)
+from services.transaction_writer import insert_transactions
+
+CSV_STATEMENT = b"""Account,Chequing 1234
+Exported,2025-03-01
+
+Posted Date,Description,Withdrawals,Deposits
+03/01/2025,SQ *BLUE BOTTLE #1234,4.50,
+03/01/2025,SQ *BLUE BOTTLE #1234,4.50,
+03/02/2025,Payroll,,"2,500.00"
+not a date,Broken,1.00,
+"""
+
+OFX_STATEMENT = b"""OFXHEADER:100
+DATA:OFXSGML
+
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20250301120000[-5:EST]
+<TRNAMT>-4.50
+<FITID>1
+<NAME>Blue Bottle
+</STMTTRN>
+<STMTTRN>
+<TRNTYPE>CREDIT
+<DTPOSTED>20250302
+<TRNAMT>2500.00
+<FITID>2
+<NAME>Payroll &amp; Bonus
+<MEMO>March
+</STMTTRN>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<FITID>3
+<NAME>No date
+</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+@pytest.mark.parametrize("text,expected", [
+    ("1,234.56", Decimal("1234.56")),
+    ("$-4.50", Decimal("-4.50")),
+    ("(4.50)", Decimal("-4.50")),
+    ("4.50-", Decimal("-4.50")),
+    ("4.50 DR", Decimal("-4.50")),
+])
+def test_parse_amount(text, expected):
+    assert parse_amount(text) == expected
+
+def test_normalize_description():
+    assert normalize_description("SQ *BLUE BOTTLE #1234  03/14") == normalize_description("Blue Bottle") == "blue bottle"
+    assert normalize_description("POS PURCHASE Café Olé 00123") == "cafe ole"
+
+def test_parse_csv_skips_preamble_and_combines_debit_credit():
+    rows = list(parse_csv(io.BytesIO(CSV_STATEMENT)))
+    assert [(line, payload["amount"] if payload else None, error is not None) for line, payload, error in rows] == [
+        (5, Decimal("-4.50"), False),
+        (6, Decimal("-4.50"), False),
+        (7, Decimal("2500.00"), False),
+        (8, None, True),
+    ]
+    assert rows[0][1]["date"] == datetime.datetime(2025, 3, 1)
+
+def test_parse_csv_without_recognizable_header():
+    with pytest.raises(StatementFormatError):
+        list(parse_csv(io.BytesIO(b"foo,bar\n1,2\n")))
+
+def test_parse_ofx_handles_tags_split_across_reads(monkeypatch):
+    monkeypatch.setattr(statement_import, "OFX_READ_SIZE", 7)
+    rows = list(parse_ofx(io.BytesIO(OFX_STATEMENT)))
+    assert [(position, payload, error is not None) for position, payload, error in rows[:2]] == [
+        (1, {"date": datetime.datetime(2025, 3, 1), "description": "Blue Bottle", "amount": Decimal("-4.50")}, False),
+        (2, {"date": datetime.datetime(2025, 3, 2), "description": "Payroll & Bonus", "amount": Decimal("2500.00")}, False),
+    ]
+    assert rows[2][0] == 3 and rows[2][2].startswith("Invalid DTPOSTED")
+
+async def create_account(session):
+    user = User(email="import@example.com", password_hash="x")
+    session.add(user)
+    await session.flush()
+    account = BankAccount(user_id=user.id, institution_name="Bank", account_type="checking", balance=0)
+    session.add(account)
+    await session.commit()
+    return user, account
+
+def test_import_is_idempotent_and_dedupes_against_existing_rows(run_in_db):
+    async def scenario(session):
+        user, account = await create_account(session)
+        # Already known from another source, with a differently formatted description
+        await insert_transactions(session, [{"user_id": user.id, "bank_account_id": account.id, "description": "Payroll",
+                                             "amount": 2500.0, "date": datetime.datetime(2025, 3, 2, 9, 30)}])
+        await session.commit()
+
+        first = await import_statement(session, user.id, account.id, parse_csv(io.BytesIO(CSV_STATEMENT)), batch_size=2)
+        again = await import_statement(session, user.id, account.id, parse_csv(io.BytesIO(CSV_STATEMENT)), batch_size=2)
+        count = await session.scalar(select(func.count()).select_from(Transaction))
+        return first, again, count
+
+    first, again, count = run_in_db(scenario)
+    # Both identical coffees are kept; the payroll row was already there
+    assert (first["parsed"], first["imported"], first["duplicates"], first["failed"]) == (3, 2, 1, 1)
+    assert first["errors"][0]["row"] == 8
+    assert (again["imported"], again["duplicates"]) == (0, 3)
+    assert count == 3
+
+def test_backfill_dedup_hashes_numbers_repeated_rows(run_in_db):
+    async def scenario(session):
+        user, account = await create_account(session)
+        await insert_transactions(session, [
+            {"user_id": user.id, "bank_account_id": account.id, "description": "Coffee", "amount": -4.5,
+             "date": datetime.datetime(2025, 3, 1), "dedup_hash": None}
+            for _ in range(2)
+        ])
+        # Simulate rows written before the column existed
+        await session.execute(Transaction.__table__.update().values(dedup_hash=None))
+        await session.commit()
+        hashed = await backfill_dedup_hashes(session)
+        statement = b"Date,Description,Amount\n2025-03-01,Coffee,-4.50\n2025-03-01,Coffee,-4.50\n2025-03-01,Coffee,-4.50\n"
+        result = await import_statement(session, user.id, account.id, parse_csv(io.BytesIO(statement)))
+        return hashed, result
+
+    hashed, result = run_in_db(scenario)
+    assert hashed == 2
+    assert (result["imported"], result["duplicates"]) == (1, 2)
+
+def test_every_write_path_numbers_repeated_rows_like_an_import(run_in_db):
+    async def scenario(session):
+        user, account = await create_account(session)
+
+        def coffee():
+            return {"user_id": user.id, "bank_account_id": account.id, "description": "SQ *BLUE BOTTLE #1234", "amount": -4.5,
+                    "date": datetime.datetime(2025, 3, 1, 8)}
+
+        # One coffee written on its own, then two more in one batch, before the statement arrives
+        await insert_transactions(session, [coffee()])
+        await insert_transactions(session, [coffee(), coffee()])
+        await session.commit()
+        hashes = list(await session.scalars(select(Transaction.dedup_hash)))
+        statement = b"Date,Description,Amount\n" + b"2025-03-01,Blue Bottle,-4.50\n" * 4
+        result = await import_statement(session, user.id, account.id, parse_csv(io.BytesIO(statement)))
+        return hashes, result
+
+    hashes, result = run_in_db(scenario)
+    assert len(set(hashes)) == 3
+    assert (result["imported"], result["duplicates"]) == (1, 3)
+
+def test_import_route_reads_the_uploaded_file(run_with_sessions):
+    async def scenario(session_factory):
+        async with session_factory() as session:
+            user, account = await create_account(session)
+
+        async def sessions():
+            async with session_factory() as db:
+                yield db
+
+        # The upload reaches parse_csv as Starlette's SpooledTemporaryFile, not a BytesIO
+        app.dependency_overrides[get_db] = sessions
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                response = await client.post(
+                    f"/transactions/import?user_id={user.id}&bank_account_id={account.id}",
+                    files={"file": ("statement.csv", b"\xef\xbb\xbf" + CSV_STATEMENT, "text/csv")},
+                )
+        finally:
+            app.dependency_overrides.clear()
+        async with session_factory() as session:
+            descriptions = sorted(await session.scalars(select(Transaction.description)))
+        return response, descriptions
+
+    response, descriptions = run_with_sessions(scenario)
+    assert response.status_code == 200, response.text
+    assert (response.json()["imported"], response.json()["failed"]) == (3, 1)
+    assert descriptions == ["Payroll", "SQ *BLUE BOTTLE #1234", "SQ *BLUE BOTTLE #1234"]
@@ -0,0 +1,90 @@
+import datetime
+from decimal import Decimal
+
+from sqlalchemy import select
+
+from api.routes.subscriptions import list_subscriptions
+from db.models import BankAccount, Subscription, User
+from services.subscriptions import DETECT_SUBSCRIPTIONS_JOB, detect_recurring, merge_payments, subscription_job_handlers
+from services.transaction_writer import delete_transactions, insert_transactions, update_transactions
+
+def days(*dates):
+    return [datetime.date.fromisoformat(value).toordinal() for value in dates]
+
+def test_detects_periods_and_rejects_irregular_series():
+    monthly = detect_recurring(days("2025-01-31", "2025-02-28", "2025-03-31", "2025-04-30"), [-1599, -1599, -1599, -1799])
+    assert monthly.period.name == "monthly"
+    assert (monthly.amount, monthly.next_amount, monthly.next_date) == (-1599, -1799, datetime.date(2025, 5, 30))
+
+    # One late payment out of six still fits
+    weekly = detect_recurring(days("2025-03-03", "2025-03-10", "2025-03-17", "2025-03-24", "2025-03-31", "2025-04-09"), [-500] * 6)
+    assert (weekly.period.name, weekly.next_date) == ("weekly", datetime.date(2025, 4, 16))
+
+    assert detect_recurring(days("2025-01-01", "2025-02-01"), [-100, -100]) is None  # too few
+    assert detect_recurring(days("2025-01-01", "2025-01-20", "2025-03-01", "2025-03-09"), [-100] * 4) is None  # irregular
+    assert detect_recurring(days("2025-01-01", "2025-02-01", "2025-03-01", "2025-04-01"), [-100, -900, -50, -400]) is None
+
+    merged = merge_payments([1, 5, 9], [-1, -5, -9], added=[(7, -7), (2, -2)], removed=[(5, -5), (3, -3)], limit=3)
+    assert merged == ([2, 7, 9], [-2, -7, -9])
+
+def test_writes_update_only_their_merchant_groups(run_in_db):
+    async def scenario(session):
+        user = User(email="subscriptions@example.com", password_hash="x")
+        session.add(user)
+        await session.flush()
+        account = BankAccount(user_id=user.id, institution_name="Bank", account_type="checking", balance=0)
+        session.add(account)
+        await session.flush()
+        user_id, account_id = user.id, account.id
+
+        def row(description, amount, day):
+            return {"user_id": user_id, "bank_account_id": account_id, "description": description, "amount": amount,
+                    "date": datetime.datetime.combine(datetime.date.fromisoformat(day), datetime.time(9))}
+
+        await insert_transactions(session, [
+            row("NETFLIX.COM 866-579", -15.99, "2025-01-15"),
+            row("Netflix.com", -15.99, "2025-02-15"),
+            row("Coffee shop", -4.5, "2025-02-16"),
+            row("Payroll", 3000, "2025-02-28"),
+        ])
+        await session.commit()
+        before = (await session.scalars(select(Subscription.merchant).order_by(Subscription.merchant))).all()
+
+        third = row("NETFLIX.COM", -15.99, "2025-03-15")
+        await insert_transactions(session, [third])
+        await session.commit()
+        session.expire_all()
+        listed = await list_subscriptions(user_id=user_id, include_lapsed=True, db=session)
+
+        # A price rise moves the prediction; deleting the payment again undoes the detection
+        await update_transactions(session, [{"id": third["id"], "amount": Decimal("-16.99")}])
+        await session.commit()
+        session.expire_all()
+        raised = await session.scalar(select(Subscription).where(Subscription.merchant == "netflix com"))
+        raised = (raised.is_recurring, raised.next_amount, raised.amounts)
+        await delete_transactions(session, [third["id"]])
+        await session.commit()
+        session.expire_all()
+        removed = await session.scalar(select(Subscription.is_recurring).where(Subscription.merchant == "netflix com"))
+
+        # A full rescan rebuilds the same state from history
+        await session.execute(Subscription.__table__.delete())
+        await insert_transactions(session, [row("Netflix.com", -15.99, "2025-03-15")])
+        await session.commit()
+        await subscription_job_handlers()[DETECT_SUBSCRIPTIONS_JOB](session, {"user_id": str(user_id)})
+        session.expire_all()
+        rescanned = (await session.scalars(select(Subscription).order_by(Subscription.merchant))).all()
+        return before, listed, raised, removed, [(s.merchant, s.is_recurring, s.days) for s in rescanned]
+
+    before, listed, raised, removed, rescanned = run_in_db(scenario)
+    # Money coming in is never a subscription
+    assert before == ["coffee shop", "netflix com"]
+    [netflix] = listed
+    assert (netflix.merchant, netflix.period, netflix.amount, netflix.next_date) == ("netflix com", "monthly", Decimal("-15.99"), datetime.date(2025, 4, 15))
+    assert netflix.status == "lapsed"
+    assert raised == (True, Decimal("-16.99"), [-1599, -1599, -1699])
+    assert removed is False
+    assert rescanned == [
+        ("coffee shop", False, days("2025-02-16")),
+        ("netflix com", True, days("2025-01-15", "2025-02-15", "2025-03-15")),
+    ]
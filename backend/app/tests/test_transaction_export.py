@@ -0,0 +1,100 @@
+import asyncio
+import csv
+import datetime
+import io
+import json
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.pool import NullPool
+
+from main import app
+from api.dependencies import get_session_factory
+from db.base import Base
+from db.models import BankAccount, Transaction, User
+from db.session import create_async_db_engine, create_db_engine
+from services.transaction_export import export_query, stream_partitions, to_csv
+
+client = TestClient(app)
+
+@pytest.fixture
+def seeded_db(tmp_path):
+    """A file-backed SQLite database with one user holding 30 transactions across two accounts."""
+    url = f"sqlite:///{tmp_path / 'export.db'}"
+    sync_engine = create_db_engine(url)
+    Base.metadata.create_all(sync_engine)
+    user_id, accounts = uuid.uuid4(), [uuid.uuid4(), uuid.uuid4()]
+    with sync_engine.begin() as conn:
+        conn.execute(User.__table__.insert(), {"id": user_id, "email": "export@example.com", "password_hash": "x"})
+        conn.execute(BankAccount.__table__.insert(), [
+            {"id": account_id, "user_id": user_id, "institution_name": "Bank", "account_type": "checking", "balance": 0}
+            for account_id in accounts
+        ])
+        conn.execute(Transaction.__table__.insert(), [
+            {"id": uuid.uuid4(), "user_id": user_id, "bank_account_id": accounts[i % 2], "description": f"Purchase, #{i}",
+             "amount": -float(i), "date": datetime.datetime(2025, 1, 1) + datetime.timedelta(days=i)}
+            for i in range(30)
+        ])
+    sync_engine.dispose()
+
+    # NullPool: the test client runs each request on its own event loop
+    engine = create_async_db_engine(url, poolclass=NullPool)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    app.dependency_overrides[get_session_factory] = lambda: session_factory
+    yield user_id, accounts, session_factory
+    app.dependency_overrides.clear()
+    asyncio.run(engine.dispose())
+
+def test_export_csv_streams_every_row(seeded_db):
+    user_id, accounts, _ = seeded_db
+    response = client.get(f"/transactions/export?user_id={user_id}")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="transactions.csv"' in response.headers["content-disposition"]
+
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 30
+    assert rows[0]["description"] == "Purchase, #0"
+    assert float(rows[29]["amount"]) == -29.0
+
+def test_export_ndjson_applies_filters(seeded_db):
+    user_id, accounts, _ = seeded_db
+    response = client.get(
+        f"/transactions/export?user_id={user_id}&format=ndjson&bank_account_id={accounts[1]}&start_date=2025-01-10T00:00:00"
+    )
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["description"] for row in rows[:2]] == ["Purchase, #9", "Purchase, #11"]
+    assert {row["bank_account_id"] for row in rows} == {str(accounts[1])}
+
+def test_export_parquet(seeded_db):
+    pq = pytest.importorskip("pyarrow.parquet")
+    user_id, _, _ = seeded_db
+    response = client.get(f"/transactions/export?user_id={user_id}&format=parquet")
+    assert response.status_code == 200
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.num_rows == 30
+    assert table.column("amount").to_pylist()[:3] == [0.0, -1.0, -2.0]
+
+def test_partitions_respect_the_batch_size(seeded_db):
+    user_id, _, session_factory = seeded_db
+
+    async def collect():
+        sizes = []
+        chunks = []
+
+        async def counted():
+            async for partition in stream_partitions(session_factory, export_query(user_id), batch_size=8):
+                sizes.append(len(partition))
+                yield partition
+
+        async for chunk in to_csv(counted()):
+            chunks.append(chunk)
+        return sizes, chunks
+
+    sizes, chunks = asyncio.run(collect())
+    assert sizes == [8, 8, 8, 6]
+    # One chunk per batch; the header rides along with the first
+    assert len(chunks) == 4
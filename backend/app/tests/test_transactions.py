@@ -1,19 +1,21 @@
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from unittest.mock import MagicMock
 from uuid import uuid4, UUID
 from datetime import datetime, timezone
 
 from main import app
 from db.models import BankAccount, Transaction
-from api.routes.transactions import get_db
+from api.routes.transactions import get_db, encode_cursor
 
 client = TestClient(app)
 
 @pytest.fixture
 def mock_db():
-    db = MagicMock(spec=Session)
+    db = MagicMock(spec=AsyncSession)
+    # Results are read synchronously, like a real Result
+    db.execute.return_value = MagicMock()
     yield db
 
 @pytest.fixture(autouse=True)
@@ -35,23 +37,7 @@ def test_create_transaction_success(mock_db):
         balance=100.0,
         created_at=datetime.now(timezone.utc)
     )
-    mock_db.query(BankAccount).filter().first.return_value = fake_account
-
-    # Prepare expected values for the created transaction.
-    fake_transaction_id = uuid4()
-    fake_created_date = datetime.now(timezone.utc)
-
-    def fake_refresh(instance):
-        instance.id = fake_transaction_id
-        instance.user_id = fake_user_id
-        instance.bank_account_id = fake_account_id
-        instance.description = "Test transaction"
-        instance.amount = 50.0
-        instance.date = fake_created_date
-
-    mock_db.refresh.side_effect = fake_refresh
-    mock_db.add.return_value = None
-    mock_db.commit.return_value = None
+    mock_db.scalar.return_value = fake_account
 
     transaction_data = {
         "bank_account_id": str(fake_account_id),
@@ -67,11 +53,13 @@ def test_create_transaction_success(mock_db):
     except ValueError:
         pytest.fail("Invalid UUID format for transaction id")
     assert "date" in data
+    assert data["user_id"] == str(fake_user_id)
+    mock_db.commit.assert_awaited_once()
 
 def test_create_transaction_account_not_found(mock_db):
     app.dependency_overrides[get_db] = lambda: mock_db
     # Simulate that the bank account is not found.
-    mock_db.query(BankAccount).filter().first.return_value = None
+    mock_db.scalar.return_value = None
 
     fake_user_id = uuid4()
     transaction_data = {
@@ -83,3 +71,112 @@ def test_create_transaction_account_not_found(mock_db):
     assert response.status_code == 404
     data = response.json()
     assert data["detail"] == "Bank account not found"
+
+def make_transaction(user_id, account_id, day: int) -> Transaction:
+    return Transaction(
+        id=uuid4(),
+        user_id=user_id,
+        bank_account_id=account_id,
+        description=f"Transaction {day}",
+        amount=10.0,
+        date=datetime(2025, 1, day, tzinfo=timezone.utc)
+    )
+
+def test_list_transactions_returns_next_cursor(mock_db):
+    app.dependency_overrides[get_db] = lambda: mock_db
+    fake_user_id = uuid4()
+    fake_account_id = uuid4()
+    # The route asks for limit + 1 rows to learn whether another page exists.
+    rows = [make_transaction(fake_user_id, fake_account_id, day) for day in (3, 2, 1)]
+    mock_db.scalars.return_value = MagicMock()
+    mock_db.scalars.return_value.all.return_value = rows
+
+    response = client.get(f"/transactions/?user_id={fake_user_id}&limit=2")
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert [item["description"] for item in data["items"]] == ["Transaction 3", "Transaction 2"]
+    assert data["next_cursor"] == encode_cursor(rows[1].date, rows[1].id)
+
+    # Following the cursor seeks past the last row of the previous page.
+    mock_db.scalars.return_value.all.return_value = rows[2:]
+    response = client.get(f"/transactions/?user_id={fake_user_id}&limit=2&cursor={data['next_cursor']}")
+    assert response.status_code == 200, response.text
+    assert response.json()["next_cursor"] is None
+    assert "(transactions.date, transactions.id) <" in str(mock_db.scalars.call_args.args[0])
+
+def test_list_transactions_invalid_cursor(mock_db):
+    app.dependency_overrides[get_db] = lambda: mock_db
+    response = client.get(f"/transactions/?user_id={uuid4()}&cursor=not-a-cursor")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+def test_bulk_create_reports_per_row_results(mock_db):
+    app.dependency_overrides[get_db] = lambda: mock_db
+    fake_user_id = uuid4()
+    owned_account_id = uuid4()
+    # The ownership query only returns accounts that belong to the user.
+    mock_db.scalars.return_value = [owned_account_id]
+
+    rows = [
+        {"bank_account_id": str(owned_account_id), "description": "Rent", "amount": -1500.0},
+        {"bank_account_id": str(owned_account_id), "description": "Missing amount"},
+        {"bank_account_id": str(uuid4()), "description": "Someone else's account", "amount": 5.0},
+        {"bank_account_id": str(owned_account_id), "description": "Salary", "amount": 3000.0},
+    ]
+    response = client.post(f"/transactions/bulk?user_id={fake_user_id}", json=rows)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["created"] == 2
+    assert data["failed"] == 2
+    assert [result["status"] for result in data["results"]] == ["created", "error", "error", "created"]
+    assert data["results"][2]["error"] == "Bank account not found"
+
+    # Both accepted rows go out in a single batched INSERT, committed once. The hooks' own
+    # statements (rollups, balances, subscriptions, budgets) are covered by their tests.
+    inserts = [call for call in mock_db.execute.await_args_list if str(call.args[0]).startswith("INSERT INTO transactions ")]
+    assert len(inserts) == 1
+    assert [row["description"] for row in inserts[0].args[1]] == ["Rent", "Salary"]
+    assert [row["category"] for row in inserts[0].args[1]] == [None, "income"]
+    mock_db.commit.assert_awaited_once()
+
+def test_bulk_create_accepts_ndjson(mock_db):
+    app.dependency_overrides[get_db] = lambda: mock_db
+    account_id = uuid4()
+    mock_db.scalars.return_value = [account_id]
+
+    body = "\n".join([
+        f'{{"bank_account_id": "{account_id}", "description": "Coffee", "amount": -4.5}}',
+        "{not json",
+    ])
+    response = client.post(
+        f"/transactions/bulk?user_id={uuid4()}",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["created"] == 1
+    assert data["results"][1]["error"].startswith("Invalid JSON")
+
+def test_bulk_create_rejects_non_array(mock_db):
+    app.dependency_overrides[get_db] = lambda: mock_db
+    response = client.post(f"/transactions/bulk?user_id={uuid4()}", json={"description": "not a list"})
+    assert response.status_code == 400
+
+def test_import_requires_an_owned_account(mock_db):
+    app.dependency_overrides[get_db] = lambda: mock_db
+    mock_db.scalar.return_value = None
+    response = client.post(
+        f"/transactions/import?user_id={uuid4()}&bank_account_id={uuid4()}",
+        files={"file": ("statement.csv", b"Date,Description,Amount\n", "text/csv")}
+    )
+    assert response.status_code == 404
+
+def test_import_rejects_unknown_file_types(mock_db):
+    app.dependency_overrides[get_db] = lambda: mock_db
+    mock_db.scalar.return_value = BankAccount(id=uuid4())
+    response = client.post(
+        f"/transactions/import?user_id={uuid4()}&bank_account_id={uuid4()}",
+        files={"file": ("statement.pdf", b"%PDF", "application/pdf")}
+    )
+    assert response.status_code == 400
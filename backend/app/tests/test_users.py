@@ -1,6 +1,6 @@
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from unittest.mock import MagicMock
 from datetime import datetime, timezone
 from uuid import uuid4, UUID
@@ -15,7 +15,7 @@ client = TestClient(app)
 # Fixture to provide a MagicMock for the database session.
 @pytest.fixture
 def mock_db():
-    db = MagicMock(spec=Session)
+    db = MagicMock(spec=AsyncSession)
     yield db
 
 # Test for successful user registration.
@@ -24,7 +24,7 @@ def test_register_user_success(mock_db):
     app.dependency_overrides[get_db] = lambda: mock_db
 
     # Ensure that no user exists with the given email.
-    mock_db.query(User).filter().first.return_value = None
+    mock_db.scalar.return_value = None
 
     # Create fake values that we expect to be set after commit/refresh.
     fake_id = uuid4()
@@ -67,7 +67,7 @@ def test_register_user_success(mock_db):
 def test_register_user_already_exists(mock_db):
     app.dependency_overrides[get_db] = lambda: mock_db
 
-    # Simulate that a user already exists by having query(...).first() return a User.
+    # Simulate that a user already exists by having scalar(...) return a User.
     existing_user = User(
         id=uuid4(),
         email="test@example.com",
@@ -76,7 +76,7 @@ def test_register_user_already_exists(mock_db):
         currency="CAD",
         created_at=datetime.now(timezone.utc)
     )
-    mock_db.query(User).filter().first.return_value = existing_user
+    mock_db.scalar.return_value = existing_user
 
     user_data = {
         "email": "test@example.com",
@@ -0,0 +1,60 @@
+"""
+Background job workers.
+
+Run dedicated worker processes from backend/ with `PYTHONPATH=app python -m app.worker --concurrency 4`;
+each process runs that many workers against the shared jobs table. The API also runs JOB_WORKERS workers in-process.
+"""
+import argparse
+import asyncio
+import signal
+from typing import Any, Dict, List
+
+from app.core.config import JOB_WORKERS
+from db.session import async_engine
+from services.async_plaid_service import AsyncPlaidService
+from services.balances import balance_job_handlers
+from services.budgets import budget_job_handlers
+from services.categorization import categorization_job_handlers
+from services.job_queue import JobHandler, JobWorker
+from services.plaid_cache import build_plaid_cache
+from services.plaid_webhooks import plaid_job_handlers
+from services.subscriptions import subscription_job_handlers
+
+
+def build_job_handlers(plaid_service: Any) -> Dict[str, JobHandler]:
+    """Every job kind the workers know how to run."""
+    handlers: Dict[str, JobHandler] = {}
+    handlers.update(plaid_job_handlers(plaid_service))
+    handlers.update(balance_job_handlers())
+    handlers.update(categorization_job_handlers())
+    handlers.update(subscription_job_handlers())
+    handlers.update(budget_job_handlers())
+    return handlers
+
+
+def start_workers(count: int, handlers: Dict[str, JobHandler], stop: asyncio.Event) -> List["asyncio.Task[None]"]:
+    return [asyncio.create_task(JobWorker(handlers).run(stop)) for _ in range(count)]
+
+
+async def run_workers(count: int) -> None:
+    plaid_service = AsyncPlaidService(cache=build_plaid_cache())
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await asyncio.gather(*start_workers(count, build_job_handlers(plaid_service), stop))
+    finally:
+        await plaid_service.aclose()
+        await async_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run background job workers")
+    parser.add_argument("--concurrency", type=int, default=max(JOB_WORKERS, 1), help="Workers to run in this process")
+    args = parser.parse_args()
+    asyncio.run(run_workers(args.concurrency))
+
+
+if __name__ == "__main__":
+    main()